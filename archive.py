@@ -0,0 +1,76 @@
+import time
+import logging
+from functools import lru_cache
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+from date_storage import is_date_type
+
+logger = logging.getLogger(__name__)
+
+# Plain SQL (like register_versions) so the raw sqlite3 seeder can archive in its own transaction
+HISTORY_LINK_SQL = (
+    "UPDATE certification_history SET archive_id = :archive_id "
+    "WHERE collaborateur_id = :id AND archive_id IS NULL"
+)
+
+def _get_tables(register):
+    """(live table, archive table, history table) of a register"""
+    if register == 1:
+        from models_1 import Collaborateur, CollaborateurArchive, CertificationHistory
+        return Collaborateur.__table__, CollaborateurArchive.__table__, CertificationHistory.__table__
+    if register == 2:
+        from models_2 import CollaborateurPoidsLouud, CollaborateurPoidsLouudArchive, CertificationHistory
+        return (CollaborateurPoidsLouud.__table__, CollaborateurPoidsLouudArchive.__table__,
+                CertificationHistory.__table__)
+    raise ValueError(f"Unknown register {register!r}")
+
+def date_fields(register):
+    """Names of a register's certification date columns"""
+    return [column.name for column in _get_tables(register)[0].columns if is_date_type(column.type)]
+
+@lru_cache(maxsize=None)
+def archive_sql(register):
+    """INSERT ... SELECT copying one live row (:id) into the archive, stamped :now"""
+    live, archive, _ = _get_tables(register)
+    columns = ', '.join(column.name for column in live.columns)
+    return (f"INSERT INTO {archive.name} ({columns}, archived_at) "
+            f"SELECT {columns}, :now FROM {live.name} WHERE id = :id")
+
+def archive_row(db, register, row_id):
+    """Copy a live row into the archive and attach its certification history to it.
+
+    Runs in the session's current transaction: the caller deletes the live
+    row and commits. Returns the archive_id.
+    """
+    archive_id = db.execute(text(archive_sql(register)), {'id': row_id, 'now': int(time.time())}).lastrowid
+    db.execute(text(HISTORY_LINK_SQL), {'archive_id': archive_id, 'id': row_id})
+    return archive_id
+
+def create_tables_sqlite(conn, register):
+    """Create the archive and history tables on a raw sqlite3 connection if they are missing"""
+    for table in _get_tables(register)[1:]:
+        conn.execute(str(CreateTable(table, if_not_exists=True).compile(dialect=sqlite.dialect())))
+        for index in table.indexes:
+            conn.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite.dialect())))
+
+def archive_rows_sqlite(conn, register, ids):
+    """Same as archive_row for many ids on a raw sqlite3 connection; the caller deletes the rows"""
+    create_tables_sqlite(conn, register)
+    now = int(time.time())
+    for row_id in ids:
+        archive_id = conn.execute(archive_sql(register), {'id': row_id, 'now': now}).lastrowid
+        conn.execute(HISTORY_LINK_SQL, {'archive_id': archive_id, 'id': row_id})
+
+def record_superseded(db, register, row, values):
+    """Keep the certification dates that values replaces or clears on row, in the session's transaction"""
+    history = _get_tables(register)[2]
+    now = int(time.time())
+    replaced = [
+        {'collaborateur_id': row.id, 'field': field, 'value': getattr(row, field), 'replaced_at': now}
+        for field in date_fields(register)
+        if field in values and getattr(row, field) is not None and values[field] != getattr(row, field)
+    ]
+    if replaced:
+        db.execute(history.insert(), replaced)
+    return len(replaced)
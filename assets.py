@@ -0,0 +1,103 @@
+import os
+import json
+import logging
+import mimetypes
+from flask import request, send_from_directory, url_for
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Fingerprinted files never change under the same name
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Third-party files copied under static/vendor by `python build_assets.py --vendor`.
+# Until they are, templates fall back to the CDN URL.
+VENDOR = {
+    'bootstrap/css/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+    'bootstrap/js/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+    'fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css',
+}
+for _style in ('solid-900', 'regular-400', 'brands-400'):
+    for _ext in ('woff2', 'woff', 'ttf'):
+        VENDOR[f'fontawesome/webfonts/fa-{_style}.{_ext}'] = (
+            f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/webfonts/fa-{_style}.{_ext}')
+
+# Served instead of the original when the client accepts the encoding
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {'files': {}, 'variants': {}}
+
+def load_manifest():
+    """Read static/dist/manifest.json; without it static URLs are left as they are"""
+    global _manifest
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            _manifest = json.load(f)
+        logger.info(f"Loaded asset manifest with {len(_manifest['files'])} files")
+    except FileNotFoundError:
+        _manifest = {'files': {}, 'variants': {}}
+        logger.info("No asset manifest, run build_assets.py to fingerprint static files")
+    return _manifest
+
+def fingerprint_static_url(endpoint, values):
+    """url_defaults hook: url_for('static', filename=...) points at the fingerprinted copy"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = _manifest['files'].get(values['filename'], values['filename'])
+
+def send_static(filename):
+    """Static view: precompressed and immutable responses for fingerprinted files"""
+    if not filename.startswith('dist/'):
+        return send_from_directory(STATIC_DIR, filename)
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(STATIC_DIR, filename + suffix)):
+            response = send_from_directory(STATIC_DIR, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(STATIC_DIR, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+def vendor_url(path):
+    """Local copy of a vendored file when present, the CDN otherwise"""
+    if os.path.isfile(os.path.join(STATIC_DIR, 'vendor', path)):
+        return url_for('static', filename=f'vendor/{path}')
+    return VENDOR[path]
+
+def image_sources(filename):
+    """<source> attributes for the WebP/AVIF variants of an image, best format first"""
+    sources = {}
+    for variant in _manifest['variants'].get(filename, []):
+        url = url_for('static', filename=variant['path'])
+        sources.setdefault(variant['type'], []).append(f"{url} {variant['width']}w")
+    order = ('image/avif', 'image/webp')
+    return [{'type': mimetype, 'srcset': ', '.join(sources[mimetype])} for mimetype in order if mimetype in sources]
+
+def background_image(filename):
+    """CSS background-image declarations using the largest variant of each format"""
+    fallback = url_for('static', filename=filename)
+    largest = {}
+    for variant in _manifest['variants'].get(filename, []):
+        if variant['width'] >= largest.get(variant['type'], {}).get('width', 0):
+            largest[variant['type']] = variant
+    css = f"background-image: url('{fallback}');"
+    if largest:
+        options = [f"url('{url_for('static', filename=largest[mimetype]['path'])}') type('{mimetype}')"
+                   for mimetype in ('image/avif', 'image/webp') if mimetype in largest]
+        options.append(f"url('{fallback}') type('{mimetypes.guess_type(filename)[0]}')")
+        css += f" background-image: image-set({', '.join(options)});"
+    return css
+
+def init_app(app):
+    """Fingerprinted static URLs, precompressed files and template helpers"""
+    load_manifest()
+    app.url_defaults(fingerprint_static_url)
+    app.view_functions['static'] = send_static
+    app.jinja_env.globals.update(vendor_url=vendor_url, image_sources=image_sources,
+                                 background_image=background_image)
@@ -0,0 +1,231 @@
+import os
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from seed_best_to_db import REGISTERS
+from register_versions import CREATE_SQL, CHANGE_LOG_CREATE_SQL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(BASE_DIR, "backups"))
+# Snapshots kept per register; older ones are deleted after each backup
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 14))
+# Pages copied per step, and the pause between steps during which writers can commit
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", 256))
+BACKUP_PAUSE = float(os.getenv("BACKUP_PAUSE", 0.05))
+BACKUP_TIME = os.getenv("BACKUP_TIME", "02:30")
+# A write by another connection restarts the copy; after this many restarts it is done in one step
+MAX_RESTARTS = 5
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+def snapshot_prefix(register):
+    return os.path.splitext(os.path.basename(REGISTERS[register]['db_path']))[0] + "."
+
+def list_snapshots(register, backup_dir=None):
+    """Snapshot paths of a register, oldest first"""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = snapshot_prefix(register)
+    names = sorted(name for name in os.listdir(backup_dir) if name.startswith(prefix) and name.endswith(".db"))
+    return [os.path.join(backup_dir, name) for name in names]
+
+def integrity_check(path):
+    """PRAGMA integrity_check of a database file: 'ok' or the problems found"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return "\n".join(row[0] for row in conn.execute("PRAGMA integrity_check"))
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    finally:
+        conn.close()
+
+class RestartLimit(Exception):
+    pass
+
+def copy_online(source, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Copy source into target with the online backup API, pages at a time.
+
+    The source is only read-locked during a step, so writers commit during
+    the pauses. Returns (steps, restarts).
+    """
+    state = {'steps': 0, 'restarts': 0, 'remaining': None}
+
+    def progress(status, remaining, total):
+        state['steps'] += 1
+        # remaining only shrinks, unless a write restarted the copy from the first page
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= MAX_RESTARTS:
+                raise RestartLimit()
+        state['remaining'] = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except RestartLimit:
+        logger.warning(f"Backup restarted {state['restarts']} times by concurrent writes; copying in one step")
+        source.backup(target)
+    return state['steps'], state['restarts']
+
+def backup_register(register, db_path=None, backup_dir=None, keep=BACKUP_KEEP, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Write a verified, timestamped snapshot of a register and rotate the old ones.
+
+    The copy goes to a .part file, renamed only once integrity_check passes,
+    so a listed snapshot is always complete. Returns a report dict.
+    """
+    db_path = db_path or REGISTERS[register]['db_path']
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Register {register} database not found: {db_path}")
+    path = os.path.join(backup_dir, f"{snapshot_prefix(register)}{datetime.now().strftime(TIMESTAMP_FORMAT)}.db")
+    partial = path + ".part"
+    if os.path.exists(partial):
+        os.remove(partial)
+    start = time.perf_counter()
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    target = sqlite3.connect(partial)
+    try:
+        steps, restarts = copy_online(source, target, pages, pause)
+    finally:
+        target.close()
+        source.close()
+    result = integrity_check(partial)
+    if result != "ok":
+        os.remove(partial)
+        raise RuntimeError(f"Snapshot of register {register} failed integrity_check: {result}")
+    os.replace(partial, path)
+    removed = rotate(register, backup_dir, keep)
+    report = {
+        'register': register,
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'steps': steps,
+        'restarts': restarts,
+        'removed': removed,
+        'elapsed': time.perf_counter() - start
+    }
+    logger.info(f"Register {register} backed up to {path}: {report['bytes']} bytes in {steps} steps, "
+                f"{report['elapsed']:.2f}s, {len(removed)} old snapshot(s) removed")
+    return report
+
+def rotate(register, backup_dir=None, keep=BACKUP_KEEP):
+    """Delete all but the newest keep snapshots of a register (keep <= 0: none); returns the removed paths"""
+    snapshots = list_snapshots(register, backup_dir)
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+def _stamp(conn):
+    """(version, last change_log seq) of a register database, 0 when missing"""
+    conn.execute(CREATE_SQL)
+    conn.execute(CHANGE_LOG_CREATE_SQL)
+    version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM register_version").fetchone()[0]
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    return version, seq
+
+def restore_register(register, snapshot, db_path=None, backup_dir=None):
+    """Replace a register's database with a snapshot, in place.
+
+    The current database is backed up first. The version counter and the
+    change log are moved past both histories, with a reset entry, so the
+    running app's caches and ETags reload instead of trusting old versions.
+    """
+    db_path = db_path or REGISTERS[register]['db_path']
+    result = integrity_check(snapshot)
+    if result != "ok":
+        raise RuntimeError(f"Snapshot {snapshot} failed integrity_check: {result}")
+    if os.path.exists(db_path):
+        backup_register(register, db_path, backup_dir, keep=0)
+    source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    target = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        old_version, old_seq = _stamp(target)
+        source.backup(target)
+        new_version, new_seq = _stamp(target)
+        now = int(time.time())
+        target.execute("BEGIN")
+        target.execute("INSERT OR REPLACE INTO register_version (id, version, updated_at) VALUES (1, ?, ?)",
+                       (max(old_version, new_version) + 1, now))
+        target.execute("INSERT INTO change_log (seq, row_id, op, changed_at) VALUES (?, NULL, 'reset', ?)",
+                       (max(old_seq, new_seq) + 1, now))
+        target.execute("COMMIT")
+    finally:
+        target.close()
+        source.close()
+    logger.info(f"Register {register} restored from {snapshot}")
+
+def backup_all(registers=(1, 2), backup_dir=None, keep=BACKUP_KEEP):
+    """Back up every register; a failure is logged and does not stop the others"""
+    reports = []
+    for register in registers:
+        try:
+            reports.append(backup_register(register, backup_dir=backup_dir, keep=keep))
+        except Exception as e:
+            logger.error(f"Backup of register {register} failed: {str(e)}")
+    return reports
+
+def run_scheduled(at=BACKUP_TIME, registers=(1, 2), backup_dir=None, keep=BACKUP_KEEP):
+    """Back up every day at the given HH:MM until interrupted"""
+    import schedule
+    schedule.every().day.at(at).do(backup_all, registers, backup_dir, keep)
+    logger.info(f"Daily backups scheduled at {at} into {backup_dir or BACKUP_DIR}")
+    while True:
+        schedule.run_pending()
+        time.sleep(30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of the SQLite registers")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="snapshot directory (default: BACKUP_DIR)")
+    parser.add_argument("--register", type=int, choices=[1, 2], action="append",
+                        help="register to work on, repeatable (default: both)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup = commands.add_parser("backup", help="snapshot the registers now")
+    backup.add_argument("--keep", type=int, default=BACKUP_KEEP, help="snapshots kept per register")
+    commands.add_parser("list", help="list the snapshots")
+    verify = commands.add_parser("verify", help="run integrity_check on snapshots (default: all)")
+    verify.add_argument("paths", nargs="*")
+    restore = commands.add_parser("restore", help="replace one register's database with a snapshot")
+    restore.add_argument("snapshot")
+    daily = commands.add_parser("schedule", help="back up every day")
+    daily.add_argument("--at", default=BACKUP_TIME, help="time of day, HH:MM (default: BACKUP_TIME)")
+    daily.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    args = parser.parse_args()
+    registers = args.register or [1, 2]
+
+    if args.command == "backup":
+        if len(backup_all(registers, args.dir, args.keep)) < len(registers):
+            raise SystemExit(1)
+    elif args.command == "list":
+        for register in registers:
+            print(f"Register {register}:")
+            for path in list_snapshots(register, args.dir):
+                print(f"  {os.path.basename(path)}  {os.path.getsize(path):>12} bytes")
+    elif args.command == "verify":
+        paths = args.paths or [path for register in registers for path in list_snapshots(register, args.dir)]
+        failed = 0
+        for path in paths:
+            result = integrity_check(path)
+            failed += result != "ok"
+            print(f"{path}: {result}")
+        if failed:
+            raise SystemExit(1)
+    elif args.command == "restore":
+        if len(registers) != 1:
+            parser.error("restore needs exactly one --register")
+        restore_register(registers[0], args.snapshot, backup_dir=args.dir)
+    elif args.command == "schedule":
+        run_scheduled(args.at, registers, args.dir, args.keep)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import csv
+import random
+import argparse
+from datetime import date, timedelta
+from seed_best_to_db import REGISTERS, import_csv
+
+NOMS = [
+    "MARTIN", "BERNARD", "THOMAS", "PETIT", "ROBERT", "RICHARD", "DURAND", "DUBOIS", "MOREAU", "LAURENT",
+    "SIMON", "MICHEL", "LEFEBVRE", "LEROY", "ROUX", "DAVID", "BERTRAND", "MOREL", "FOURNIER", "GIRARD",
+    "BONNET", "DUPONT", "LAMBERT", "FONTAINE", "ROUSSEAU", "VINCENT", "MULLER", "LEFEVRE", "FAURE", "ANDRE",
+    "MERCIER", "BLANC", "GUERIN", "BOYER", "GARNIER", "CHEVALIER", "FRANCOIS", "LEGRAND", "GAUTHIER", "GARCIA",
+    "PERRIN", "ROBIN", "CLEMENT", "MORIN", "NICOLAS", "HENRY", "ROUSSEL", "MATHIEU", "GAUTIER", "MASSON",
+    "AHMED", "YAHIAOUI", "BENALI", "HADDAD", "BOUZID", "MEZIANE", "ARGHIB", "SAIDI", "DA SILVA", "PEREIRA",
+    "FERREIRA", "RODRIGUES", "N'DIAYE", "DIALLO", "TRAORE", "KONE", "NGUYEN", "LE GALL", "LE ROUX", "KERVELLA"
+]
+PRENOMS = [
+    "Jean", "Pierre", "Michel", "André", "Philippe", "Nicolas", "Christophe", "Stéphane", "Sébastien", "Julien",
+    "David", "Laurent", "Thomas", "Frédéric", "Olivier", "Éric", "Mathieu", "Karim", "Mohamed", "Nabil",
+    "Fateh", "Yacine", "Mamadou", "Moussa", "José", "Antonio", "Marie", "Nathalie", "Isabelle", "Sophie",
+    "Sandrine", "Céline", "Aurélie", "Émilie", "Camille", "Léa", "Chloé", "Manon", "Inès", "Fatima",
+    "Jean-Pierre", "Jean-Luc", "Marie-Claire", "Anne-Sophie", "Kévin", "Loïc", "Gaëtan", "Hervé", "Grégory", "Yannick"
+]
+COMMENTAIRES = ["*", "Intérimaire", "Poids lourd", "Chef d'équipe", "Renouvellement en cours", "Dossier incomplet"]
+
+# Share of empty certification dates, and where the others fall relative to today
+EMPTY_RATE = 0.3
+EXPIRY_PROFILE = [
+    # (weight, min days, max days)
+    (0.10, -3 * 365, -1),     # expired
+    (0.04, 0, 14),            # due within the notification window
+    (0.08, 15, 90),
+    (0.78, 91, 5 * 365)
+]
+
+def random_nom(rng):
+    # About one in six people has a compound surname, as in the real files
+    if rng.random() < 0.16:
+        return f"{rng.choice(NOMS)} {rng.choice(NOMS)}"
+    return rng.choice(NOMS)
+
+def random_expiry(rng, today):
+    if rng.random() < EMPTY_RATE:
+        return ''
+    pick = rng.random()
+    for weight, low, high in EXPIRY_PROFILE:
+        if pick < weight:
+            break
+        pick -= weight
+    return (today + timedelta(days=rng.randint(low, high))).isoformat()
+
+def generate_rows(register, count, seed=42, today=None):
+    """Yield CSV rows (lists of strings) matching the register's columns"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    for row_id in range(1, count + 1):
+        nom, prenom = random_nom(rng), rng.choice(PRENOMS)
+        commentaire = rng.choice(COMMENTAIRES) if rng.random() < 0.2 else ''
+        if register == 1:
+            dates = [random_expiry(rng, today) for _ in REGISTERS[1]['date_fields']]
+        else:
+            validite = random_expiry(rng, today) or (today + timedelta(days=rng.randint(91, 5 * 365))).isoformat()
+            renouvellement = (date.fromisoformat(validite) - timedelta(days=5 * 365)).isoformat()
+            dates = [renouvellement, validite]
+        yield [str(row_id), nom, prenom, *dates, commentaire]
+
+def write_csv(register, count, path, seed=42, today=None):
+    """Write a synthetic CSV for a register; returns its path"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REGISTERS[register]['fields'])
+        writer.writerows(generate_rows(register, count, seed, today))
+    return path
+
+def build_database(register, count, directory, seed=42, today=None):
+    """Create directory/register_<n>_<count>.db (and its CSV); returns (db_path, csv_path)"""
+    csv_path = write_csv(register, count, os.path.join(directory, f"register_{register}_{count}.csv"), seed, today)
+    db_path = os.path.join(directory, f"register_{register}_{count}.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    import_csv(register, csv_path=csv_path, db_path=db_path)
+    return db_path, csv_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic registers for benchmarks")
+    parser.add_argument("--register", choices=["1", "2"], default="1")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=".", help="output directory")
+    args = parser.parse_args()
+    db_path, csv_path = build_database(int(args.register), args.rows, args.out, args.seed)
+    print(f"Wrote {csv_path} and {db_path}")
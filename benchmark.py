@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import date, datetime
+
+# Notifier modules refuse to import without SMTP settings; nothing is sent here
+for _name in ("SMTP_SERVER", "SMTP_PORT", "SENDER_EMAIL", "SENDER_PASSWORD", "RECIPIENT_EMAIL"):
+    os.environ.setdefault(_name, "587" if _name == "SMTP_PORT" else "benchmark")
+# Emails are rendered from templates, never by a remote model
+os.environ["EMAIL_CONTENT_PROVIDER"] = "template"
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from bench_data import build_database
+from crud_1 import get_collaborateurs, get_collaborateur_rows
+from crud_2 import get_collaborateurs_2, get_collaborateur_rows_2
+from content_providers import generate_email
+from seed_best_to_db import import_csv
+import inspection_notifications_1
+import inspection_notifications_2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (1000, 10000, 100000)
+OUTPUT_TXT = os.path.join(BASE_DIR, "bench_output.txt")
+OUTPUT_JSON = os.path.join(BASE_DIR, "bench_output.json")
+BASELINE_JSON = os.path.join(BASE_DIR, "bench_baseline.json")
+# A case is reported as a regression when its median is this much slower than the baseline
+REGRESSION_THRESHOLD = 0.20
+EMAILS_PER_RUN = 100
+
+def timed(func, repeat):
+    """Run func repeat times; returns the list of durations in seconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def session_factory(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def with_session(Session, func):
+    """A fresh session per run, so identity-map hits do not flatter later runs"""
+    def run():
+        db = Session()
+        try:
+            return func(db)
+        finally:
+            db.close()
+    return run
+
+def bench_size(size, directory, repeat, today):
+    """Time every case against registers of `size` rows"""
+    db_1, csv_1 = build_database(1, size, directory, today=today)
+    db_2, csv_2 = build_database(2, size, directory, today=today)
+    engine_1, Session_1 = session_factory(db_1)
+    engine_2, Session_2 = session_factory(db_2)
+
+    db = Session_1()
+    due = inspection_notifications_1.find_due_notifications(db, today)[:EMAILS_PER_RUN]
+    email_inputs = [(collaborateur, [{**notif, 'message': f"{notif['type']} à renouveler dans {notif['days_until']} jours"}
+                                     for notif in notifications])
+                    for collaborateur, notifications in due]
+    db.close()
+
+    def render_emails():
+        for collaborateur, notifications in email_inputs:
+            generate_email(collaborateur, notifications)
+
+    def seed_replace(register, csv_path):
+        def run():
+            db_path = os.path.join(directory, f"seed_{register}.db")
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            import_csv(register, csv_path=csv_path, db_path=db_path)
+        return run
+
+    cases = {
+        'crud_1.list': with_session(Session_1, lambda db: get_collaborateurs(db, 0, 100)),
+        'crud_1.search': with_session(Session_1, lambda db: get_collaborateurs(db, 0, 100, "mar")),
+        'crud_1.search_miss': with_session(Session_1, lambda db: get_collaborateurs(db, 0, 100, "zzzz")),
+        'crud_1.list_rows': with_session(Session_1, lambda db: get_collaborateur_rows(db, 0, 100)),
+        'crud_1.search_rows': with_session(Session_1, lambda db: get_collaborateur_rows(db, 0, 100, "mar")),
+        'crud_2.sort': with_session(Session_2, lambda db: get_collaborateurs_2(db, 0, 100, None, 'date_validite', 'desc')),
+        'crud_2.search_sort': with_session(Session_2, lambda db: get_collaborateurs_2(db, 0, 100, "mar", 'nom', 'asc')),
+        'crud_2.sort_rows': with_session(Session_2, lambda db: get_collaborateur_rows_2(db, 0, 100, None, 'date_validite', 'desc')),
+        'notifier_1.detect': with_session(Session_1, lambda db: inspection_notifications_1.find_due_notifications(db, today)),
+        'notifier_2.detect': with_session(Session_2, lambda db: inspection_notifications_2.find_due_notifications(db, today)),
+        f'email.render_{EMAILS_PER_RUN}': render_emails,
+        'seed_1.replace': seed_replace(1, csv_1),
+        'seed_2.replace': seed_replace(2, csv_2),
+        'seed_1.diff_unchanged': lambda: import_csv(1, csv_path=csv_1, db_path=db_1, mode="diff"),
+    }
+    results = {}
+    for name, func in cases.items():
+        func()  # warm-up: imports, statement caches, page cache
+        durations = timed(func, repeat)
+        results[f"{name}@{size}"] = {
+            'case': name,
+            'size': size,
+            'median': statistics.median(durations),
+            'min': min(durations),
+            'runs': repeat
+        }
+        print(f"  {name:<24} {size:>7} rows  {statistics.median(durations) * 1000:10.2f} ms", flush=True)
+    engine_1.dispose()
+    engine_2.dispose()
+    return results
+
+def compare(results, baseline, threshold):
+    """Attach baseline medians and relative change; returns the regressed keys"""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get('results', {}).get(key)
+        if not reference:
+            continue
+        result['baseline'] = reference['median']
+        result['change'] = result['median'] / reference['median'] - 1 if reference['median'] else 0.0
+        if result['change'] > threshold:
+            regressions.append(key)
+    return regressions
+
+def format_report(data, regressions, threshold):
+    lines = [
+        f"Benchmark {data['meta']['date']}  Python {data['meta']['python']}  "
+        f"SQLAlchemy {data['meta']['sqlalchemy']}  {data['meta']['platform']}",
+        "",
+        f"{'case':<26}{'rows':>8}{'median ms':>12}{'min ms':>10}{'baseline':>10}{'change':>9}"
+    ]
+    for key, result in data['results'].items():
+        baseline = f"{result['baseline'] * 1000:10.2f}" if 'baseline' in result else f"{'-':>10}"
+        change = f"{result['change'] * 100:+8.1f}%" if 'change' in result else f"{'-':>9}"
+        flag = "  REGRESSION" if key in regressions else ""
+        lines.append(f"{result['case']:<26}{result['size']:>8}{result['median'] * 1000:12.2f}"
+                     f"{result['min'] * 1000:10.2f}{baseline}{change}{flag}")
+    lines.append("")
+    if regressions:
+        lines.append(f"{len(regressions)} case(s) more than {threshold:.0%} slower than the baseline")
+    else:
+        lines.append("No regression against the baseline" if any('baseline' in r for r in data['results'].values())
+                     else "No baseline to compare with (run with --save-baseline)")
+    return '\n'.join(lines) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser(description="Time CRUD, search, notification and import hot paths")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated register sizes (default: 1000,10000,100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (median is reported)")
+    parser.add_argument("--baseline", default=BASELINE_JSON, help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="regression threshold (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regression")
+    args = parser.parse_args()
+
+    today = date.today()
+    directory = tempfile.mkdtemp(prefix="bench_")
+    results = {}
+    try:
+        for size in (int(size) for size in args.sizes.split(",")):
+            print(f"Registers of {size} rows", flush=True)
+            results.update(bench_size(size, directory, args.repeat, today))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    data = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    report = format_report(data, regressions, args.threshold)
+    print()
+    print(report, end="")
+    with open(OUTPUT_TXT, 'w', encoding='utf-8') as f:
+        f.write(report)
+    with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import posixpath
+from io import BytesIO
+import urllib.request
+from assets import STATIC_DIR, DIST_DIR, MANIFEST_PATH, VENDOR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Optional: image variants need Pillow, .br files need brotli
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.ttf')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Widths generated per image; the logo is shown 110px wide, the background full screen
+IMAGE_WIDTHS = {
+    'logo.jpg': (110, 220),
+    'home_background_.jpg': (960, 1600, 2400)
+}
+DEFAULT_WIDTHS = (480, 960, 1920)
+WEBP_QUALITY = 80
+AVIF_QUALITY = 55
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+def fingerprint(logical_path, data):
+    """dist path of a file: name.<hash>.ext next to its original location"""
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+    root, ext = posixpath.splitext(logical_path)
+    return f"dist/{root}.{digest}{ext}"
+
+def write_file(path, data):
+    full_path = os.path.join(STATIC_DIR, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(data)
+
+def write_compressed(path, data):
+    """Write .gz (and .br) siblings when they are smaller than the file itself"""
+    sizes = {}
+    variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            write_file(path + suffix, compressed)
+            sizes[suffix] = len(compressed)
+    return sizes
+
+def rewrite_css_urls(logical_path, text, files):
+    """Point url(...) references of a stylesheet at their fingerprinted copies"""
+    css_dir = posixpath.dirname(logical_path)
+    dist_dir = posixpath.dirname(fingerprint(logical_path, b''))
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        # Font URLs carry ?v=... or #iefix suffixes
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(css_dir, path))
+        if target not in files:
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(files[target], dist_dir)}{suffix}{quote})"
+
+    return CSS_URL.sub(replace, text)
+
+def list_static_files():
+    """Logical paths (relative to static/, '/'-separated) of every source file"""
+    paths = []
+    for root, dirs, names in os.walk(STATIC_DIR):
+        if os.path.abspath(root) == os.path.abspath(STATIC_DIR) and 'dist' in dirs:
+            dirs.remove('dist')
+        for name in names:
+            paths.append(os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/'))
+    return sorted(paths)
+
+def avif_supported():
+    try:
+        return features.check('avif')
+    except Exception:
+        return False
+
+def build_image_variants(logical_path, report):
+    """Resized WebP (and AVIF when Pillow supports it) copies of an image"""
+    variants = []
+    formats = [('image/webp', 'WEBP', '.webp', {'quality': WEBP_QUALITY, 'method': 6})]
+    if avif_supported():
+        formats.append(('image/avif', 'AVIF', '.avif', {'quality': AVIF_QUALITY}))
+    with Image.open(os.path.join(STATIC_DIR, logical_path)) as image:
+        image = image.convert('RGB')
+        widths = IMAGE_WIDTHS.get(logical_path, DEFAULT_WIDTHS)
+        # Never upscale; the original width is the largest variant
+        widths = sorted({min(width, image.width) for width in widths})
+        root = posixpath.splitext(logical_path)[0]
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for mimetype, format_name, ext, options in formats:
+                buffer = BytesIO()
+                resized.save(buffer, format_name, **options)
+                data = buffer.getvalue()
+                path = fingerprint(f"{root}.{width}w{ext}", data)
+                write_file(path, data)
+                variants.append({'path': path, 'type': mimetype, 'width': width})
+                report.append((path, len(data), {}))
+    return variants
+
+def build(images=True):
+    """Fingerprint static/ into static/dist and write the manifest"""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    files, variants, report = {}, {}, []
+    paths = list_static_files()
+    # Stylesheets last so their url(...) references can be rewritten
+    for logical_path in sorted(paths, key=lambda p: p.endswith('.css')):
+        with open(os.path.join(STATIC_DIR, logical_path), 'rb') as f:
+            data = f.read()
+        if logical_path.endswith('.css'):
+            data = rewrite_css_urls(logical_path, data.decode('utf-8'), files).encode('utf-8')
+        path = fingerprint(logical_path, data)
+        write_file(path, data)
+        files[logical_path] = path
+        sizes = write_compressed(path, data) if logical_path.endswith(COMPRESS_EXTENSIONS) else {}
+        report.append((path, len(data), sizes))
+        if images and Image and logical_path.endswith(IMAGE_EXTENSIONS) and not logical_path.startswith('vendor/'):
+            variants[logical_path] = build_image_variants(logical_path, report)
+    if images and not Image:
+        logger.warning("Pillow is not installed, no WebP/AVIF variants generated")
+
+    write_file(os.path.relpath(MANIFEST_PATH, STATIC_DIR),
+               json.dumps({'files': files, 'variants': variants}, indent=2, sort_keys=True).encode('utf-8'))
+    for path, size, sizes in report:
+        compressed = ', '.join(f"{suffix} {size_c / 1024:.1f} KB" for suffix, size_c in sizes.items())
+        print(f"{path:<70} {size / 1024:8.1f} KB{'  (' + compressed + ')' if compressed else ''}")
+    logger.info(f"Built {len(files)} files and {sum(len(v) for v in variants.values())} image variants into {DIST_DIR}")
+    return files, variants
+
+def download_vendor():
+    """Copy the third-party CSS/JS/fonts the templates use under static/vendor"""
+    for path, url in VENDOR.items():
+        destination = os.path.join(STATIC_DIR, 'vendor', path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        logger.info(f"Downloading {url}")
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(destination, 'wb') as f:
+            f.write(data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint, compress and resize static assets into static/dist")
+    parser.add_argument("--vendor", action="store_true", help="download Bootstrap and Font Awesome into static/vendor first")
+    parser.add_argument("--no-images", action="store_true", help="skip WebP/AVIF image variants")
+    args = parser.parse_args()
+    if args.vendor:
+        download_vendor()
+    build(images=not args.no_images)
@@ -0,0 +1,199 @@
+import os
+import gzip
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from dashboard import REGISTERS, LABELS, get_current_date
+from escalation import load_ladder
+from register_versions import get_version, collect_changes, get_last_seq, _get_engine
+from http_cache import GZIP_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Expiries that lapsed less than this many days ago stay in the feed
+PAST_DAYS = int(os.getenv("CALENDAR_PAST_DAYS", "30"))
+REFRESH_INTERVAL = "PT15M"
+PRODID = "-//Bourgeois Travaux Publics//Collaborateurs//FR"
+TITLES = {1: 'Base de données 1', 2: 'Base de données 2'}
+
+def escape_text(value):
+    """Escape a TEXT value (RFC 5545 3.3.11)"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def fold(line):
+    """Fold a content line at 75 octets without splitting a UTF-8 character"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        limit = 74  # continuation lines start with a space
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+def render_event(register, row, field, expiry, stamp):
+    """One all-day VEVENT for a certification expiry, with its alarms"""
+    label = LABELS.get(field, field)
+    summary = f"{label} expire - {row.nom} {row.prenom}"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:register-{register}-{row.id}-{field}@collaborateurs",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART;VALUE=DATE:{expiry:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{expiry + timedelta(days=1):%Y%m%d}",
+        f"SUMMARY:{escape_text(summary)}",
+        f"CATEGORIES:{escape_text(label)}",
+        "TRANSP:TRANSPARENT"
+    ]
+    if row.commentaire:
+        lines.append(f"DESCRIPTION:{escape_text(row.commentaire)}")
+    # One alarm per step of the certification's escalation ladder
+    for days in load_ladder().thresholds(field):
+        lines += [
+            "BEGIN:VALARM",
+            "ACTION:DISPLAY",
+            f"TRIGGER:-P{days}D" if days else "TRIGGER:PT0S",
+            f"DESCRIPTION:{escape_text(f'{summary} dans {days} jours')}",
+            "END:VALARM"
+        ]
+    lines.append("END:VEVENT")
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+class FeedCache:
+    """Rendered events of one register, kept per row and refreshed from the change log"""
+
+    def __init__(self, register):
+        self.register = register
+        model, self.fields = REGISTERS[register]
+        self.table = model.__table__
+        self.columns = [self.table.c.id, self.table.c.nom, self.table.c.prenom, self.table.c.commentaire,
+                        *(self.table.c[field] for field in self.fields)]
+        self.lock = threading.Lock()
+        self.version = None
+        self.seq = 0
+        self.events = {}  # row_id -> [(field, expiry, text)]
+        self.bodies = {}  # (types, since) -> feed text, for the current version
+        self.compressed = {}  # same keys -> gzipped feed, shared by every polling client
+        self.since = None
+
+    def _render_rows(self, conn, ids=None):
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        statement = select(*self.columns)
+        if ids is not None:
+            statement = statement.where(self.table.c.id.in_(ids))
+        for row in conn.execute(statement):
+            self.events[row.id] = [(field, getattr(row, field), render_event(self.register, row, field,
+                                                                             getattr(row, field), stamp))
+                                   for field in self.fields if getattr(row, field) is not None]
+
+    def _rebuild(self):
+        with _get_engine(self.register).connect() as conn:
+            # Read the log position first: changes made while loading are applied again next time
+            self.seq = get_last_seq(conn)
+            self.events = {}
+            self._render_rows(conn)
+        logger.info(f"Calendar feed of register {self.register} rebuilt: {len(self.events)} rows")
+
+    def _apply_changes(self):
+        self.seq, changed = collect_changes(self.register, self.seq)
+        if changed is None:
+            return self._rebuild()
+        for row_id in changed:
+            self.events.pop(row_id, None)
+        if changed:
+            ids = sorted(changed)
+            with _get_engine(self.register).connect() as conn:
+                for start in range(0, len(ids), 500):
+                    self._render_rows(conn, ids[start:start + 500])
+            logger.info(f"Calendar feed of register {self.register}: {len(changed)} rows re-rendered")
+
+    def refresh(self):
+        """Bring the events up to date with the register's version"""
+        version = get_version(self.register)[0]
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            try:
+                if self.version is None:
+                    self._rebuild()
+                else:
+                    self._apply_changes()
+            except OperationalError as e:
+                logger.warning(f"Cannot read change log of register {self.register}, rebuilding: {str(e)}")
+                self._rebuild()
+            self.version = version
+            self.bodies = {}
+            self.compressed = {}
+
+    def render(self, types, today):
+        """The VCALENDAR text for the given certification types"""
+        self.refresh()
+        since = today - timedelta(days=PAST_DAYS)
+        if since != self.since:
+            # A new day: yesterday's bodies will not be asked for again
+            self.bodies, self.compressed, self.since = {}, {}, since
+        key = (types, since)
+        body = self.bodies.get(key)
+        if body is None:
+            with self.lock:
+                events = [text for row_events in self.events.values()
+                          for field, expiry, text in row_events if field in types and expiry >= since]
+            title = TITLES[self.register]
+            if set(types) != set(self.fields):
+                title += f" ({', '.join(LABELS.get(field, field) for field in types)})"
+            header = [
+                "BEGIN:VCALENDAR",
+                "VERSION:2.0",
+                f"PRODID:{PRODID}",
+                "CALSCALE:GREGORIAN",
+                "METHOD:PUBLISH",
+                f"X-WR-CALNAME:{escape_text(f'Échéances - {title}')}",
+                "X-WR-TIMEZONE:Europe/Paris",
+                f"REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}",
+                f"X-PUBLISHED-TTL:{REFRESH_INTERVAL}"
+            ]
+            body = ''.join(fold(line) + '\r\n' for line in header) + ''.join(events) + "END:VCALENDAR\r\n"
+            self.bodies[key] = body
+        return body
+
+    def render_gzip(self, types, today):
+        """render(), gzipped once per version instead of once per response"""
+        body = self.render(types, today)
+        key = (types, today - timedelta(days=PAST_DAYS))
+        data = self.compressed.get(key)
+        if data is None:
+            data = gzip.compress(body.encode('utf-8'), GZIP_LEVEL)
+            self.compressed[key] = data
+        return data
+
+_feeds = {register: FeedCache(register) for register in REGISTERS}
+
+def parse_types(register, value):
+    """Certification columns from a comma-separated ?types= value; all when empty"""
+    fields = REGISTERS[register][1]
+    if not value:
+        return tuple(fields)
+    types = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in types if item not in fields]
+    if unknown:
+        raise ValueError(f"unknown certification type(s): {', '.join(unknown)}")
+    return tuple(field for field in fields if field in types)
+
+def get_feed(register, types=None, compressed=False):
+    """The register's .ics feed, restricted to the given certification types; gzip bytes if compressed"""
+    feed = _feeds[register]
+    types = types or tuple(REGISTERS[register][1])
+    if compressed:
+        return feed.render_gzip(types, get_current_date())
+    return feed.render(types, get_current_date())
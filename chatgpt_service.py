@@ -0,0 +1,32 @@
+import os
+from dotenv import load_dotenv
+from openai import OpenAI
+from content_providers import ModelProvider
+
+# Load environment variables
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+
+class OpenAIProvider(ModelProvider):
+    """E-mail content written by an OpenAI chat model"""
+    name = 'openai'
+
+    def __init__(self):
+        super().__init__()
+        if not OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY must be configured to use the OpenAI provider")
+        self.client = OpenAI(api_key=OPENAI_API_KEY)
+
+    def complete(self, prompt):
+        response = self.client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{'role': 'user', 'content': prompt}]
+        )
+        usage = response.usage
+        return (
+            response.choices[0].message.content,
+            getattr(usage, 'prompt_tokens', 0),
+            getattr(usage, 'completion_tokens', 0)
+        )
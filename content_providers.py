@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+from email_templates import render_email, render_prompt, render_subject
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Provider name -> "module:Class". Modules are only imported when their
+# provider is selected, so the heavy SDKs never load for the template path.
+PROVIDERS = {
+    'template': 'content_providers:TemplateProvider',
+    'stub': 'content_providers:StubProvider',
+    'gemini': 'gemini_service:GeminiProvider',
+    'openai': 'chatgpt_service:OpenAIProvider'
+}
+
+def get_default_provider_name():
+    """Provider selected by EMAIL_CONTENT_PROVIDER (templates unless a model is configured)"""
+    name = os.getenv('EMAIL_CONTENT_PROVIDER')
+    if name:
+        return name.strip().lower()
+    return 'gemini' if os.getenv('GEMINI_MODEL') else 'template'
+
+@dataclass
+class EmailContent:
+    """E-mail produced by a provider, with the cost of producing it"""
+    subject: str
+    text: str
+    html: Optional[str]
+    provider: str
+    latency_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+class ContentProvider(ABC):
+    """Base class for e-mail content providers"""
+    name = None
+
+    def __init__(self):
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'latency_ms': 0.0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0
+        }
+
+    @abstractmethod
+    def _generate(self, collaborateur, notifications) -> EmailContent:
+        """Produce the e-mail; generate() adds the timing and the stats"""
+
+    def generate(self, collaborateur, notifications) -> EmailContent:
+        """Generate the e-mail and record latency and token counts"""
+        start = time.perf_counter()
+        try:
+            content = self._generate(collaborateur, notifications)
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        content.latency_ms = (time.perf_counter() - start) * 1000
+        self.stats['calls'] += 1
+        self.stats['latency_ms'] += content.latency_ms
+        self.stats['prompt_tokens'] += content.prompt_tokens
+        self.stats['completion_tokens'] += content.completion_tokens
+        logger.debug(f"{self.name}: e-mail generated in {content.latency_ms:.2f} ms "
+                     f"({content.prompt_tokens} prompt / {content.completion_tokens} completion tokens)")
+        return content
+
+class TemplateProvider(ContentProvider):
+    """Renders the e-mail from the compiled Jinja2 templates"""
+    name = 'template'
+
+    def _generate(self, collaborateur, notifications):
+        subject, text, html = render_email(collaborateur, notifications)
+        return EmailContent(subject, text, html, self.name)
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+class StubProvider(ContentProvider):
+    """Deterministic local provider for tests and benchmarks.
+
+    Builds the same prompt as the model providers and returns a fixed body
+    derived from it, with estimated token counts. STUB_PROVIDER_LATENCY_MS
+    simulates network latency.
+    """
+    name = 'stub'
+
+    def __init__(self):
+        super().__init__()
+        self.latency = float(os.getenv('STUB_PROVIDER_LATENCY_MS', '0')) / 1000
+
+    def _generate(self, collaborateur, notifications):
+        prompt = render_prompt(collaborateur, notifications)
+        if self.latency:
+            time.sleep(self.latency)
+        subject = render_subject(collaborateur, notifications)
+        text = f"[stub] {subject}\n\n{prompt.splitlines()[-1]}"
+        return EmailContent(subject, text, None, self.name,
+                            prompt_tokens=estimate_tokens(prompt),
+                            completion_tokens=estimate_tokens(text))
+
+class ModelProvider(ContentProvider):
+    """Base class for language-model providers; falls back to the templates on failure"""
+
+    def __init__(self):
+        super().__init__()
+        self.fallback = TemplateProvider()
+
+    @abstractmethod
+    def complete(self, prompt):
+        """Return (text, prompt_tokens, completion_tokens) for a prompt"""
+
+    def _generate(self, collaborateur, notifications):
+        try:
+            text, prompt_tokens, completion_tokens = self.complete(render_prompt(collaborateur, notifications))
+            if text:
+                return EmailContent(render_subject(collaborateur, notifications), text, None, self.name,
+                                    prompt_tokens=prompt_tokens or 0,
+                                    completion_tokens=completion_tokens or 0)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"{self.name} generation failed, falling back to templates: {str(e)}")
+        return self.fallback._generate(collaborateur, notifications)
+
+_instances = {}
+# Web workers run several threads: only one of them builds each provider
+_instances_lock = threading.Lock()
+
+def get_provider(name: Optional[str] = None) -> ContentProvider:
+    """Return the (cached) provider instance, importing its module on first use"""
+    name = name or get_default_provider_name()
+    provider = _instances.get(name)
+    if provider is not None:
+        return provider
+    with _instances_lock:
+        if name not in _instances:
+            try:
+                module_name, class_name = PROVIDERS[name].split(':')
+            except KeyError:
+                raise ValueError(f"Unknown e-mail content provider {name!r}. Available: {sorted(PROVIDERS)}")
+            provider_class = getattr(importlib.import_module(module_name), class_name)
+            _instances[name] = provider_class()
+            logger.info(f"Using e-mail content provider '{name}'")
+        return _instances[name]
+
+def generate_email(collaborateur, notifications):
+    """Generate the e-mail with the configured provider.
+
+    Returns (subject, text_body, html_body).
+    """
+    content = get_provider().generate(collaborateur, notifications)
+    return content.subject, content.text, content.html
+
+def compare_providers(names, notification_sets):
+    """Run several providers over the same notifications and return their stats.
+
+    notification_sets is a list of (collaborateur, notifications) pairs.
+    """
+    results = {}
+    for name in names:
+        provider = get_provider(name)
+        before = dict(provider.stats)
+        for collaborateur, notifications in notification_sets:
+            provider.generate(collaborateur, notifications)
+        stats = {key: provider.stats[key] - before[key] for key in before}
+        stats['avg_latency_ms'] = stats['latency_ms'] / stats['calls'] if stats['calls'] else 0.0
+        results[name] = stats
+    return results
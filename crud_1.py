@@ -1,6 +1,12 @@
 from database_1 import SessionLocal
-from models_1 import Collaborateur
+from models_1 import Collaborateur, CollaborateurRow, CollaborateurArchive, CollaborateurArchiveRow, CertificationHistory
 from typing import Optional, List
+from functools import lru_cache
+from sqlalchemy import select, or_, bindparam
+from validation import parse_date, UNSET
+from register_versions import record_change
+from archive import archive_row, record_superseded
+from name_index import get_index
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -13,8 +19,6 @@ def get_db():
     finally:
         db.close()
 
-from datetime import date
-
 def create_collaborateur(db,
                          nom: str,
                          prenom: str,
@@ -29,18 +33,21 @@ def create_collaborateur(db,
     collab = Collaborateur(
         nom=nom,
         prenom=prenom,
-        fimo=date.fromisoformat(fimo) if fimo else None,
-        caces=date.fromisoformat(caces) if caces else None,
-        aipr=date.fromisoformat(aipr) if aipr else None,
-        hg0b0=date.fromisoformat(hg0b0) if hg0b0 else None,
-        visite_med=date.fromisoformat(visite_med) if visite_med else None,
-        brevet_secour=date.fromisoformat(brevet_secour) if brevet_secour else None,
+        fimo=parse_date(fimo),
+        caces=parse_date(caces),
+        aipr=parse_date(aipr),
+        hg0b0=parse_date(hg0b0),
+        visite_med=parse_date(visite_med),
+        brevet_secour=parse_date(brevet_secour),
         commentaire=commentaire
     )
     try:
         db.add(collab)
+        db.flush()
+        record_change(db, collab.id, "insert")
         db.commit()
         db.refresh(collab)
+        get_index(1).put(collab.id, collab.nom, collab.prenom)
         return collab
     except Exception as e:
         db.rollback()
@@ -67,43 +74,89 @@ def get_collaborateurs(db, skip: int = 0, limit: int = 100, search: Optional[str
         )
     return query.offset(skip).limit(limit).all()
 
+@lru_cache(maxsize=None)
+def _rows_statement(search: bool):
+    """Column select for get_collaborateur_rows, built once per shape so its compiled form is reused"""
+    statement = select(*Collaborateur.__table__.columns)
+    if search:
+        term = bindparam('term')
+        statement = statement.where(or_(
+            Collaborateur.nom.ilike(term),
+            Collaborateur.prenom.ilike(term),
+            Collaborateur.commentaire.ilike(term)
+        ))
+    return statement.offset(bindparam('skip')).limit(bindparam('limit'))
+
+def get_collaborateur_rows(db, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[CollaborateurRow]:
+    """Read-only get_collaborateurs: plain rows, nothing added to the session"""
+    params = {'skip': skip, 'limit': limit}
+    if search:
+        params['term'] = f"%{search}%"
+    return [CollaborateurRow._make(row) for row in db.execute(_rows_statement(bool(search)), params)]
+
+@lru_cache(maxsize=None)
+def _archived_rows_statement(search: bool):
+    """Column select for get_archived_rows, most recently archived first"""
+    statement = select(*CollaborateurArchive.__table__.columns)
+    if search:
+        term = bindparam('term')
+        statement = statement.where(or_(
+            CollaborateurArchive.nom.ilike(term),
+            CollaborateurArchive.prenom.ilike(term),
+            CollaborateurArchive.commentaire.ilike(term)
+        ))
+    statement = statement.order_by(CollaborateurArchive.archive_id.desc())
+    return statement.offset(bindparam('skip')).limit(bindparam('limit'))
+
+def get_archived_rows(db, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[CollaborateurArchiveRow]:
+    """Archived collaborateurs matching the same search as get_collaborateur_rows"""
+    params = {'skip': skip, 'limit': limit}
+    if search:
+        params['term'] = f"%{search}%"
+    return [CollaborateurArchiveRow._make(row) for row in db.execute(_archived_rows_statement(bool(search)), params)]
+
+def get_certification_history(db, collaborateur_id: int) -> List[CertificationHistory]:
+    """Replaced certification dates of a live collaborateur, latest first"""
+    return db.query(CertificationHistory).filter(
+        CertificationHistory.collaborateur_id == collaborateur_id,
+        CertificationHistory.archive_id.is_(None)
+    ).order_by(CertificationHistory.replaced_at.desc(), CertificationHistory.id.desc()).all()
+
 def update_collaborateur(db,
                          collaborateur_id: int,
                          nom: Optional[str] = None,
                          prenom: Optional[str] = None,
-                         fimo: Optional[str] = None,
-                         caces: Optional[str] = None,
-                         aipr: Optional[str] = None,
-                         hg0b0: Optional[str] = None,
-                         visite_med: Optional[str] = None,
-                         brevet_secour: Optional[str] = None,
+                         fimo: Optional[str] = UNSET,
+                         caces: Optional[str] = UNSET,
+                         aipr: Optional[str] = UNSET,
+                         hg0b0: Optional[str] = UNSET,
+                         visite_med: Optional[str] = UNSET,
+                         brevet_secour: Optional[str] = UNSET,
                          commentaire: Optional[str] = None) -> Optional[Collaborateur]:
-    from datetime import date
-    """Update a collaborateur's information"""
+    """Update a collaborateur's information.
+
+    Dates left out keep their value; a date given as None or '' is cleared.
+    """
     collab = get_collaborateur(db, collaborateur_id)
     if not collab:
         return None
+    dates = {field: parse_date(value) for field, value in (
+        ('fimo', fimo), ('caces', caces), ('aipr', aipr), ('hg0b0', hg0b0),
+        ('visite_med', visite_med), ('brevet_secour', brevet_secour)) if value is not UNSET}
     if nom is not None:
         setattr(collab, "nom", nom)
     if prenom is not None:
         setattr(collab, "prenom", prenom)
-    if fimo is not None:
-        setattr(collab, "fimo", date.fromisoformat(fimo) if fimo else None)
-    if caces is not None:
-        setattr(collab, "caces", date.fromisoformat(caces) if caces else None)
-    if aipr is not None:
-        setattr(collab, "aipr", date.fromisoformat(aipr) if aipr else None)
-    if hg0b0 is not None:
-        setattr(collab, "hg0b0", date.fromisoformat(hg0b0) if hg0b0 else None)
-    if visite_med is not None:
-        setattr(collab, "visite_med", date.fromisoformat(visite_med) if visite_med else None)
-    if brevet_secour is not None:
-        setattr(collab, "brevet_secour", date.fromisoformat(brevet_secour) if brevet_secour else None)
-    if commentaire is not None:
-        setattr(collab, "commentaire", commentaire)
     try:
+        record_superseded(db, 1, collab, dates)
+        for field, value in dates.items():
+            setattr(collab, field, value)
+        if commentaire is not None:
+            setattr(collab, "commentaire", commentaire)
+        record_change(db, collaborateur_id, "update")
         db.commit()
         db.refresh(collab)
+        get_index(1).put(collab.id, collab.nom, collab.prenom)
         return collab
     except Exception as e:
         db.rollback()
@@ -111,13 +164,16 @@ def update_collaborateur(db,
         raise
 
 def delete_collaborateur(db, collaborateur_id: int) -> bool:
-    """Delete a collaborateur"""
+    """Delete a collaborateur, moving the row and its certification history to the archive"""
     collab = get_collaborateur(db, collaborateur_id)
     if not collab:
         return False
     try:
+        archive_row(db, 1, collaborateur_id)
         db.delete(collab)
+        record_change(db, collaborateur_id, "delete")
         db.commit()
+        get_index(1).discard(collaborateur_id)
         return True
     except Exception as e:
         db.rollback()
@@ -1,7 +1,14 @@
+from sqlalchemy import select, or_, bindparam
 from sqlalchemy.orm import Session
-from models_2 import CollaborateurPoidsLouud
+from models_2 import (CollaborateurPoidsLouud, CollaborateurPoidsLouudRow, CollaborateurPoidsLouudArchive,
+                      CollaborateurPoidsLouudArchiveRow, CertificationHistory)
 from datetime import date
 from typing import Optional, List
+from functools import lru_cache
+from register_versions import record_change
+from archive import archive_row, record_superseded
+from validation import UNSET
+from name_index import get_index
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -25,8 +32,11 @@ def create_collaborateur_2(
     )
     try:
         db.add(db_collaborateur)
+        db.flush()
+        record_change(db, db_collaborateur.id, "insert")
         db.commit()
         db.refresh(db_collaborateur)
+        get_index(2).put(db_collaborateur.id, db_collaborateur.nom, db_collaborateur.prenom)
         logger.info(f"Created collaborateur {nom} {prenom}")
         return db_collaborateur
     except Exception as e:
@@ -62,31 +72,112 @@ def get_collaborateurs_2(
         query = query.order_by(column)
     return query.offset(skip).limit(limit).all()
 
+@lru_cache(maxsize=64)
+def _rows_statement_2(search: bool, sort_by: Optional[str], direction: str):
+    """Column select for get_collaborateur_rows_2, built once per shape so its compiled form is reused"""
+    statement = select(*CollaborateurPoidsLouud.__table__.columns)
+    if search:
+        term = bindparam('term')
+        statement = statement.where(or_(
+            CollaborateurPoidsLouud.nom.ilike(term),
+            CollaborateurPoidsLouud.prenom.ilike(term),
+            CollaborateurPoidsLouud.commentaire.ilike(term)
+        ))
+    if sort_by:
+        column = CollaborateurPoidsLouud.__table__.columns[sort_by]
+        statement = statement.order_by(column.desc() if direction == 'desc' else column)
+    return statement.offset(bindparam('skip')).limit(bindparam('limit'))
+
+def get_collaborateur_rows_2(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    direction: str = 'asc'
+) -> List[CollaborateurPoidsLouudRow]:
+    """Read-only get_collaborateurs_2: plain rows, nothing added to the session"""
+    if not sort_by or sort_by not in CollaborateurPoidsLouud.__table__.columns:
+        sort_by = None
+    params = {'skip': skip, 'limit': limit}
+    if search:
+        params['term'] = f"%{search}%"
+    statement = _rows_statement_2(bool(search), sort_by, 'desc' if direction == 'desc' else 'asc')
+    return [CollaborateurPoidsLouudRow._make(row) for row in db.execute(statement, params)]
+
+@lru_cache(maxsize=64)
+def _archived_rows_statement_2(search: bool, sort_by: Optional[str], direction: str):
+    """Column select for get_archived_rows_2; most recently archived first unless sorted"""
+    statement = select(*CollaborateurPoidsLouudArchive.__table__.columns)
+    if search:
+        term = bindparam('term')
+        statement = statement.where(or_(
+            CollaborateurPoidsLouudArchive.nom.ilike(term),
+            CollaborateurPoidsLouudArchive.prenom.ilike(term),
+            CollaborateurPoidsLouudArchive.commentaire.ilike(term)
+        ))
+    if sort_by:
+        column = CollaborateurPoidsLouudArchive.__table__.columns[sort_by]
+        statement = statement.order_by(column.desc() if direction == 'desc' else column)
+    else:
+        statement = statement.order_by(CollaborateurPoidsLouudArchive.archive_id.desc())
+    return statement.offset(bindparam('skip')).limit(bindparam('limit'))
+
+def get_archived_rows_2(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    direction: str = 'asc'
+) -> List[CollaborateurPoidsLouudArchiveRow]:
+    """Archived collaborateurs matching the same search and sort as get_collaborateur_rows_2"""
+    if not sort_by or sort_by not in CollaborateurPoidsLouudArchive.__table__.columns:
+        sort_by = None
+    params = {'skip': skip, 'limit': limit}
+    if search:
+        params['term'] = f"%{search}%"
+    statement = _archived_rows_statement_2(bool(search), sort_by, 'desc' if direction == 'desc' else 'asc')
+    return [CollaborateurPoidsLouudArchiveRow._make(row) for row in db.execute(statement, params)]
+
+def get_certification_history_2(db: Session, collaborateur_id: int) -> List[CertificationHistory]:
+    """Replaced certification dates of a live collaborateur, latest first"""
+    return db.query(CertificationHistory).filter(
+        CertificationHistory.collaborateur_id == collaborateur_id,
+        CertificationHistory.archive_id.is_(None)
+    ).order_by(CertificationHistory.replaced_at.desc(), CertificationHistory.id.desc()).all()
+
 def update_collaborateur_2(
     db: Session,
     collaborateur_id: int,
     nom: Optional[str] = None,
     prenom: Optional[str] = None,
-    date_renouvellement: Optional[date] = None,
-    date_validite: Optional[date] = None,
+    date_renouvellement: Optional[date] = UNSET,
+    date_validite: Optional[date] = UNSET,
     commentaire: Optional[str] = None
 ) -> Optional[CollaborateurPoidsLouud]:
-    """Update a collaborateur's information"""
+    """Update a collaborateur's information.
+
+    Dates left out keep their value; a date given as None is cleared.
+    """
     collaborateur = db.query(CollaborateurPoidsLouud).filter(CollaborateurPoidsLouud.id == collaborateur_id).first()
     if collaborateur:
         if nom is not None:
             setattr(collaborateur, "nom", nom)
         if prenom is not None:
             setattr(collaborateur, "prenom", prenom)
-        if date_renouvellement is not None:
-            setattr(collaborateur, "date_renouvellement", date_renouvellement)
-        if date_validite is not None:
-            setattr(collaborateur, "date_validite", date_validite)
-        if commentaire is not None:
-            setattr(collaborateur, "commentaire", commentaire)
         try:
+            dates = {field: value for field, value in (('date_renouvellement', date_renouvellement),
+                                                       ('date_validite', date_validite)) if value is not UNSET}
+            record_superseded(db, 2, collaborateur, dates)
+            for field, value in dates.items():
+                setattr(collaborateur, field, value)
+            if commentaire is not None:
+                setattr(collaborateur, "commentaire", commentaire)
+            record_change(db, collaborateur_id, "update")
             db.commit()
             db.refresh(collaborateur)
+            get_index(2).put(collaborateur.id, collaborateur.nom, collaborateur.prenom)
             logger.info(f"Updated collaborateur with ID {collaborateur_id}")
             return collaborateur
         except Exception as e:
@@ -96,12 +187,15 @@ def update_collaborateur_2(
     return None
 
 def delete_collaborateur_2(db: Session, collaborateur_id: int) -> bool:
-    """Delete a collaborateur"""
+    """Delete a collaborateur, moving the row and its certification history to the archive"""
     collaborateur = db.query(CollaborateurPoidsLouud).filter(CollaborateurPoidsLouud.id == collaborateur_id).first()
     if collaborateur:
         try:
+            archive_row(db, 2, collaborateur_id)
             db.delete(collaborateur)
+            record_change(db, collaborateur_id, "delete")
             db.commit()
+            get_index(2).discard(collaborateur_id)
             logger.info(f"Deleted collaborateur with ID {collaborateur_id}")
             return True
         except Exception as e:
@@ -0,0 +1,77 @@
+import logging
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from sqlalchemy import case, func, literal, select, union_all
+from models_1 import Collaborateur
+from models_2 import CollaborateurPoidsLouud
+from email_templates import DETAIL_FIELDS
+from register_versions import get_version
+from date_storage import days_until, today_param
+
+logger = logging.getLogger(__name__)
+
+TIMEZONE = ZoneInfo("Europe/Paris")
+
+# (key, label, upper bound in days); rows past the last bound are counted as "later"
+BUCKETS = [
+    ('expired', 'Expiré', -1),
+    ('d4', '≤ 4 jours', 4),
+    ('d14', '≤ 14 jours', 14),
+    ('d30', '≤ 30 jours', 30),
+    ('d90', '≤ 90 jours', 90)
+]
+LATER = ('later', '> 90 jours')
+BUCKET_LABELS = [(key, label) for key, label, _ in BUCKETS] + [LATER]
+
+# Expiry columns per register
+REGISTERS = {
+    1: (Collaborateur, ['fimo', 'caces', 'aipr', 'hg0b0', 'visite_med', 'brevet_secour']),
+    2: (CollaborateurPoidsLouud, ['date_validite'])
+}
+
+LABELS = dict(DETAIL_FIELDS)
+
+_cache = {}
+_lock = threading.Lock()
+
+def get_current_date():
+    """Today in Europe/Paris, the day boundary used by the cache and the notifiers"""
+    return datetime.now(TIMEZONE).date()
+
+def build_counts_statement(model, fields):
+    """One UNION ALL of the expiry columns, grouped by type and urgency bucket"""
+    parts = [
+        select(
+            literal(field).label('type'),
+            days_until(getattr(model, field)).label('days')
+        ).where(getattr(model, field).isnot(None))
+        for field in fields
+    ]
+    dates = union_all(*parts).subquery()
+    bucket = case(
+        *[(dates.c.days <= bound, key) for key, _, bound in BUCKETS],
+        else_=LATER[0]
+    ).label('bucket')
+    return select(dates.c.type, bucket, func.count()).group_by(dates.c.type, bucket)
+
+_statements = {register: build_counts_statement(model, fields) for register, (model, fields) in REGISTERS.items()}
+
+def compute_expiry_counts(db, register, today):
+    """Return {type: {bucket: count}} for a register, computed in SQL"""
+    _, fields = REGISTERS[register]
+    counts = {field: {key: 0 for key, _ in BUCKET_LABELS} for field in fields}
+    for field, bucket, count in db.execute(_statements[register], {'today': today_param(today)}):
+        counts[field][bucket] = count
+    return counts
+
+def get_expiry_counts(db, register):
+    """Cached expiry counts; recomputed after a write (version bump) or when the day changes"""
+    key = (get_current_date(), get_version(register)[0])
+    cached = _cache.get(register)
+    if cached and cached[0] == key:
+        return cached[1]
+    counts = compute_expiry_counts(db, register, key[0])
+    with _lock:
+        _cache[register] = (key, counts)
+    return counts
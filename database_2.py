@@ -13,11 +13,12 @@ load_dotenv()
 # Database configuration
 DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL_2", "sqlite:///database_management_2.db")
 
+# One engine (and connection pool) per process
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
 def get_db():
     """Generator function to get database session"""
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    
     db = None
     try:
         db = SessionLocal()
@@ -29,9 +30,8 @@ def get_db():
 def init_db():
     """Initialize the database by creating all tables"""
     try:
-        logger.info("Creating database engine")
+        logger.info("Creating database tables")
         # Create all tables
-        engine = create_engine(DATABASE_URL)
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
     except Exception as e:
@@ -0,0 +1,85 @@
+import os
+from datetime import date, datetime
+from dotenv import load_dotenv
+from sqlalchemy import Date, Integer, bindparam, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+load_dotenv()
+
+# "iso" (default): dates stored as 'YYYY-MM-DD' text. "days": stored as integer
+# day numbers (date.toordinal()); convert existing databases with migrate_dates.py first.
+DATE_STORAGE = os.getenv("DATE_STORAGE", "iso").strip().lower()
+if DATE_STORAGE not in ("iso", "days"):
+    raise ValueError(f"DATE_STORAGE must be 'iso' or 'days', not {DATE_STORAGE!r}")
+DAY_NUMBERS = DATE_STORAGE == "days"
+
+# julianday('0001-01-01') is 1721425.5 and date(1, 1, 1).toordinal() is 1
+JULIAN_OFFSET = 1721424.5
+
+class DayNumberDate(TypeDecorator):
+    """A date stored as its integer day number; Python code still sees datetime.date"""
+    impl = Integer
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return date
+
+    def process_bind_param(self, value, dialect):
+        return to_storage(value, True)
+
+    def process_result_value(self, value, dialect):
+        return _decode(value)
+
+    def result_processor(self, dialect, coltype):
+        # Called for every value of every scan: a dict lookup in C instead of a Python call
+        return _DecodedDays().__getitem__
+
+def _decode(value):
+    if value is None:
+        return None
+    if isinstance(value, str):  # a row written before the migration
+        return date.fromisoformat(value)
+    return date.fromordinal(value)
+
+class _DecodedDays(dict):
+    """Stored value -> date, filled on first sight; a register only uses a few thousand distinct days"""
+
+    def __missing__(self, value):
+        if len(self) > 100000:
+            self.clear()
+        result = self[value] = _decode(value)
+        return result
+
+# Column type of the certification dates in models_1 and models_2
+DateType = DayNumberDate if DAY_NUMBERS else Date
+
+def is_date_type(type_):
+    """True for Date columns in either storage mode"""
+    return isinstance(type_, (Date, DayNumberDate))
+
+def to_storage(value, day_numbers=DAY_NUMBERS):
+    """A date (or ISO string) as stored in the database, for raw sqlite3 writes"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    elif isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() if day_numbers else value.isoformat()
+
+def to_iso(value):
+    """A stored date value (day number or ISO text) as ISO text, for raw sqlite3 reads"""
+    if isinstance(value, int):
+        return date.fromordinal(value).isoformat()
+    return value
+
+def days_until(column, name='today'):
+    """SQL expression: days from the :name parameter (see today_param) to column"""
+    if DAY_NUMBERS:
+        return type_coerce(column, Integer) - bindparam(name, type_=Integer)
+    return func.julianday(column) - func.julianday(bindparam(name))
+
+def today_param(today):
+    """The value bound to the parameter of days_until"""
+    return to_storage(today)
@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+import threading
+import traceback
+from flask import g
+from sqlalchemy import event
+from database_1 import SessionLocal as SessionLocal_1, engine as engine_1
+from database_2 import SessionLocal as SessionLocal_2, engine as engine_2
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+SESSION_FACTORIES = {1: SessionLocal_1, 2: SessionLocal_2}
+ENGINES = {1: engine_1, 2: engine_2}
+
+# Record where each connection was checked out and report those still out after
+# their request; on by default when the app runs in debug mode
+LEAK_DEBUG = os.getenv("DB_LEAK_DEBUG", "").lower() in ("1", "true", "yes")
+# Pool pressure (overflow in use) is logged at most this often per register
+POOL_LOG_INTERVAL = 60
+
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool.", ("register",))
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out.", ("register",))
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size.", ("register",))
+LEAKED = Counter("db_connections_leaked_total", "Connections still checked out after their request.",
+                 ("register",))
+
+_checkouts = {}
+_checkouts_lock = threading.Lock()
+_last_pressure_log = {}
+_leak_debug = LEAK_DEBUG
+
+def get_session(register):
+    """The request's session for a register, opened on first use and closed at teardown"""
+    sessions = g.setdefault('db_sessions', {})
+    if register not in sessions:
+        sessions[register] = SESSION_FACTORIES[register]()
+    return sessions[register]
+
+def close_sessions(exc):
+    """teardown_appcontext: roll back on error, always close"""
+    sessions = g.pop('db_sessions', {})
+    for register, session in sessions.items():
+        try:
+            if exc is not None:
+                session.rollback()
+        except Exception as e:
+            logger.error(f"Rollback of register {register} session failed: {str(e)}")
+        finally:
+            session.close()
+    if _leak_debug:
+        report_leaks()
+
+def _update_pool_gauges(engine, register, returning=False):
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        # The checkin event fires before the connection is back in the pool
+        POOL_CHECKED_OUT.set(pool.checkedout() - returning, register=register)
+    if hasattr(pool, 'overflow'):
+        overflow = max(pool.overflow(), 0)
+        POOL_OVERFLOW.set(overflow, register=register)
+        now = time.monotonic()
+        if overflow and now - _last_pressure_log.get(register, 0) > POOL_LOG_INTERVAL:
+            _last_pressure_log[register] = now
+            logger.warning(f"Register {register} pool under pressure: {pool.status()}")
+
+def _checkout_site():
+    """The application frames that led to a checkout, without the SQLAlchemy internals"""
+    frames = [frame for frame in traceback.extract_stack()[:-2]
+              if f"{os.sep}sqlalchemy{os.sep}" not in frame.filename]
+    return ''.join(traceback.format_list(frames[-10:]))
+
+def instrument_pool(engine, register):
+    """Count checkouts, track pool usage and, in leak debug mode, checkout sites"""
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        POOL_CHECKOUTS.inc(register=register)
+        _update_pool_gauges(engine, register)
+        if _leak_debug:
+            with _checkouts_lock:
+                _checkouts[id(record)] = {
+                    'register': register,
+                    'thread': threading.get_ident(),
+                    'since': time.monotonic(),
+                    'stack': _checkout_site(),
+                    'reported': False
+                }
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        _update_pool_gauges(engine, register, returning=True)
+        with _checkouts_lock:
+            _checkouts.pop(id(record), None)
+
+def report_leaks():
+    """Log connections this thread checked out and did not return by the end of the request"""
+    thread = threading.get_ident()
+    with _checkouts_lock:
+        leaks = [info for info in _checkouts.values() if info['thread'] == thread and not info['reported']]
+        for info in leaks:
+            info['reported'] = True
+    for info in leaks:
+        LEAKED.inc(register=info['register'])
+        logger.warning(f"Register {info['register']} connection still checked out "
+                       f"{time.monotonic() - info['since']:.3f}s after checkout, at the end of the request. "
+                       f"Checked out at:\n{info['stack']}")
+
+_instrumented = set()
+
+def init_app(app):
+    """Request-scoped sessions and pool diagnostics"""
+    global _leak_debug
+    _leak_debug = LEAK_DEBUG or app.debug
+    for register, engine in ENGINES.items():
+        if register not in _instrumented:
+            instrument_pool(engine, register)
+            _instrumented.add(register)
+    app.teardown_appcontext(close_sessions)
@@ -0,0 +1,201 @@
+import re
+import csv
+import sqlite3
+import logging
+import argparse
+import unicodedata
+from difflib import SequenceMatcher
+from itertools import combinations
+from seed_best_to_db import REGISTERS
+from date_storage import to_iso
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pairs scoring below this are not reported
+THRESHOLD = 0.85
+# Register 1 column compared with register 2 column for every probable duplicate
+DATE_PAIRS = [('fimo', 'date_validite')]
+# Blocks bigger than this (a very common name) are skipped rather than compared pairwise
+MAX_BLOCK_SIZE = 500
+PREFIX = 3
+
+def name_tokens(*parts):
+    """Lower-case, accent-free words of a name; hyphens, apostrophes and dots separate words"""
+    text = unicodedata.normalize('NFKD', ' '.join(part or '' for part in parts))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return [token for token in re.split(r"[^a-z0-9]+", text) if token]
+
+def normalize_name(nom, prenom):
+    """Word-order independent form of a full name: 'Ahmed-Yahiaoui Karim' -> 'ahmed karim yahiaoui'"""
+    return ' '.join(sorted(name_tokens(nom, prenom)))
+
+def blocking_keys(tokens):
+    """Keys of the blocks a name is compared in.
+
+    The sorted name itself, plus every pair of word prefixes: two spellings
+    share a block when they agree on the first letters of two words, in any order.
+    """
+    keys = {' '.join(sorted(tokens))}
+    prefixes = sorted({token[:PREFIX] for token in tokens})
+    keys.update(f"{a}|{b}" for a, b in combinations(prefixes, 2))
+    return keys
+
+def load_people(register, db_path=None):
+    """[(id, nom, prenom, {date column: value})] from a register's database"""
+    config = REGISTERS[register]
+    date_fields = config['date_fields']
+    conn = sqlite3.connect(db_path or config['db_path'])
+    try:
+        rows = conn.execute(f"SELECT id, nom, prenom, {', '.join(date_fields)} FROM {config['table']}").fetchall()
+    finally:
+        conn.close()
+    return [(row[0], row[1], row[2], dict(zip(date_fields, map(to_iso, row[3:])))) for row in rows]
+
+def _scores(name, candidates, threshold):
+    """Yield (candidate, score) for candidates scoring at least threshold against name.
+
+    The matcher keeps name as its second sequence (analysed once), and the
+    cheap upper bounds discard most candidates before the full ratio.
+    """
+    matcher = SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(name)
+    for candidate, other in candidates:
+        if other == name:
+            yield candidate, 1.0
+            continue
+        matcher.set_seq1(other)
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            continue
+        similarity = matcher.ratio()
+        if similarity >= threshold:
+            yield candidate, similarity
+
+def find_duplicates(people_1, people_2, threshold=THRESHOLD, date_pairs=DATE_PAIRS):
+    """Probable cross-register duplicates, compared block by block.
+
+    Returns (matches, stats); each match is a dict with both rows, the score
+    and the date mismatches found for date_pairs.
+    """
+    blocks = {}
+    normalized = {}
+    for register, people in ((1, people_1), (2, people_2)):
+        for person in people:
+            tokens = name_tokens(person[1], person[2])
+            if not tokens:
+                continue
+            normalized[(register, person[0])] = ' '.join(sorted(tokens))
+            for key in blocking_keys(tokens):
+                blocks.setdefault(key, ([], []))[register - 1].append(person)
+
+    seen = set()
+    matches = []
+    comparisons = 0
+    skipped = 0
+    for key, (side_1, side_2) in blocks.items():
+        if not side_1 or not side_2:
+            continue
+        if len(side_1) + len(side_2) > MAX_BLOCK_SIZE:
+            skipped += 1
+            logger.warning(f"Block {key!r} skipped: {len(side_1)} x {len(side_2)} candidates")
+            continue
+        for person_1 in side_1:
+            # A pair sharing several blocks is only compared in the first one
+            candidates = [(person_2, normalized[(2, person_2[0])]) for person_2 in side_2
+                          if (person_1[0], person_2[0]) not in seen]
+            seen.update((person_1[0], person_2[0]) for person_2, _ in candidates)
+            comparisons += len(candidates)
+            for person_2, similarity in _scores(normalized[(1, person_1[0])], candidates, threshold):
+                matches.append({
+                    'score': similarity,
+                    'register_1': person_1,
+                    'register_2': person_2,
+                    'mismatches': date_mismatches(person_1[3], person_2[3], date_pairs)
+                })
+    matches.sort(key=lambda match: (-match['score'], match['register_1'][1], match['register_1'][2]))
+    stats = {
+        'people_1': len(people_1),
+        'people_2': len(people_2),
+        'blocks': len(blocks),
+        'comparisons': comparisons,
+        'all_pairs': len(people_1) * len(people_2),
+        'skipped_blocks': skipped
+    }
+    return matches, stats
+
+def date_mismatches(dates_1, dates_2, date_pairs):
+    """[(field_1, value_1, field_2, value_2)] for each configured pair that disagrees"""
+    mismatches = []
+    for field_1, field_2 in date_pairs:
+        value_1, value_2 = dates_1.get(field_1), dates_2.get(field_2)
+        if (value_1 or None) != (value_2 or None):
+            mismatches.append((field_1, value_1, field_2, value_2))
+    return mismatches
+
+def parse_date_pairs(values):
+    """['fimo=date_validite', ...] -> [('fimo', 'date_validite'), ...], checked against both registers"""
+    pairs = []
+    for value in values:
+        field_1, _, field_2 = value.partition('=')
+        if field_1 not in REGISTERS[1]['date_fields'] or field_2 not in REGISTERS[2]['date_fields']:
+            raise argparse.ArgumentTypeError(
+                f"{value!r}: expected <register 1 date>=<register 2 date>, "
+                f"e.g. fimo=date_validite ({', '.join(REGISTERS[1]['date_fields'])} / "
+                f"{', '.join(REGISTERS[2]['date_fields'])})")
+        pairs.append((field_1, field_2))
+    return pairs
+
+def print_report(matches, stats, mismatches_only=False):
+    """Print the probable duplicates and their date mismatches"""
+    reduction = 1 - stats['comparisons'] / stats['all_pairs'] if stats['all_pairs'] else 0
+    print(f"Register 1: {stats['people_1']} people, register 2: {stats['people_2']} people")
+    print(f"  blocks       : {stats['blocks']}")
+    print(f"  comparisons  : {stats['comparisons']} ({reduction:.1%} fewer than all {stats['all_pairs']} pairs)")
+    if stats['skipped_blocks']:
+        print(f"  skipped      : {stats['skipped_blocks']} oversized blocks")
+    print(f"  duplicates   : {len(matches)}")
+    print(f"  mismatching  : {sum(1 for match in matches if match['mismatches'])}")
+    print()
+    print(f"  {'score':>5}  {'id 1':>6}  {'register 1':<32} {'id 2':>6}  {'register 2':<32} dates")
+    for match in matches:
+        if mismatches_only and not match['mismatches']:
+            continue
+        id_1, nom_1, prenom_1, _ = match['register_1']
+        id_2, nom_2, prenom_2, _ = match['register_2']
+        dates = '; '.join(f"{f1}={v1 or '-'} / {f2}={v2 or '-'}" for f1, v1, f2, v2 in match['mismatches']) or 'ok'
+        print(f"  {match['score']:5.2f}  {id_1:>6}  {f'{nom_1} {prenom_1}':<32.32} {id_2:>6}  "
+              f"{f'{nom_2} {prenom_2}':<32.32} {dates}")
+
+def write_csv(matches, path):
+    """One line per probable duplicate, with its date mismatches"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['score', 'id_1', 'nom_1', 'prenom_1', 'id_2', 'nom_2', 'prenom_2', 'mismatches'])
+        for match in matches:
+            id_1, nom_1, prenom_1, _ = match['register_1']
+            id_2, nom_2, prenom_2, _ = match['register_2']
+            writer.writerow([f"{match['score']:.3f}", id_1, nom_1, prenom_1, id_2, nom_2, prenom_2,
+                             '; '.join(f"{f1}={v1 or ''}/{f2}={v2 or ''}" for f1, v1, f2, v2 in match['mismatches'])])
+
+def main():
+    parser = argparse.ArgumentParser(description="List people present in both registers and their date mismatches")
+    parser.add_argument("--db1", help="register 1 database (default: SQLALCHEMY_DATABASE_URL_1)")
+    parser.add_argument("--db2", help="register 2 database (default: SQLALCHEMY_DATABASE_URL_2)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help=f"minimum name similarity (default: {THRESHOLD})")
+    parser.add_argument("--dates", nargs="*", default=[f"{a}={b}" for a, b in DATE_PAIRS],
+                        help="date columns to compare, as <register 1>=<register 2> (default: fimo=date_validite)")
+    parser.add_argument("--mismatches-only", action="store_true", help="only list duplicates whose dates disagree")
+    parser.add_argument("--csv", help="also write the duplicates to this CSV file")
+    args = parser.parse_args()
+    try:
+        date_pairs = parse_date_pairs(args.dates)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    matches, stats = find_duplicates(load_people(1, args.db1), load_people(2, args.db2), args.threshold, date_pairs)
+    print_report(matches, stats, args.mismatches_only)
+    if args.csv:
+        write_csv(matches, args.csv)
+        print(f"\nWritten to {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import logging
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+# E-mail templates live next to the web templates but use their own environment:
+# they are compiled once on first use and never re-checked on disk.
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "emails")
+
+# Without an escalation step (escalation.json), notifications due within this many days are urgent
+URGENT_DAYS = 4
+
+SIGNATURE = "Agent artificielle chargé des collaborateurs Bourgeois Travaux Publics"
+
+DETAIL_FIELDS = [
+    ('fimo', 'FIMO'),
+    ('caces', 'CACES'),
+    ('aipr', 'AIPR'),
+    ('hg0b0', 'H0B0'),
+    ('visite_med', 'Visite médicale'),
+    ('brevet_secour', 'Brevet secouriste'),
+    ('date_renouvellement', 'Date de renouvellement'),
+    ('date_validite', 'Date de validité')
+]
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    """Return a compiled e-mail template (compiled once per process)"""
+    return _env.get_template(name)
+
+def get_field(cdata, key, default=None):
+    """Read a field from a notification dict or a SQLAlchemy object"""
+    if isinstance(cdata, dict):
+        value = cdata.get(key, default)
+    else:
+        value = getattr(cdata, key, default)
+    return default if value is None else value
+
+def get_collaborateur_identifier(collaborateur_data):
+    """Get the collaborateur identifier (nom + prenom)"""
+    if isinstance(collaborateur_data, dict) and 'license_plate' in collaborateur_data:
+        return collaborateur_data['license_plate']
+    nom = get_field(collaborateur_data, 'nom', '')
+    prenom = get_field(collaborateur_data, 'prenom', '')
+    return f"{nom} {prenom}".strip() or "Collaborateur Inconnu"
+
+def get_collaborateur_fields(cdata):
+    """Return (label, value) pairs for the certifications present on a collaborateur"""
+    return [(label, get_field(cdata, field)) for field, label in DETAIL_FIELDS if get_field(cdata, field)]
+
+def get_notification_subject(collaborateur, notifications):
+    """Return the collaborateur data carried by the notifications, or the collaborateur itself"""
+    if isinstance(notifications, list) and notifications and 'vehicle_data' in notifications[0]:
+        return notifications[0]['vehicle_data']
+    return collaborateur
+
+def is_urgent_notification(notification):
+    """True if the notification's escalation step is urgent (or, without a step, if due within URGENT_DAYS)"""
+    if 'urgent' in notification:
+        return notification['urgent']
+    return notification.get('days_until', 999) <= URGENT_DAYS
+
+def is_urgent(notifications):
+    """True if any of the notifications is urgent"""
+    return isinstance(notifications, list) and any(is_urgent_notification(n) for n in notifications)
+
+def build_context(collaborateur, notifications):
+    """Build the template context shared by the text and HTML variants"""
+    cdata = get_notification_subject(collaborateur, notifications)
+    has_notifications = isinstance(notifications, list) and bool(notifications)
+    return {
+        'identifier': get_collaborateur_identifier(cdata),
+        'nom': get_field(cdata, 'nom', 'N/A'),
+        'prenom': get_field(cdata, 'prenom', ''),
+        'fields': get_collaborateur_fields(cdata),
+        'commentaire': get_field(cdata, 'commentaire') or get_field(cdata, 'comments'),
+        'has_notifications': has_notifications,
+        'notifications': [
+            {
+                'type': n['type'],
+                'due_date': n['due_date'],
+                'message': n.get('message', ''),
+                'urgent': is_urgent_notification(n)
+            }
+            for n in notifications
+        ] if has_notifications else [],
+        'raw_notifications': '' if has_notifications else str(notifications),
+        'urgent': is_urgent(notifications),
+        'urgent_days': URGENT_DAYS,
+        'signature': SIGNATURE
+    }
+
+def render_subject(collaborateur, notifications):
+    """Render the e-mail subject line"""
+    prefix = "🚨 URGENT - SUSPENSION REQUISE" if is_urgent(notifications) else "Rappel de Certification"
+    return f"{prefix} - {get_collaborateur_identifier(get_notification_subject(collaborateur, notifications))}"
+
+def render_email(collaborateur, notifications):
+    """Render the e-mail for a collaborateur.
+
+    Returns (subject, text_body, html_body).
+    """
+    context = build_context(collaborateur, notifications)
+    variant = "urgent" if is_urgent(notifications) else "notification"
+    text = get_template(f"{variant}.txt").render(context)
+    html = get_template(f"{variant}.html").render(context)
+    return render_subject(collaborateur, notifications), text, html
+
+def render_prompt(collaborateur, notifications):
+    """Render the French prompt sent to language-model providers"""
+    return get_template("prompt.txt").render(build_context(collaborateur, notifications))
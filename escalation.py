@@ -0,0 +1,118 @@
+import os
+import json
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ESCALATION_CONFIG = os.getenv("ESCALATION_CONFIG", os.path.join(BASE_DIR, "escalation.json"))
+
+Step = namedtuple("Step", "days recipients urgent daily")
+
+class Ladder:
+    """Reminder steps per certification column, compiled into day-indexed tables.
+
+    tables[field][days_until] is the step a due item is at, or None when
+    nothing is sent that day, so classifying an item is one list lookup.
+    """
+
+    def __init__(self, config):
+        self.steps = {}
+        self.tables = {}
+        for field, steps in config.items():
+            if field.startswith('_'):
+                continue
+            self.steps[field] = compile_steps(field, steps)
+            self.tables[field] = build_table(self.steps[field])
+        if 'default' not in self.steps:
+            raise ValueError("Escalation config needs a 'default' ladder")
+        # Recipients never reached by a non-urgent step get an "URGENT - " subject
+        regular = {name for steps in self.steps.values() for step in steps if not step.urgent
+                   for name in step.recipients}
+        self.urgent_only = {name for steps in self.steps.values() for step in steps
+                            for name in step.recipients} - regular
+
+    def step_for(self, field, days_until):
+        """The step an item due in days_until days is at, or None"""
+        table = self.tables.get(field, self.tables['default'])
+        if 0 <= days_until < len(table):
+            return table[days_until]
+        return None
+
+    def window(self, field=None):
+        """How many days ahead a field (or, without one, any field) can trigger a reminder"""
+        if field is not None:
+            return len(self.tables.get(field, self.tables['default'])) - 1
+        return max(len(table) for table in self.tables.values()) - 1
+
+    def thresholds(self, field):
+        """The step days of a field's ladder, widest first"""
+        return [step.days for step in self.steps.get(field, self.steps['default'])]
+
+def compile_steps(field, steps):
+    """Validate a ladder's steps and sort them widest first"""
+    if not isinstance(steps, list) or not steps:
+        raise ValueError(f"Escalation ladder '{field}' must be a non-empty list of steps")
+    compiled = []
+    for step in steps:
+        try:
+            days = int(step['days'])
+            recipients = step.get('recipients', step.get('recipient'))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Escalation ladder '{field}': every step needs an integer 'days'")
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        if days < 0 or not recipients:
+            raise ValueError(f"Escalation ladder '{field}': step {days} needs days >= 0 and a recipient")
+        compiled.append((days, tuple(recipients), bool(step.get('urgent', False)), bool(step.get('daily', True))))
+    compiled.sort(key=lambda item: item[0], reverse=True)
+    if len({days for days, _, _, _ in compiled}) != len(compiled):
+        raise ValueError(f"Escalation ladder '{field}' has two steps with the same days")
+    return [Step(*item) for item in compiled]
+
+def build_table(steps):
+    """days_until -> step, from 0 to the widest step.
+
+    A step with daily=False is only in the table on its own day. Nothing
+    records what was sent, so a missed or failed run on that day loses it.
+    """
+    table = [None] * (steps[0].days + 1)
+    for step in steps:  # widest first, so tighter steps overwrite
+        for days in range(step.days + 1):
+            table[days] = step if step.daily or days == step.days else None
+    return table
+
+@lru_cache(maxsize=None)
+def load_ladder(path=None):
+    """Compile the escalation config (ESCALATION_CONFIG) once per process"""
+    path = path or ESCALATION_CONFIG
+    with open(path, encoding='utf-8') as f:
+        ladder = Ladder(json.load(f))
+    logger.info(f"Escalation ladders loaded from {path}: {', '.join(ladder.steps)}")
+    return ladder
+
+_unresolved = set()
+
+def resolve_recipients(names, known=None):
+    """E-mail addresses for recipient names: known[name], an environment variable, or a literal address"""
+    addresses = []
+    for name in names:
+        address = name if '@' in name else (known or {}).get(name) or os.getenv(name)
+        if not address:
+            if name not in _unresolved:
+                _unresolved.add(name)
+                logger.warning(f"Escalation recipient {name} is not configured; its reminders are skipped")
+            continue
+        if address not in addresses:
+            addresses.append(address)
+    return addresses
+
+def group_by_recipient(notifications):
+    """{recipient name: [notifications]} following each notification's step"""
+    groups = {}
+    for notification in notifications:
+        for name in notification['recipients']:
+            groups.setdefault(name, []).append(notification)
+    return groups
@@ -0,0 +1,100 @@
+import os
+import gzip
+import hashlib
+import logging
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, session, make_response
+from register_versions import get_version
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 500
+GZIP_LEVEL = 6
+GZIP_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/calendar',
+    'application/json', 'application/javascript', 'text/javascript'
+}
+
+def _deployment_time():
+    """Last change of the code or templates, so a deploy invalidates old ETags and dates"""
+    latest = 0.0
+    for folder in (BASE_DIR, os.path.join(BASE_DIR, 'templates')):
+        for name in os.listdir(folder):
+            if name.endswith(('.py', '.html')):
+                latest = max(latest, os.path.getmtime(os.path.join(folder, name)))
+    return latest
+
+DEPLOYMENT_SALT = str(_deployment_time())
+# Whole seconds, like HTTP dates
+DEPLOYED_AT = int(float(DEPLOYMENT_SALT))
+
+def conditional(*registers, extra=None):
+    """Serve 304 Not Modified when none of the registers changed.
+
+    The ETag covers the URL, the registers' version counters and, when
+    given, the value returned by extra() (e.g. today's date). The check runs
+    before the view, so an unchanged page costs one version lookup per
+    register and never reaches SQLAlchemy sessions or Jinja.
+
+    Last-Modified is the latest register write or deploy. Views with extra()
+    get none, because a date cannot show that value changing, so
+    If-Modified-Since alone never gets them a 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message must be rendered, never answered with 304
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            versions = [get_version(register) for register in registers]
+            key = '|'.join([DEPLOYMENT_SALT, request.full_path, extra() if extra else '',
+                            *(str(version) for version, _ in versions)])
+            etag = hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+            last_modified = None
+            if extra is None:
+                timestamps = [updated_at for _, updated_at in versions if updated_at]
+                last_modified = datetime.fromtimestamp(max(timestamps + [DEPLOYED_AT]), timezone.utc)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since)
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            response.cache_control.private = True
+            return response
+        return wrapper
+    return decorator
+
+def gzip_response(response):
+    """after_request hook: gzip text responses for clients that accept it"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in GZIP_MIMETYPES
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_app(app):
+    """Register response compression on a Flask app"""
+    app.after_request(gzip_response)
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import tempfile
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from seed_best_to_db import BASE_DIR, REGISTERS, import_csv
+from metrics import Counter, Histogram
+
+# Optional: without fcntl (Windows) only the in-process executor serialises imports
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Job state is shared by all web workers through this file. It is not kept in
+# the register databases: an import holds their write lock until it commits,
+# which would block its own progress updates.
+IMPORT_JOBS_DB = os.getenv("IMPORT_JOBS_DB", os.path.join(BASE_DIR, "import_jobs.db"))
+
+# One thread per process; imports from other processes wait on the register's lock file
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="csv-import")
+
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION_SECONDS = 24 * 3600
+# Errors kept in a job's stored report; error_count is always complete
+STORED_ERRORS = 50
+
+CREATE_SQL = (
+    "CREATE TABLE IF NOT EXISTS import_jobs ("
+    "id TEXT PRIMARY KEY, register INTEGER NOT NULL, filename TEXT, mode TEXT NOT NULL, "
+    "delete_missing INTEGER NOT NULL, status TEXT NOT NULL, message TEXT NOT NULL, report TEXT, "
+    "created_at REAL NOT NULL, finished_at REAL)"
+)
+COLUMNS = ('id', 'register', 'filename', 'mode', 'delete_missing', 'status', 'message', 'report',
+           'created_at', 'finished_at')
+SUMMARY_FIELDS = ('rows_read', 'rows_written', 'inserted', 'updated', 'unchanged', 'deleted', 'elapsed')
+
+IMPORT_JOBS = Counter("csv_import_jobs_total", "CSV import jobs by register and outcome.", ("register", "status"))
+IMPORT_ROWS = Counter("csv_import_rows_total", "Rows handled by CSV imports by register and result.",
+                      ("register", "result"))
+IMPORT_DURATION = Histogram("csv_import_duration_seconds", "Duration of CSV import jobs.", ("register",),
+                            buckets=(1, 5, 15, 30, 60, 120, 300, 600))
+
+def summarize(report):
+    """The counters and first errors of an import report, as stored with the job"""
+    errors = report.get('errors', [])
+    summary = {field: report.get(field, 0) for field in SUMMARY_FIELDS}
+    summary['error_count'] = len(errors)
+    summary['errors'] = errors[:STORED_ERRORS]
+    return summary
+
+class ImportJob:
+    """State of a background CSV import, saved after every chunk"""
+
+    def __init__(self, register, filename, mode, delete_missing):
+        self.id = uuid.uuid4().hex
+        self.register = register
+        self.filename = filename
+        self.mode = mode
+        self.delete_missing = delete_missing
+        self.status = "queued"
+        self.message = ""
+        self.report = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        for column, value in zip(COLUMNS, row):
+            setattr(job, column, value)
+        job.delete_missing = bool(job.delete_missing)
+        job.report = json.loads(job.report) if job.report else None
+        return job
+
+    def to_row(self):
+        values = {column: getattr(self, column) for column in COLUMNS}
+        values['report'] = json.dumps(self.report) if self.report is not None else None
+        return values
+
+    def to_dict(self):
+        report = self.report or {}
+        elapsed = report.get('elapsed', 0.0)
+        rows_read = report.get('rows_read', 0)
+        return {
+            'id': self.id,
+            'register': self.register,
+            'filename': self.filename,
+            'mode': self.mode,
+            'status': self.status,
+            'message': self.message,
+            'rows_processed': rows_read,
+            'rows_written': report.get('rows_written', 0),
+            'inserted': report.get('inserted', 0),
+            'updated': report.get('updated', 0),
+            'unchanged': report.get('unchanged', 0),
+            'deleted': report.get('deleted', 0),
+            'error_count': report.get('error_count', 0),
+            'errors': report.get('errors', []),
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round(rows_read / elapsed) if elapsed else 0
+        }
+
+def _connect():
+    conn = sqlite3.connect(IMPORT_JOBS_DB, timeout=30)
+    conn.execute(CREATE_SQL)
+    return conn
+
+def _save(job):
+    """Insert or update the job's row; every worker reads it from there"""
+    values = job.to_row()
+    with closing(_connect()) as conn, conn:
+        conn.execute(f"INSERT OR REPLACE INTO import_jobs ({', '.join(COLUMNS)}) "
+                     f"VALUES ({', '.join(':' + column for column in COLUMNS)})", values)
+
+@contextmanager
+def register_lock(register):
+    """Hold the register's import lock file, so one import at a time writes to it across processes.
+
+    The lock goes with the process, so a killed worker does not leave it taken.
+    """
+    with open(REGISTERS[register]['db_path'] + ".import.lock", "a") as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+def _run(job, path):
+    """Run the import in the worker thread and record its outcome"""
+    def progress(report):
+        job.report = summarize(report)
+        _save(job)
+
+    try:
+        with register_lock(job.register):
+            job.status = "running"
+            _save(job)
+            report = import_csv(job.register, csv_path=path, progress=progress,
+                                mode=job.mode, delete_missing=job.delete_missing)
+        job.report = summarize(report)
+        job.status = "done"
+        logger.info(f"Import {job.id} of {job.filename} finished: {report['rows_written']} rows written")
+    except Exception as e:
+        job.status = "failed"
+        job.message = str(e)
+        logger.error(f"Import {job.id} of {job.filename} failed: {str(e)}")
+    finally:
+        job.finished_at = time.time()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        record_metrics(job)
+        _save(job)
+
+def record_metrics(job):
+    """Count a finished job and the rows it handled"""
+    report = job.report or {}
+    IMPORT_JOBS.inc(register=job.register, status=job.status)
+    if job.mode == "diff":
+        for result in ('inserted', 'updated', 'unchanged', 'deleted'):
+            IMPORT_ROWS.inc(report.get(result, 0), register=job.register, result=result)
+    else:
+        IMPORT_ROWS.inc(report.get('rows_written', 0), register=job.register, result='written')
+    IMPORT_ROWS.inc(report.get('error_count', 0), register=job.register, result='error')
+    IMPORT_DURATION.observe(job.finished_at - job.created_at, register=job.register)
+
+def _purge_finished(conn):
+    # Also drops jobs left queued or running by a worker that was killed
+    conn.execute("DELETE FROM import_jobs WHERE COALESCE(finished_at, created_at) < ?",
+                 (time.time() - JOB_RETENTION_SECONDS,))
+
+def start_import(register, upload, mode="replace", delete_missing=False):
+    """Save an uploaded CSV to a temporary file and queue its import.
+
+    upload is a werkzeug FileStorage. Returns the ImportJob.
+    """
+    fd, path = tempfile.mkstemp(prefix=f"import_{register}_", suffix=".csv")
+    with os.fdopen(fd, "wb") as tmp:
+        upload.save(tmp)
+    job = ImportJob(register, upload.filename, mode, delete_missing)
+    with closing(_connect()) as conn, conn:
+        _purge_finished(conn)
+    _save(job)
+    _executor.submit(_run, job, path)
+    logger.info(f"Queued import {job.id} of {upload.filename} into register {register}")
+    return job
+
+def get_job(job_id):
+    """Return an ImportJob by id, whichever worker runs it, or None"""
+    with closing(_connect()) as conn:
+        row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    return ImportJob.from_row(row) if row else None
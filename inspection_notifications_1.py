@@ -5,15 +5,20 @@ from datetime import datetime, timedelta, date
 import os
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
-from sqlalchemy import create_engine, and_, or_
+from sqlalchemy import create_engine, select, and_, or_
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
-from models_1 import Collaborateur
+from models_1 import Collaborateur, CollaborateurRow
 import logging
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from gemini_service import generate_email_content
-# from chatgpt_service import generate_email_content
+from content_providers import generate_email
+from validation import parse_date as validation_parse_date
+from date_storage import is_date_type
+from escalation import load_ladder, resolve_recipients, group_by_recipient
+import metrics
+import profiling
+import argparse
 
 # Set up logging
 logging.basicConfig(
@@ -40,6 +45,9 @@ if not all([SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD, RECIPIENT_EMA
 if not RECIPIENT_EMAIL_2:
     logger.warning("RECIPIENT_EMAIL_2 not configured. Second recipient notifications will be disabled.")
 
+# Recipient names used by the escalation ladders (escalation.json)
+RECIPIENTS = {'RECIPIENT_EMAIL': RECIPIENT_EMAIL, 'RECIPIENT_EMAIL_2': RECIPIENT_EMAIL_2}
+
 try:
     SMTP_PORT = int(SMTP_PORT) if SMTP_PORT is not None else 587
 except (TypeError, ValueError):
@@ -89,26 +97,14 @@ def validate_date(date_obj):
     return date_obj <= max_future_date
 
 def parse_date(value):
-    """Parse a value as a date, supporting date, datetime, and string formats.
-
-    Accept only ISO format "%Y-%m-%d".
-    """
-    if value is None:
+    """Parse a value as a date (see validation.parse_date); None if it is not a valid date."""
+    try:
+        return validation_parse_date(value)
+    except ValueError:
         return None
-    if isinstance(value, date):
-        return value
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, str):
-        try:
-            return datetime.strptime(value.strip(), "%Y-%m-%d").date()
-        except Exception:
-            return None
-    return None
 
 def get_date_fields_from_model(model):
     """Return list of (attr_name, label) for all Date columns in the model."""
-    from sqlalchemy import Date
     fields = []
     label_map = {
         'fimo': 'FIMO',
@@ -119,55 +115,79 @@ def get_date_fields_from_model(model):
         'brevet_secour': 'Brevet secouriste'
     }
     for col in model.__table__.columns:
-        if isinstance(col.type, Date):
+        if is_date_type(col.type):
             name = col.name
             label = label_map.get(name, name.replace('_', ' ').title())
             fields.append((name, label))
     return fields
 
-def get_collaborateur_notifications(collaborateur, today, two_weeks_later):
-    """Extract notifications for a collaborateur (all date fields)."""
+def get_collaborateur_notifications(collaborateur, today, ladder=None):
+    """Extract notifications for a collaborateur (all date fields), each at its escalation step."""
+    ladder = ladder or load_ladder()
     notifications = []
     for field, label in get_date_fields_from_model(Collaborateur):
         raw = getattr(collaborateur, field, None)
         expiry_date = parse_date(raw)
-        if expiry_date and validate_date(expiry_date) and today <= expiry_date <= two_weeks_later:
-            days_until = (expiry_date - today).days
+        if not expiry_date or not validate_date(expiry_date):
+            continue
+        days_until = (expiry_date - today).days
+        step = ladder.step_for(field, days_until)
+        if step:
             notifications.append({
                 'type': label,
                 'field': field,
                 'due_date': expiry_date.strftime('%Y-%m-%d'),
-                'days_until': days_until
+                'days_until': days_until,
+                'step': step.days,
+                'urgent': step.urgent,
+                'recipients': step.recipients
             })
     return notifications
 
+# Read-only scan: rows come back as CollaborateurRow tuples, not session-tracked instances
+DUE_CANDIDATES = select(*Collaborateur.__table__.columns).where(
+    or_(
+        Collaborateur.fimo.isnot(None),
+        Collaborateur.caces.isnot(None),
+        Collaborateur.aipr.isnot(None),
+        Collaborateur.hg0b0.isnot(None),
+        Collaborateur.visite_med.isnot(None),
+        Collaborateur.brevet_secour.isnot(None)
+    )
+)
+
+def find_due_notifications(db, today):
+    """Return [(collaborateur, notifications)] for everyone with a certification at an escalation step."""
+    ladder = load_ladder()
+    collaborateurs = map(CollaborateurRow._make, db.execute(DUE_CANDIDATES))
+    due = []
+    for collaborateur in collaborateurs:
+        notifications = get_collaborateur_notifications(collaborateur, today, ladder)
+        if notifications:
+            due.append((collaborateur, notifications))
+    return due
+
 def check_inspection_dates():
     """Check collaborateur inspection dates and send notifications if needed."""
     db = None
     try:
         db = get_db()
         today = get_current_date()
-        two_weeks_later = today + timedelta(days=14)
-
-        logger.info(f"Checking inspections between {today} and {two_weeks_later}")
-
-        collaborateurs = db.query(Collaborateur).filter(
-            or_(
-                Collaborateur.fimo.isnot(None),
-                Collaborateur.caces.isnot(None),
-                Collaborateur.aipr.isnot(None),
-                Collaborateur.hg0b0.isnot(None),
-                Collaborateur.visite_med.isnot(None),
-                Collaborateur.brevet_secour.isnot(None)
-            )
-        ).all()
-
-        if not collaborateurs:
+        horizon = today + timedelta(days=load_ladder().window())
+
+        logger.info(f"Checking inspections between {today} and {horizon}")
+
+        due = find_due_notifications(db, today)
+        # Counted before any SMTP work, so a failed connection still reports what was due
+        metrics.NOTIFIER_NOTIFICATIONS.set(sum(len(notifications) for _, notifications in due), register=1)
+
+        if not due:
             logger.info(f"No notifications needed for {today}")
             return
 
-        logger.info(f"Found {len(collaborateurs)} collaborateurs requiring notifications")
+        logger.info(f"Found {len(due)} collaborateurs requiring notifications")
 
+        failed = 0
         try:
             if SMTP_SERVER is None or SMTP_PORT is None:
                 raise ValueError("SMTP_SERVER and SMTP_PORT must be configured")
@@ -196,21 +216,19 @@ def check_inspection_dates():
                     logger.error("2. Enable 2-Factor Authentication and generate an app password")
                     logger.error("3. Verify 'Less secure app access' is disabled (use app password instead)")
                     logger.error("4. Check Gmail account settings allow IMAP/SMTP access")
-                    logger.info("Continuing without sending emails - notifications identified:")
+                    logger.info("Notifications identified but not sent:")
 
-                    for collaborateur in collaborateurs:
-                        notifications = get_collaborateur_notifications(collaborateur, today, two_weeks_later)
+                    for collaborateur, notifications in due:
                         if notifications:
                             msg = f"WOULD SEND: Collaborateur {collaborateur.nom} {collaborateur.prenom} - {len(notifications)} notification(s)"
                             logger.info(msg)
                             for notif in notifications:
                                 msg = f"  - {notif['type']}: Due {notif['due_date']} ({notif['days_until']} days)"
                                 logger.info(msg)
-                    return
+                    raise
 
-                for collaborateur in collaborateurs:
+                for collaborateur, notifications in due:
                     try:
-                        notifications = get_collaborateur_notifications(collaborateur, today, two_weeks_later)
                         enhanced_notifications = []
                         for notif in notifications:
                             enhanced_notifications.append({
@@ -223,92 +241,100 @@ def check_inspection_dates():
                                 },
                                 'due_date': notif['due_date'],
                                 'message': f'{notif["type"]} à renouveler dans {notif["days_until"]} jours',
-                                'days_until': notif['days_until']
+                                'days_until': notif['days_until'],
+                                'urgent': notif['urgent'],
+                                'recipients': notif['recipients']
                             })
                         if enhanced_notifications:
                             send_notification_email(server, collaborateur, enhanced_notifications)
 
                     except Exception as e:
+                        # The others are still notified; the run fails at the end
                         logger.error(f"Error processing collaborateur {collaborateur.nom} {collaborateur.prenom}: {e}")
+                        failed += 1
                         continue
 
         except smtplib.SMTPServerDisconnected as e:
             logger.error(f"SMTP server disconnected: {e}. Email notifications will be skipped.")
-            logger.info("Continuing without sending emails - notifications have been identified but not sent.")
-            return
+            logger.info("Notifications have been identified but not sent.")
+            raise
         except smtplib.SMTPConnectError as e:
             logger.error(f"SMTP connection error: {e}. Email notifications will be skipped.")
-            logger.info("Continuing without sending emails - notifications have been identified but not sent.")
-            return
+            logger.info("Notifications have been identified but not sent.")
+            raise
         except ConnectionRefusedError as e:
             logger.error(f"Connection refused: {e}. Check if the SMTP server is accessible.")
-            logger.info("Continuing without sending emails - notifications have been identified but not sent.")
-            return
+            logger.info("Notifications have been identified but not sent.")
+            raise
         except (smtplib.SMTPException, ConnectionError, OSError) as e:
             logger.error(f"SMTP connection failed: {e}. Email notifications will be skipped.")
-            logger.info("Continuing without sending emails - notifications have been identified but not sent.")
-            return
+            logger.info("Notifications have been identified but not sent.")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error with email server: {e}")
-            return
+            raise
+
+        if failed:
+            raise RuntimeError(f"{failed} of {len(due)} collaborateurs could not be notified")
 
     except Exception as e:
         logger.error(f"Error in check_inspection_dates: {e}")
+        raise
     finally:
         if db:
             db.close()
 
 def send_notification_email(server, collaborateur, notifications):
-    """Send notification email for a specific collaborateur."""
-    try:
-        subject, body = generate_email_content(collaborateur, notifications)
-
-        msg = MIMEMultipart()
-        if SENDER_EMAIL is None or RECIPIENT_EMAIL is None:
-            raise ValueError("SENDER_EMAIL and RECIPIENT_EMAIL must be configured")
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        server.send_message(msg)
-        logger.info(f"Notification email sent to {RECIPIENT_EMAIL} for collaborateur {collaborateur.nom} {collaborateur.prenom}")
-
-        if RECIPIENT_EMAIL_2:
-            urgent_notifications = [notif for notif in notifications if notif['days_until'] <= 4]
-
-            if urgent_notifications:
-                urgent_subject, urgent_body = generate_email_content(collaborateur, urgent_notifications)
-
-                msg2 = MIMEMultipart()
-                if SENDER_EMAIL is None:
-                    raise ValueError("SENDER_EMAIL must be configured")
-                msg2['From'] = SENDER_EMAIL
-                msg2['To'] = RECIPIENT_EMAIL_2
-                msg2['Subject'] = f"URGENT - {urgent_subject}"
-                msg2.attach(MIMEText(urgent_body, 'plain'))
-
-                server.send_message(msg2)
-                msg = f"Urgent notification email sent to {RECIPIENT_EMAIL_2} for collaborateur {collaborateur.nom} {collaborateur.prenom} ({len(urgent_notifications)} urgent inspection(s))"
-                logger.info(msg)
+    """Send the notification emails for a specific collaborateur, one per escalation recipient."""
+    ladder = load_ladder()
+    failed = None
+    for name, recipient_notifications in group_by_recipient(notifications).items():
+        addresses = resolve_recipients([name], RECIPIENTS)
+        if not addresses:
+            continue
+        kind = 'urgent' if any(notif['urgent'] for notif in recipient_notifications) else 'standard'
+        try:
+            subject, body, html = generate_email(collaborateur, recipient_notifications)
+
+            msg = MIMEMultipart('alternative')
+            if SENDER_EMAIL is None:
+                raise ValueError("SENDER_EMAIL must be configured")
+            msg['From'] = SENDER_EMAIL
+            msg['To'] = ', '.join(addresses)
+            msg['Subject'] = f"URGENT - {subject}" if name in ladder.urgent_only else subject
+            msg.attach(MIMEText(body, 'plain'))
+            if html:
+                msg.attach(MIMEText(html, 'html'))
+
+            server.send_message(msg)
+            metrics.NOTIFIER_EMAILS.inc(register=1, kind=kind, status='sent')
+            logger.info(f"{kind.capitalize()} notification email sent to {msg['To']} for collaborateur {collaborateur.nom} {collaborateur.prenom} ({len(recipient_notifications)} inspection(s))")
 
-    except Exception as e:
-        logger.error(f"Failed to send notification email for collaborateur {collaborateur.nom} {collaborateur.prenom}: {e}")
-        raise
+        except Exception as e:
+            metrics.NOTIFIER_EMAILS.inc(register=1, kind=kind, status='failed')
+            logger.error(f"Failed to send notification email to {name} for collaborateur {collaborateur.nom} {collaborateur.prenom}: {e}")
+            failed = e
+    if failed:
+        raise failed
 
 def main():
     """Main function to run the notification system."""
-    try:
-        logger.info("Starting Collaborateur Inspection Notification System")
-        current_date = get_current_date()
-        logger.info(f"Current date: {current_date}")
+    with metrics.notifier_run(1):
+        try:
+            logger.info("Starting Collaborateur Inspection Notification System")
+            current_date = get_current_date()
+            logger.info(f"Current date: {current_date}")
 
-        check_inspection_dates()
-        logger.info("Notification check completed successfully")
+            check_inspection_dates()
+            logger.info("Notification check completed successfully")
 
-    except Exception as e:
-        logger.error(f"Error in main function: {e}")
-        raise
+        except Exception as e:
+            logger.error(f"Error in main function: {e}")
+            raise
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send certification expiry notifications for register 1")
+    parser.add_argument("--profile", action="store_true", help="profile the run into PROFILE_DIR")
+    args = parser.parse_args()
+    with profiling.profile_run("notifier_1", enabled=args.profile):
+        main()
@@ -5,13 +5,17 @@ from datetime import datetime, timedelta, date
 import os
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
-from sqlalchemy import create_engine, and_, or_
+from sqlalchemy import create_engine, select, and_, or_
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
-from models_2 import CollaborateurPoidsLouud as Collaborateur
+from models_2 import CollaborateurPoidsLouud as Collaborateur, CollaborateurPoidsLouudRow as CollaborateurRow
 import logging
-from gemini_service import generate_email_content
-#from chatgpt_service import generate_email_content
+from content_providers import generate_email
+from validation import parse_date as validation_parse_date
+from escalation import load_ladder, resolve_recipients, group_by_recipient
+import metrics
+import profiling
+import argparse
 
 # Set up logging
 logging.basicConfig(
@@ -38,6 +42,9 @@ if not all([SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD, RECIPIENT_EMA
 if not RECIPIENT_EMAIL_2:
     logger.warning("RECIPIENT_EMAIL_2 not configured. Second recipient notifications will be disabled.")
 
+# Recipient names used by the escalation ladders (escalation.json)
+RECIPIENTS = {'RECIPIENT_EMAIL': RECIPIENT_EMAIL, 'RECIPIENT_EMAIL_2': RECIPIENT_EMAIL_2}
+
 try:
     SMTP_PORT = int(SMTP_PORT) if SMTP_PORT is not None else 587
 except (TypeError, ValueError):
@@ -81,42 +88,25 @@ def get_db():
 
 def validate_date_field(date_obj):
     """Validate that a date object is valid and not too far in the future."""
-    if not isinstance(date_obj, date):
-        # Attempt to parse if it's a string
-        if isinstance(date_obj, str):
-            try:
-                date_obj = datetime.strptime(date_obj, '%Y-%m-%d').date()
-            except ValueError:
-                logger.warning(f"Invalid date string format: {date_obj}")
-                return False
-        else:
-            logger.warning(f"Invalid date type: {type(date_obj)}")
-            return False
-    
+    date_obj = parse_date(date_obj)
+    if date_obj is None:
+        logger.warning("Invalid date value")
+        return False
+
     max_future_date = get_current_date() + timedelta(days=365*2)  # 2 years max
     return date_obj <= max_future_date
 
 
 def parse_date(value):
-    """Parse a value as a date, supporting date, datetime, and string formats.
-
-    Accept only ISO format "%Y-%m-%d".
-    """
-    if value is None:
+    """Parse a value as a date (see validation.parse_date); None if it is not a valid date."""
+    try:
+        return validation_parse_date(value)
+    except ValueError:
         return None
-    if isinstance(value, date):
-        return value
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, str):
-        try:
-            return datetime.strptime(value.strip(), "%Y-%m-%d").date()
-        except Exception:
-            return None
-    return None
 
-def get_collaborateur_notifications(collaborateur, today, two_weeks_later):
-    """Extract notifications for a collaborateur (date_validite only)."""
+def get_collaborateur_notifications(collaborateur, today, ladder=None):
+    """Extract notifications for a collaborateur (date_validite only), each at its escalation step."""
+    ladder = ladder or load_ladder()
     notifications = []
     # Only scan the date_validite field
     for field, label in [
@@ -124,8 +114,11 @@ def get_collaborateur_notifications(collaborateur, today, two_weeks_later):
     ]:
         raw = getattr(collaborateur, field, None)
         expiry_date = parse_date(raw)
-        if expiry_date and validate_date_field(expiry_date) and today <= expiry_date <= two_weeks_later:
-            days_until = (expiry_date - today).days
+        if not expiry_date or not validate_date_field(expiry_date):
+            continue
+        days_until = (expiry_date - today).days
+        step = ladder.step_for(field, days_until)
+        if step:
             notifications.append({
                 'type': label,
                 'collaborateur_id': collaborateur.id,
@@ -135,30 +128,48 @@ def get_collaborateur_notifications(collaborateur, today, two_weeks_later):
                 },
                 'due_date': expiry_date.strftime('%Y-%m-%d'),
                 'message': f'{label} à renouveler dans {days_until} jours',
-                'days_until': days_until
+                'days_until': days_until,
+                'step': step.days,
+                'urgent': step.urgent,
+                'recipients': step.recipients
             })
     return notifications
 
+# Read-only scan: rows come back as CollaborateurRow tuples, not session-tracked instances
+DUE_CANDIDATES = select(*Collaborateur.__table__.columns).where(Collaborateur.date_validite.isnot(None))
+
+def find_due_notifications(db, today):
+    """Return [(collaborateur, notifications)] for everyone whose date_validite is at an escalation step."""
+    ladder = load_ladder()
+    collaborateurs = map(CollaborateurRow._make, db.execute(DUE_CANDIDATES))
+    due = []
+    for collaborateur in collaborateurs:
+        notifications = get_collaborateur_notifications(collaborateur, today, ladder)
+        if notifications:
+            due.append((collaborateur, notifications))
+    return due
+
 def check_inspection_dates():
     """Check collaborateur inspection dates and send notifications if needed."""
     db = None
     try:
         db = get_db()
         today = get_current_date()
-        two_weeks_later = today + timedelta(days=14)
+        horizon = today + timedelta(days=load_ladder().window('date_validite'))
 
-        logger.info(f"Checking inspections between {today} and {two_weeks_later} for database_management_2.db")
+        logger.info(f"Checking inspections between {today} and {horizon} for database_management_2.db")
 
-        collaborateurs = db.query(Collaborateur).filter(
-            Collaborateur.date_validite.isnot(None)
-        ).all()
+        due = find_due_notifications(db, today)
+        # Counted before any SMTP work, so a failed connection still reports what was due
+        metrics.NOTIFIER_NOTIFICATIONS.set(sum(len(notifications) for _, notifications in due), register=2)
 
-        if not collaborateurs:
+        if not due:
             logger.info(f"No notifications needed for {today}")
             return
 
-        logger.info(f"Found {len(collaborateurs)} collaborateurs requiring notifications")
+        logger.info(f"Found {len(due)} collaborateurs requiring notifications")
 
+        failed = 0
         try:
             if SMTP_SERVER is None or SMTP_PORT is None:
                 raise ValueError("SMTP_SERVER and SMTP_PORT must be configured")
@@ -187,79 +198,86 @@ def check_inspection_dates():
                     logger.error("2. Enable 2-Factor Authentication and generate an app password")
                     logger.error("3. Verify 'Less secure app access' is disabled (use app password instead)")
                     logger.error("4. Check Gmail account settings allow IMAP/SMTP access")
-                    return
+                    raise
 
-                for collaborateur in collaborateurs:
+                for collaborateur, notifications in due:
                     try:
-                        notifications = get_collaborateur_notifications(collaborateur, today, two_weeks_later)
                         if notifications:
                             send_notification_email(server, collaborateur, notifications)
 
                     except Exception as e:
+                        # The others are still notified; the run fails at the end
                         logger.error(f"Error processing collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')}): {e}")
+                        failed += 1
                         continue
         except smtplib.SMTPException as e:
             logger.error(f"Email server error in check_inspection_dates: {e}")
+            raise
+
+        if failed:
+            raise RuntimeError(f"{failed} of {len(due)} collaborateurs could not be notified")
 
     except SQLAlchemyError as e:
         logger.error(f"Database error in check_inspection_dates: {e}")
+        raise
     except Exception as e:
         logger.error(f"Error in check_inspection_dates: {e}")
+        raise
     finally:
         if db:
             db.close()
 
 def send_notification_email(server, collaborateur, notifications):
-    """Send notification email for a specific collaborateur."""
-    try:
-        subject, body = generate_email_content(collaborateur, notifications)
-
-        msg = MIMEMultipart()
-        if SENDER_EMAIL is None or RECIPIENT_EMAIL is None:
-            raise ValueError("SENDER_EMAIL and RECIPIENT_EMAIL must be configured")
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        server.send_message(msg)
-        logger.info(f"Notification email sent to {RECIPIENT_EMAIL} for collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')})")
-
-        if RECIPIENT_EMAIL_2:
-            urgent_notifications = [notif for notif in notifications if notif['days_until'] <= 4]
-
-            if urgent_notifications:
-                urgent_subject, urgent_body = generate_email_content(collaborateur, urgent_notifications)
-
-                msg2 = MIMEMultipart()
-                if SENDER_EMAIL is None:
-                    raise ValueError("SENDER_EMAIL must be configured")
-                msg2['From'] = SENDER_EMAIL
-                msg2['To'] = RECIPIENT_EMAIL_2
-                msg2['Subject'] = f"URGENT - {urgent_subject}"
-                msg2.attach(MIMEText(urgent_body, 'plain'))
-
-                server.send_message(msg2)
-                logger.info(f"Urgent notification email sent to {RECIPIENT_EMAIL_2} for collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')}) ({len(urgent_notifications)} urgent inspection(s))")
-
-    except Exception as e:
-        logger.error(f"Failed to send notification email for collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')}): {e}")
-        # Not re-raising here to allow other collaborateurs to be processed
-        # raise # Uncomment if one email failure should stop all
+    """Send the notification emails for a specific collaborateur, one per escalation recipient."""
+    ladder = load_ladder()
+    failed = None
+    for name, recipient_notifications in group_by_recipient(notifications).items():
+        addresses = resolve_recipients([name], RECIPIENTS)
+        if not addresses:
+            continue
+        kind = 'urgent' if any(notif['urgent'] for notif in recipient_notifications) else 'standard'
+        try:
+            subject, body, html = generate_email(collaborateur, recipient_notifications)
+
+            msg = MIMEMultipart('alternative')
+            if SENDER_EMAIL is None:
+                raise ValueError("SENDER_EMAIL must be configured")
+            msg['From'] = SENDER_EMAIL
+            msg['To'] = ', '.join(addresses)
+            msg['Subject'] = f"URGENT - {subject}" if name in ladder.urgent_only else subject
+            msg.attach(MIMEText(body, 'plain'))
+            if html:
+                msg.attach(MIMEText(html, 'html'))
+
+            server.send_message(msg)
+            metrics.NOTIFIER_EMAILS.inc(register=2, kind=kind, status='sent')
+            logger.info(f"{kind.capitalize()} notification email sent to {msg['To']} for collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')}) ({len(recipient_notifications)} inspection(s))")
+
+        except Exception as e:
+            metrics.NOTIFIER_EMAILS.inc(register=2, kind=kind, status='failed')
+            logger.error(f"Failed to send notification email to {name} for collaborateur {getattr(collaborateur, 'nom', 'N/A')} {getattr(collaborateur, 'prenom', 'N/A')} (ID: {getattr(collaborateur, 'id', 'N/A')}): {e}")
+            failed = e
+    if failed:
+        raise failed
 
 def main():
     """Main function to run the notification system."""
-    try:
-        logger.info("Starting Vehicle Inspection Notification System for database_management_2.db")
-        current_date_val = get_current_date()
-        logger.info(f"Current date: {current_date_val}")
+    with metrics.notifier_run(2):
+        try:
+            logger.info("Starting Vehicle Inspection Notification System for database_management_2.db")
+            current_date_val = get_current_date()
+            logger.info(f"Current date: {current_date_val}")
         
-        check_inspection_dates()
-        logger.info("Notification check completed successfully for database_management_2.db")
+            check_inspection_dates()
+            logger.info("Notification check completed successfully for database_management_2.db")
         
-    except Exception as e:
-        logger.error(f"Error in main function (database_management_2.db): {e}")
-        # raise # Uncomment if main function error should stop the script
+        except Exception as e:
+            logger.error(f"Error in main function (database_management_2.db): {e}")
+            raise
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send certification expiry notifications for register 2")
+    parser.add_argument("--profile", action="store_true", help="profile the run into PROFILE_DIR")
+    args = parser.parse_args()
+    with profiling.profile_run("notifier_2", enabled=args.profile):
+        main()
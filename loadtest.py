@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from datetime import date
+from bench_data import NOMS, build_database, generate_rows
+from seed_best_to_db import REGISTERS, import_csv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "list=50,search=35,edit=10,delete=5"
+STARTUP_TIMEOUT = 60
+
+class Stats:
+    """Latencies and outcomes per route, shared by the client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            entry = self.routes.setdefault(route, {'latencies': [], 'errors': 0})
+            entry['latencies'].append(seconds)
+            if not ok:
+                entry['errors'] += 1
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("list", "search", "edit", "delete"):
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class Client:
+    """One keep-alive connection replaying the traffic mix"""
+
+    def __init__(self, port, stats, rows, deletable, seed):
+        self.port = port
+        self.stats = stats
+        self.rows = rows
+        self.deletable = deletable
+        self.rng = random.Random(seed)
+        self.connection = None
+
+    def request(self, route, method, path, form=None):
+        body = urlencode(form).encode() if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            self.connection = None
+            ok = False
+        self.stats.record(route, time.perf_counter() - start, ok)
+
+    def list(self, register):
+        self.request(f"GET /index_{register}", "GET", f"/index_{register}")
+
+    def search(self, register):
+        term = self.rng.choice(NOMS)[:self.rng.randint(2, 4)].lower()
+        self.request(f"GET /index_{register}/rows", "GET", f"/index_{register}/rows?{urlencode({'search': term})}")
+
+    def edit(self, register):
+        row = self.rng.choice(self.rows[register])
+        fields = REGISTERS[register]['fields']
+        form = dict(zip(fields[1:], row[1:]))
+        form['commentaire'] = f"Charge {self.rng.randint(0, 9999)}"
+        self.request(f"GET /edit_collaborateur_{register}", "GET", f"/edit_collaborateur_{register}/{row[0]}")
+        self.request(f"POST /edit_collaborateur_{register}", "POST", f"/edit_collaborateur_{register}/{row[0]}", form)
+
+    def delete(self, register):
+        try:
+            row_id = self.deletable[register].pop()
+        except IndexError:
+            return self.list(register)
+        self.request(f"POST /delete_collaborateur_{register}", "POST", f"/delete_collaborateur_{register}/{row_id}", {})
+
+    def run(self, mix, deadline):
+        operations, weights = list(mix), list(mix.values())
+        while time.monotonic() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            getattr(self, operation)(self.rng.choice((1, 2)))
+
+def background_imports(register, csv_path, db_path, interval, stop, stats):
+    """Re-import the register's CSV in diff mode, like the seeder or an upload would"""
+    while not stop.wait(interval):
+        start = time.perf_counter()
+        try:
+            import_csv(register, csv_path=csv_path, db_path=db_path, mode="diff")
+            ok = True
+        except Exception:
+            ok = False
+        stats.record(f"IMPORT register {register} (background)", time.perf_counter() - start, ok)
+
+def wait_for_server(port, process, log_path):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    with open(log_path, encoding='utf-8', errors='replace') as f:
+        sys.stderr.write(f.read()[-4000:])
+    raise RuntimeError("Server did not start")
+
+def format_report(meta, stats, elapsed):
+    lines = [
+        f"Load test: {meta['server']} {meta['workers']} workers x {meta['threads']} threads, "
+        f"{meta['concurrency']} clients, {meta['rows']} rows per register, {elapsed:.1f}s, mix {meta['mix']}",
+        "",
+        f"{'route':<38}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    ]
+    total, errors = 0, 0
+    report = {}
+    for route in sorted(stats.routes):
+        entry = stats.routes[route]
+        latencies = sorted(entry['latencies'])
+        count = len(latencies)
+        total += count
+        errors += entry['errors']
+        report[route] = {
+            'requests': count,
+            'throughput': count / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'error_rate': entry['errors'] / count if count else 0.0
+        }
+        r = report[route]
+        lines.append(f"{route:<38}{count:>9}{r['throughput']:9.1f}{r['p50'] * 1000:9.1f}"
+                     f"{r['p95'] * 1000:9.1f}{r['p99'] * 1000:9.1f}{r['error_rate']:8.1%}")
+    lines.append("")
+    lines.append(f"Total: {total} requests, {total / elapsed:.1f} req/s, "
+                 f"{errors} errors ({errors / total if total else 0:.1%})")
+    return '\n'.join(lines) + '\n', report
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay list/search/edit/delete traffic against a local server")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn",
+                        help="uvicorn serves main:asgi_app (WSGI bridge), gunicorn the Flask app directly")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per generated register")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--import-every", type=float, default=0,
+                        help="also re-import register 1 every N seconds to add write contention")
+    parser.add_argument("--json", help="write the per-route results to this JSON file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="loadtest_")
+    process = None
+    stop = threading.Event()
+    try:
+        today = date.today()
+        databases = {register: build_database(register, args.rows, directory, args.seed, today) for register in (1, 2)}
+        rows = {register: list(generate_rows(register, args.rows, args.seed, today)) for register in (1, 2)}
+        # Deletes consume ids from the top so edits mostly hit rows that still exist
+        deletable = {register: list(range(args.rows // 2, args.rows + 1)) for register in (1, 2)}
+
+        port = free_port()
+        env = dict(os.environ,
+                   SQLALCHEMY_DATABASE_URL_1=f"sqlite:///{databases[1][0]}",
+                   SQLALCHEMY_DATABASE_URL_2=f"sqlite:///{databases[2][0]}",
+                   SECRET_KEY="loadtest", METRICS_DIR=os.path.join(directory, "metrics"),
+                   SLOW_REQUEST_SECONDS="3600")
+        log_path = os.path.join(directory, "server.log")
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(
+                [sys.executable, "serve.py", "--server", args.server, "--bind", f"127.0.0.1:{port}",
+                 "--workers", str(args.workers), "--threads", str(args.threads)],
+                cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        wait_for_server(port, process, log_path)
+
+        stats = Stats()
+        importer = None
+        if args.import_every:
+            importer = threading.Thread(target=background_imports, daemon=True,
+                                        args=(1, databases[1][1], databases[1][0], args.import_every, stop, stats))
+            importer.start()
+        deadline = time.monotonic() + args.duration
+        clients = [Client(port, stats, rows, deletable, args.seed + i) for i in range(args.concurrency)]
+        threads = [threading.Thread(target=client.run, args=(args.mix, deadline)) for client in clients]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        if importer:
+            importer.join()
+
+        meta = {'server': args.server, 'workers': args.workers, 'threads': args.threads,
+                'concurrency': args.concurrency, 'rows': args.rows,
+                'mix': ",".join(f"{name}={weight:g}" for name, weight in args.mix.items())}
+        text, report = format_report(meta, stats, elapsed)
+        print(text, end="")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({'meta': meta, 'elapsed': elapsed, 'routes': report}, f, indent=2)
+    finally:
+        stop.set()
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,176 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-from database_1 import get_db as get_db_1, init_db as init_db_1
-from database_2 import get_db as get_db_2, init_db as init_db_2
+import io
+import os
+import csv
+import secrets
+from datetime import date
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, make_response
+from database_1 import init_db as init_db_1, engine as engine_1
+from database_2 import init_db as init_db_2, engine as engine_2
 
 from crud_1 import (
-    get_collaborateurs as get_collaborateurs_1,
+    get_collaborateur_rows as get_collaborateur_rows_1,
     create_collaborateur as create_collaborateur_1,
     get_collaborateur as get_collaborateur_1,
     delete_collaborateur as delete_collaborateur_1,
-    update_collaborateur as update_collaborateur_1
+    update_collaborateur as update_collaborateur_1,
+    get_archived_rows as get_archived_rows_1,
+    get_certification_history as get_certification_history_1
 )
 from crud_2 import (
-    get_collaborateurs_2,
+    get_collaborateur_rows_2,
     create_collaborateur_2,
     get_collaborateur_2,
     delete_collaborateur_2,
-    update_collaborateur_2
+    update_collaborateur_2,
+    get_archived_rows_2,
+    get_certification_history_2
 )
-from datetime import datetime
+from import_jobs import start_import, get_job
+from validation import get_validator, ValidationError
+from register_versions import get_changes_page
+from seed_best_to_db import REGISTERS
+from calendar_feed import get_feed, parse_types
+from name_index import get_index
+import dashboard
+import http_cache
+import assets
+import metrics
+import profiling
+import db_sessions
+from http_cache import conditional
+from db_sessions import get_session
 import logging
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
-
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.route('/')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SECRET_KEY_FILE = os.path.join(BASE_DIR, '.secret_key')
+
+def read_collaborateur_form(register):
+    """Validate the add/edit form of a register; raises ValidationError"""
+    validator = get_validator(register)
+    values = validator.validate({name: request.form.get(name, '') for name in validator.names if name != 'id'})
+    values.pop('id', None)
+    values['commentaire'] = values['commentaire'] or ''
+    return values
+
 def home():
     return render_template('home.html')
 
-@app.route('/index_1')
+def format_date(date):
+    if date:
+        return date.strftime('%Y-%m-%d')
+    return ""
+
+def format_timestamp(timestamp):
+    """Unix time as a local date, for archive and history stamps"""
+    if timestamp:
+        return date.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+    return ""
+
+def list_args():
+    """Return (search_term, sort_by, sort_order) from the query string"""
+    return (request.args.get('search', ''),
+            request.args.get('sort_by', 'nom'),
+            request.args.get('sort_order', 'asc'))
+
+def include_archived():
+    """True when the list or export should also show archived collaborateurs"""
+    return request.args.get('include_archived') == '1'
+
+@conditional(1, 2, extra=lambda: dashboard.get_current_date().isoformat())
+def dashboard_route():
+    registers = []
+    for register, title in ((1, 'Base de données 1'), (2, 'Base de données 2')):
+        try:
+            db = get_session(register)
+            counts = dashboard.get_expiry_counts(db, register)
+        except Exception as e:
+            logger.error(f"Error computing dashboard for register {register}: {str(e)}")
+            flash(f'Une erreur est survenue lors du calcul des échéances ({title}).', 'danger')
+            counts = {}
+        registers.append({'title': title, 'counts': counts, 'calendar': url_for(f'calendar_{register}')})
+    return render_template('dashboard.html', registers=registers, buckets=dashboard.BUCKET_LABELS,
+                           labels=dashboard.LABELS, today=dashboard.get_current_date())
+
+@conditional(1)
 def index_1():
     try:
-        db = next(get_db_1())
-        search_term = request.args.get('search', '')
-        sort_by = request.args.get('sort_by', 'nom')
-        sort_order = request.args.get('sort_order', 'asc')
-        collaborateurs = get_collaborateurs_1(db, 0, 100, search_term)
-        return render_template('index_1.html', collaborateurs=collaborateurs, search_term=search_term,
-                             sort_by=sort_by, sort_order=sort_order)
+        db = get_session(1)
+        search_term, sort_by, sort_order = list_args()
+        collaborateurs = get_collaborateur_rows_1(db, 0, 100, search_term)
+        archived = get_archived_rows_1(db, 0, 100, search_term) if include_archived() else []
+        return render_template('index_1.html', collaborateurs=collaborateurs, archived=archived,
+                             search_term=search_term, sort_by=sort_by, sort_order=sort_order,
+                             include_archived=include_archived())
     except Exception as e:
         logger.error(f"Error in index_1: {str(e)}")
         flash('Une erreur est survenue lors du chargement des collaborateurs.', 'danger')
-        return render_template('index_1.html', collaborateurs=[], search_term='',
-                             sort_by='nom', sort_order='asc')
+        return render_template('index_1.html', collaborateurs=[], archived=[], search_term='',
+                             sort_by='nom', sort_order='asc', include_archived=False)
+
+@conditional(1)
+def index_1_rows():
+    """Table rows only, for search-as-you-type"""
+    try:
+        db = get_session(1)
+        search_term, _, _ = list_args()
+        archived = get_archived_rows_1(db, 0, 100, search_term) if include_archived() else []
+        return render_template('_rows_1.html', collaborateurs=get_collaborateur_rows_1(db, 0, 100, search_term),
+                               archived=archived)
+    except Exception as e:
+        logger.error(f"Error in index_1_rows: {str(e)}")
+        return '', 500
 
-@app.route('/index_2')
+@conditional(2)
 def index_2():
     try:
-        db = next(get_db_2())
-        search_term = request.args.get('search', '')
-        sort_by = request.args.get('sort_by', 'nom')
-        sort_order = request.args.get('sort_order', 'asc')
-        
-        collaborateurs = get_collaborateurs_2(db, 0, 100, search_term, sort_by, sort_order)
-        return render_template('index_2.html', collaborateurs=collaborateurs, search_term=search_term,
-                             sort_by=sort_by, sort_order=sort_order)
+        db = get_session(2)
+        search_term, sort_by, sort_order = list_args()
+        collaborateurs = get_collaborateur_rows_2(db, 0, 100, search_term, sort_by, sort_order)
+        archived = get_archived_rows_2(db, 0, 100, search_term, sort_by, sort_order) if include_archived() else []
+        return render_template('index_2.html', collaborateurs=collaborateurs, archived=archived,
+                             search_term=search_term, sort_by=sort_by, sort_order=sort_order,
+                             include_archived=include_archived())
     except Exception as e:
         logger.error(f"Error in index_2: {str(e)}")
         flash('Une erreur est survenue lors du chargement des collaborateurs.', 'danger')
-        return render_template('index_2.html', collaborateurs=[], search_term='',
-                             sort_by='nom', sort_order='asc')
+        return render_template('index_2.html', collaborateurs=[], archived=[], search_term='',
+                             sort_by='nom', sort_order='asc', include_archived=False)
+
+@conditional(2)
+def index_2_rows():
+    """Table rows only, for search-as-you-type"""
+    try:
+        db = get_session(2)
+        search_term, sort_by, sort_order = list_args()
+        collaborateurs = get_collaborateur_rows_2(db, 0, 100, search_term, sort_by, sort_order)
+        archived = get_archived_rows_2(db, 0, 100, search_term, sort_by, sort_order) if include_archived() else []
+        return render_template('_rows_2.html', collaborateurs=collaborateurs, archived=archived)
+    except Exception as e:
+        logger.error(f"Error in index_2_rows: {str(e)}")
+        return '', 500
 
 
-@app.route('/add_collaborateur_1', methods=['GET', 'POST'])
 def add_collaborateur_1():
     if request.method == 'POST':
         try:
-            db = next(get_db_1())
-            collab_data = {
-                'nom': request.form['nom'],
-                'prenom': request.form['prenom'],
-                'fimo': request.form['fimo'] if request.form['fimo'] else None,
-                'caces': request.form['caces'] if request.form['caces'] else None,
-                'aipr': request.form['aipr'] if request.form['aipr'] else None,
-                'hg0b0': request.form['hg0b0'] if request.form['hg0b0'] else None,
-                'visite_med': request.form['visite_med'] if request.form['visite_med'] else None,
-                'brevet_secour': request.form['brevet_secour'] if request.form['brevet_secour'] else None,
-                'commentaire': request.form.get('commentaire', '')
-            }
+            db = get_session(1)
+            collab_data = read_collaborateur_form(1)
+            similar = get_index(1).similar(collab_data['nom'], collab_data['prenom'])
             create_collaborateur_1(db, **collab_data)
             flash('Collaborateur ajouté avec succès!', 'success')
+            if similar:
+                flash(similar_warning(similar), 'warning')
             return redirect(url_for('index_1'))
-        except KeyError as e:
-            logger.error(f"Missing form field in add_collaborateur_1: {str(e)}")
-            flash('Tous les champs requis doivent être remplis.', 'danger')
+        except ValidationError as e:
+            logger.error(f"Invalid form in add_collaborateur_1: {str(e)}")
+            if any(message == "required field is empty" for _, _, message in e.errors):
+                flash('Tous les champs requis doivent être remplis.', 'danger')
+            else:
+                flash(f"Certaines valeurs sont invalides : {', '.join(e.fields)}.", 'danger')
         except ValueError as e:
             logger.error(f"Invalid value in add_collaborateur_1: {str(e)}")
             flash('Certaines valeurs sont invalides. Vérifiez les champs et les dates.', 'danger')
@@ -94,24 +179,23 @@ def add_collaborateur_1():
             flash('Une erreur est survenue lors de l\'ajout du collaborateur.', 'danger')
     return render_template('add_collaborateur_1.html')
 
-@app.route('/add_collaborateur_2', methods=['GET', 'POST'])
 def add_collaborateur_2():
     if request.method == 'POST':
         try:
-            db = next(get_db_2())
-            collab_data = {
-                'nom': request.form['nom'],
-                'prenom': request.form['prenom'],
-                'date_renouvellement': datetime.strptime(request.form['date_renouvellement'], '%Y-%m-%d').date() if request.form['date_renouvellement'] else None,
-                'date_validite': datetime.strptime(request.form['date_validite'], '%Y-%m-%d').date() if request.form['date_validite'] else None,
-                'commentaire': request.form.get('commentaire', '')
-            }
+            db = get_session(2)
+            collab_data = read_collaborateur_form(2)
+            similar = get_index(2).similar(collab_data['nom'], collab_data['prenom'])
             create_collaborateur_2(db, **collab_data)
             flash('Collaborateur ajouté avec succès!', 'success')
+            if similar:
+                flash(similar_warning(similar), 'warning')
             return redirect(url_for('index_2'))
-        except KeyError as e:
-            logger.error(f"Missing form field in add_collaborateur_2: {str(e)}")
-            flash('Tous les champs requis doivent être remplis.', 'danger')
+        except ValidationError as e:
+            logger.error(f"Invalid form in add_collaborateur_2: {str(e)}")
+            if any(message == "required field is empty" for _, _, message in e.errors):
+                flash('Tous les champs requis doivent être remplis.', 'danger')
+            else:
+                flash(f"Certaines valeurs sont invalides : {', '.join(e.fields)}.", 'danger')
         except ValueError as e:
             logger.error(f"Invalid value in add_collaborateur_2: {str(e)}")
             flash('Certaines valeurs sont invalides. Vérifiez les champs et les dates.', 'danger')
@@ -120,87 +204,76 @@ def add_collaborateur_2():
             flash('Une erreur est survenue lors de l\'ajout du collaborateur.', 'danger')
     return render_template('add_collaborateur_2.html')
 
-@app.route('/edit_collaborateur_1/<int:id>', methods=['GET', 'POST'])
 def edit_collaborateur_1(id):
     try:
-        db = next(get_db_1())
+        db = get_session(1)
         collaborateur = get_collaborateur_1(db, id)
         if not collaborateur:
             flash('Collaborateur non trouvé.', 'danger')
             return redirect(url_for('index_1'))
         if request.method == 'POST':
             try:
-                collab_data = {
-                    'nom': request.form['nom'],
-                    'prenom': request.form['prenom'],
-                    'fimo': request.form['fimo'] if request.form['fimo'] else None,
-                    'caces': request.form['caces'] if request.form['caces'] else None,
-                    'aipr': request.form['aipr'] if request.form['aipr'] else None,
-                    'hg0b0': request.form['hg0b0'] if request.form['hg0b0'] else None,
-                    'visite_med': request.form['visite_med'] if request.form['visite_med'] else None,
-                    'brevet_secour': request.form['brevet_secour'] if request.form['brevet_secour'] else None,
-                    'commentaire': request.form.get('commentaire', '')
-                }
+                collab_data = read_collaborateur_form(1)
                 update_collaborateur_1(db, id, **collab_data)
                 flash('Collaborateur mis à jour avec succès!', 'success')
                 return redirect(url_for('index_1'))
-            except KeyError as e:
-                logger.error(f"Missing form field in edit_collaborateur_1: {str(e)}")
-                flash('Tous les champs requis doivent être remplis.', 'danger')
+            except ValidationError as e:
+                logger.error(f"Invalid form in edit_collaborateur_1: {str(e)}")
+                if any(message == "required field is empty" for _, _, message in e.errors):
+                    flash('Tous les champs requis doivent être remplis.', 'danger')
+                else:
+                    flash(f"Certaines valeurs sont invalides : {', '.join(e.fields)}.", 'danger')
             except ValueError as e:
                 logger.error(f"Invalid value in edit_collaborateur_1: {str(e)}")
                 flash('Certaines valeurs sont invalides. Vérifiez les champs et les dates.', 'danger')
             except Exception as e:
                 logger.error(f"Error in edit_collaborateur_1: {str(e)}")
                 flash('Une erreur est survenue lors de la mise à jour du collaborateur.', 'danger')
-        return render_template('edit_collaborateur_1.html', collaborateur=collaborateur)
+        return render_template('edit_collaborateur_1.html', collaborateur=collaborateur,
+                               history=get_certification_history_1(db, id), labels=dashboard.LABELS)
     except Exception as e:
         logger.error(f"Error loading collaborateur in edit_collaborateur_1: {str(e)}")
         flash('Une erreur est survenue lors du chargement du collaborateur.', 'danger')
         return redirect(url_for('index_1'))
 
-@app.route('/edit_collaborateur_2/<int:id>', methods=['GET', 'POST'])
 def edit_collaborateur_2(id):
     try:
-        db = next(get_db_2())
+        db = get_session(2)
         collaborateur = get_collaborateur_2(db, id)
         if not collaborateur:
             flash('Collaborateur non trouvé.', 'danger')
             return redirect(url_for('index_2'))
         if request.method == 'POST':
             try:
-                collab_data = {
-                    'nom': request.form['nom'],
-                    'prenom': request.form['prenom'],
-                    'date_renouvellement': datetime.strptime(request.form['date_renouvellement'], '%Y-%m-%d').date() if request.form['date_renouvellement'] else None,
-                    'date_validite': datetime.strptime(request.form['date_validite'], '%Y-%m-%d').date() if request.form['date_validite'] else None,
-                    'commentaire': request.form.get('commentaire', '')
-                }
+                collab_data = read_collaborateur_form(2)
                 update_collaborateur_2(db, id, **collab_data)
                 flash('Collaborateur mis à jour avec succès!', 'success')
                 return redirect(url_for('index_2'))
-            except KeyError as e:
-                logger.error(f"Missing form field in edit_collaborateur_2: {str(e)}")
-                flash('Tous les champs requis doivent être remplis.', 'danger')
+            except ValidationError as e:
+                logger.error(f"Invalid form in edit_collaborateur_2: {str(e)}")
+                if any(message == "required field is empty" for _, _, message in e.errors):
+                    flash('Tous les champs requis doivent être remplis.', 'danger')
+                else:
+                    flash(f"Certaines valeurs sont invalides : {', '.join(e.fields)}.", 'danger')
             except ValueError as e:
                 logger.error(f"Invalid value in edit_collaborateur_2: {str(e)}")
                 flash('Certaines valeurs sont invalides. Vérifiez les champs et les dates.', 'danger')
             except Exception as e:
                 logger.error(f"Error in edit_collaborateur_2: {str(e)}")
                 flash('Une erreur est survenue lors de la mise à jour du collaborateur.', 'danger')
-        return render_template('edit_collaborateur_2.html', collaborateur=collaborateur)
+        return render_template('edit_collaborateur_2.html', collaborateur=collaborateur,
+                               history=get_certification_history_2(db, id), labels=dashboard.LABELS)
     except Exception as e:
         logger.error(f"Error loading collaborateur in edit_collaborateur_2: {str(e)}")
         flash('Une erreur est survenue lors du chargement du collaborateur.', 'danger')
         return redirect(url_for('index_2'))
 
 
-@app.route('/delete_collaborateur_1/<int:id>', methods=['POST'])
 def delete_collaborateur_1_route(id):
     try:
-        db = next(get_db_1())
+        db = get_session(1)
         if delete_collaborateur_1(db, id):
-            flash('Collaborateur supprimé avec succès!', 'success')
+            flash('Collaborateur supprimé et archivé avec succès!', 'success')
         else:
             flash('Collaborateur non trouvé.', 'danger')
     except Exception as e:
@@ -208,12 +281,11 @@ def delete_collaborateur_1_route(id):
         flash('Une erreur est survenue lors de la suppression du collaborateur.', 'danger')
     return redirect(url_for('index_1'))
 
-@app.route('/delete_collaborateur_2/<int:id>', methods=['POST'])
 def delete_collaborateur_2_route(id):
     try:
-        db = next(get_db_2())
+        db = get_session(2)
         if delete_collaborateur_2(db, id):
-            flash('Collaborateur supprimé avec succès!', 'success')
+            flash('Collaborateur supprimé et archivé avec succès!', 'success')
         else:
             flash('Collaborateur non trouvé.', 'danger')
     except Exception as e:
@@ -221,26 +293,259 @@ def delete_collaborateur_2_route(id):
         flash('Une erreur est survenue lors de la suppression du collaborateur.', 'danger')
     return redirect(url_for('index_2'))
 
+def import_csv_route():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        register = request.form.get('register', '1')
+        mode = 'diff' if request.form.get('diff') else 'replace'
+        delete_missing = bool(request.form.get('delete_missing')) and mode == 'diff'
+        if register not in ('1', '2'):
+            flash('Base de données invalide.', 'danger')
+        elif not upload or not upload.filename:
+            flash('Veuillez choisir un fichier CSV.', 'danger')
+        elif not upload.filename.lower().endswith('.csv'):
+            flash('Le fichier doit être au format CSV.', 'danger')
+        else:
+            try:
+                job = start_import(int(register), upload, mode, delete_missing)
+                return redirect(url_for('import_csv_route', job=job.id))
+            except Exception as e:
+                logger.error(f"Error starting import: {str(e)}")
+                flash('Une erreur est survenue lors de l\'envoi du fichier.', 'danger')
+    job = get_job(request.args.get('job', ''))
+    return render_template('import.html', job=job.to_dict() if job else None)
+
+def import_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
 
+@conditional(1, 2)
+def changes_route():
+    """Changes of a register since a sequence number: /changes?register=1&since=0"""
+    try:
+        register = int(request.args.get('register', '1'))
+        since = int(request.args.get('since', '0'))
+        limit = min(int(request.args.get('limit', '1000')), 10000)
+    except ValueError:
+        return jsonify({'error': 'register, since and limit must be integers'}), 400
+    if register not in (1, 2) or since < 0 or limit < 1:
+        return jsonify({'error': 'invalid register, since or limit'}), 400
+    return jsonify(get_changes_page(register, since, limit))
+
+def similar_warning(similar):
+    names = ', '.join(f"{nom} {prenom}" for _, nom, prenom, _ in similar)
+    return f"Attention : une personne au nom similaire existe déjà ({names}). Vérifiez qu'il ne s'agit pas d'un doublon."
+
+def names_response(register):
+    """Autocomplete: people whose words start with those of ?q="""
+    try:
+        limit = min(int(request.args.get('limit', '10')), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    people = get_index(register).complete(request.args.get('q', ''), limit)
+    return jsonify([{'id': row_id, 'nom': nom, 'prenom': prenom,
+                     'url': url_for(f'edit_collaborateur_{register}', id=row_id)}
+                    for row_id, nom, prenom in people])
+
+def similar_response(register):
+    """People whose name is close to ?nom=&prenom=, for the duplicate warning of the add forms"""
+    people = get_index(register).similar(request.args.get('nom', ''), request.args.get('prenom', ''))
+    return jsonify([{'id': row_id, 'nom': nom, 'prenom': prenom, 'score': round(score, 3),
+                     'url': url_for(f'edit_collaborateur_{register}', id=row_id)}
+                    for row_id, nom, prenom, score in people])
+
+def index_1_names():
+    return names_response(1)
+
+def index_2_names():
+    return names_response(2)
+
+def index_1_similar():
+    return similar_response(1)
+
+def index_2_similar():
+    return similar_response(2)
+
+def calendar_response(register):
+    try:
+        types = parse_types(register, request.args.get('types', ''))
+    except ValueError as e:
+        return str(e), 400, {'Content-Type': 'text/plain; charset=utf-8'}
+    compressed = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    response = make_response(get_feed(register, types, compressed))
+    response.mimetype = 'text/calendar'
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'inline; filename="echeances_{register}.ics"'
+    return response
+
+@conditional(1, extra=lambda: dashboard.get_current_date().isoformat())
+def calendar_1():
+    """Expiry calendar of register 1, optionally ?types=fimo,caces"""
+    return calendar_response(1)
+
+@conditional(2, extra=lambda: dashboard.get_current_date().isoformat())
+def calendar_2():
+    """Expiry calendar of register 2"""
+    return calendar_response(2)
 
+def export_response(register):
+    """CSV of a register (same columns as the import), optionally with the archived collaborateurs"""
+    db = get_session(register)
+    search_term, sort_by, sort_order = list_args()
+    # SQLite: a negative LIMIT means no limit
+    if register == 1:
+        rows = get_collaborateur_rows_1(db, 0, -1, search_term)
+        archived = get_archived_rows_1(db, 0, -1, search_term) if include_archived() else []
+    else:
+        rows = get_collaborateur_rows_2(db, 0, -1, search_term, sort_by, sort_order)
+        archived = get_archived_rows_2(db, 0, -1, search_term, sort_by, sort_order) if include_archived() else []
+    fields = REGISTERS[register]['fields']
+    date_fields = REGISTERS[register]['date_fields']
 
+    def values(row):
+        row = row._asdict()
+        return [format_date(row[field]) if field in date_fields else row[field] for field in fields]
 
+    output = io.StringIO()
+    writer = csv.writer(output)
+    if include_archived():
+        writer.writerow(fields + ['archive_le'])
+        writer.writerows(values(row) + [''] for row in rows)
+        writer.writerows(values(row) + [format_timestamp(row.archived_at)] for row in archived)
+    else:
+        writer.writerow(fields)
+        writer.writerows(values(row) for row in rows)
+    response = make_response(output.getvalue())
+    response.mimetype = 'text/csv'
+    response.headers['Content-Disposition'] = f'attachment; filename="collaborateurs_{register}.csv"'
+    return response
 
+@conditional(1)
+def export_1():
+    """Register 1 as CSV, optionally ?search=...&include_archived=1"""
+    return export_response(1)
 
-# Initialize all databases and create ASGI app
-try:
-    init_db_1()
-    init_db_2()
-    
+@conditional(2)
+def export_2():
+    """Register 2 as CSV"""
+    return export_response(2)
+
+ROUTES = [
+    ('/', home, None),
+    ('/dashboard', dashboard_route, None),
+    ('/index_1', index_1, None),
+    ('/index_1/rows', index_1_rows, None),
+    ('/index_2', index_2, None),
+    ('/index_2/rows', index_2_rows, None),
+    ('/index_1/names', index_1_names, None),
+    ('/index_2/names', index_2_names, None),
+    ('/index_1/similar', index_1_similar, None),
+    ('/index_2/similar', index_2_similar, None),
+    ('/add_collaborateur_1', add_collaborateur_1, ['GET', 'POST']),
+    ('/add_collaborateur_2', add_collaborateur_2, ['GET', 'POST']),
+    ('/edit_collaborateur_1/<int:id>', edit_collaborateur_1, ['GET', 'POST']),
+    ('/edit_collaborateur_2/<int:id>', edit_collaborateur_2, ['GET', 'POST']),
+    ('/delete_collaborateur_1/<int:id>', delete_collaborateur_1_route, ['POST']),
+    ('/delete_collaborateur_2/<int:id>', delete_collaborateur_2_route, ['POST']),
+    ('/import', import_csv_route, ['GET', 'POST']),
+    ('/import/status/<job_id>', import_status, None),
+    ('/changes', changes_route, None),
+    ('/calendar_1.ics', calendar_1, None),
+    ('/calendar_2.ics', calendar_2, None),
+    ('/export_1.csv', export_1, None),
+    ('/export_2.csv', export_2, None)
+]
+
+def load_secret_key():
+    """SECRET_KEY from the environment, else a key persisted next to the app.
+
+    Every worker must sign sessions with the same key, so the file is created
+    once (O_EXCL) and read by everyone afterwards.
+    """
+    key = os.getenv('SECRET_KEY')
+    if key:
+        return key
+    try:
+        fd = os.open(SECRET_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        logger.info(f"Generated a new secret key in {SECRET_KEY_FILE}")
+    except FileExistsError:
+        pass
+    with open(SECRET_KEY_FILE) as f:
+        return f.read().strip()
+
+def preload(app):
+    """Compile every template, open the database pools and build the name indexes before serving.
+
+    Run in the master process when the server preloads the app, so forked
+    workers start with warm Jinja caches.
+    """
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
+    for engine in (engine_1, engine_2):
+        with engine.connect():
+            pass
+    for register in (1, 2):
+        get_index(register).refresh(force=True)
+    logger.info("Templates, database engines and name indexes preloaded")
+
+def create_app():
+    """Build the Flask application"""
+    app = Flask(__name__)
+    app.secret_key = load_secret_key()
+    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # CSV uploads
+    # First, so the profile also covers the other hooks
+    profiling.init_app(app)
+    http_cache.init_app(app)
+    assets.init_app(app)
+    metrics.init_app(app, {1: engine_1, 2: engine_2})
+    db_sessions.init_app(app)
+    app.add_template_filter(format_date, 'format_date')
+    app.add_template_filter(format_timestamp, 'format_timestamp')
+    for rule, view, methods in ROUTES:
+        app.add_url_rule(rule, view_func=view, methods=methods)
+
+    try:
+        init_db_1()
+        init_db_2()
+    except Exception as e:
+        logger.error(f"Error starting application: {str(e)}")
+        raise e
+    preload(app)
+    return app
+
+def create_asgi_app(app=None, threads=None):
+    """Wrap the Flask app for uvicorn; threads bounds concurrent WSGI calls per worker"""
+    from contextlib import asynccontextmanager
     from fastapi import FastAPI
     from fastapi.middleware.wsgi import WSGIMiddleware
 
-    asgi_app = FastAPI()
-    asgi_app.mount("/", WSGIMiddleware(app))
+    @asynccontextmanager
+    async def lifespan(_):
+        if threads:
+            import anyio.to_thread
+            anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+        yield
+
+    asgi = FastAPI(lifespan=lifespan)
+    asgi.mount("/", WSGIMiddleware(app or create_app()))
+    return asgi
 
-except Exception as e:
-    logger.error(f"Error starting application: {str(e)}")
-    raise e
+def __getattr__(name):
+    """Build `app` and `asgi_app` on first access (main:app / main:asgi_app)"""
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    if name == 'asgi_app':
+        threads = os.getenv('WEB_THREADS')
+        globals()['asgi_app'] = create_asgi_app(__getattr__('app'), int(threads) if threads else None)
+        return globals()['asgi_app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
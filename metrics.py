@@ -0,0 +1,332 @@
+import os
+import glob
+import time
+import logging
+import threading
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, request, Response, has_request_context
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Processes that do not serve /metrics (notifiers) leave <name>.prom files here
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(BASE_DIR, "metrics"))
+# Requests slower than this are logged with the queries they ran
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0.5"))
+# Each web worker writes its metrics to web_<pid>.prom at most this often, so
+# /metrics answered by any worker shows every worker's series
+WORKER_METRICS_SECONDS = float(os.getenv("WORKER_METRICS_SECONDS", "5"))
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+_registry = []
+_lock = threading.Lock()
+_instrumented = weakref.WeakSet()
+_published = {'pid': None, 'at': 0.0}
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    """A metric family; one value (or histogram) per combination of label values"""
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with _lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self, labels=()):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, tuple(labels) + extra)} "
+                         f"{_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def samples(self):
+        samples = []
+        with _lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    samples.append((f"{self.name}_bucket", key, (('le', le),), cumulative))
+                samples.append((f"{self.name}_sum", key, (), total))
+                samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+def render(metrics=None, labels=()):
+    """Prometheus text exposition of the given metrics (default: all of this process).
+
+    labels are (name, value) pairs added to every sample.
+    """
+    if metrics is None:
+        with _lock:
+            metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render(labels))
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(name, metrics, labels=()):
+    """Write metrics to METRICS_DIR/<name>.prom for the web app's /metrics to pick up.
+
+    Only pass the process' own metrics: families already served by the web
+    app would appear twice.
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{name}.prom")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render(metrics, labels))
+    os.replace(tmp_path, path)
+
+def _worker_labels():
+    return (('worker', str(os.getpid())),)
+
+def _worker_file():
+    return os.path.join(METRICS_DIR, f"web_{os.getpid()}.prom")
+
+def publish_worker(force=False):
+    """Write this web worker's metrics to its textfile, at most every WORKER_METRICS_SECONDS"""
+    now = time.monotonic()
+    # A forked worker starts with its parent's stamp
+    if not force and _published['pid'] == os.getpid() and now - _published['at'] < WORKER_METRICS_SECONDS:
+        return
+    _published['pid'], _published['at'] = os.getpid(), now
+    try:
+        write_textfile(f"web_{os.getpid()}", None, _worker_labels())
+    except OSError as e:
+        logger.warning(f"Cannot write worker metrics: {str(e)}")
+
+def _is_stale_worker_file(path):
+    """True for the textfile of a web worker that has exited"""
+    name = os.path.basename(path)
+    if not name.startswith("web_") or os.name != 'posix':
+        return False
+    try:
+        os.kill(int(name[len("web_"):-len(".prom")]), 0)
+    except ValueError:
+        return False
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def _families(text, families):
+    """Group exposition lines by metric family, merging families seen before"""
+    family = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith('# '):
+            parts = line.split(None, 3)
+            if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                family = families.setdefault(parts[2], {'HELP': None, 'TYPE': None, 'samples': {}})
+                family[parts[1]] = family[parts[1]] or line
+            continue
+        if family is None:
+            family = families.setdefault(line.split('{')[0].split()[0], {'HELP': None, 'TYPE': None, 'samples': {}})
+        # Keyed by series so a series written by several sources appears once
+        family['samples'][line.rsplit(None, 1)[0]] = line
+    return families
+
+def render_all():
+    """This worker's metrics merged with the textfiles of the other workers and processes.
+
+    Web workers' series carry a worker label, so the same counter from two
+    workers stays two series.
+    """
+    families = _families(render(labels=_worker_labels()), {})
+    own = _worker_file()
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, "*.prom"))):
+        if path == own:
+            continue
+        if _is_stale_worker_file(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                _families(f.read(), families)
+        except OSError as e:
+            logger.warning(f"Cannot read metrics file {path}: {str(e)}")
+    lines = []
+    for family in families.values():
+        lines.extend(line for line in (family['HELP'], family['TYPE']) if line)
+        lines.extend(family['samples'].values())
+    return '\n'.join(lines) + '\n'
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status.",
+                        ("route", "method", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                          ("route", "method"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served.")
+SQL_QUERIES = Counter("sql_queries_total", "SQL statements executed by register and operation.",
+                      ("register", "operation"))
+SQL_DURATION = Histogram("sql_query_duration_seconds", "SQL statement latency by register.",
+                         ("register",), buckets=SQL_BUCKETS)
+SQL_PER_REQUEST = Histogram("http_request_sql_queries", "SQL statements executed per HTTP request.",
+                            ("route",), buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+
+# Written by the notifier scripts with write_textfile(); values describe their last run
+NOTIFIER_EMAILS = Gauge("notifier_last_run_emails", "Notification emails of the last run by kind and outcome.",
+                        ("register", "kind", "status"))
+NOTIFIER_NOTIFICATIONS = Gauge("notifier_last_run_notifications", "Expiring certifications found by the last run.",
+                               ("register",))
+NOTIFIER_DURATION = Gauge("notifier_last_run_duration_seconds", "Duration of the last notifier run.", ("register",))
+NOTIFIER_TIMESTAMP = Gauge("notifier_last_run_timestamp_seconds", "End time of the last notifier run.", ("register",))
+NOTIFIER_SUCCESS = Gauge("notifier_last_run_success", "1 if the last notifier run completed without error.",
+                         ("register",))
+NOTIFIER_METRICS = [NOTIFIER_EMAILS, NOTIFIER_NOTIFICATIONS, NOTIFIER_DURATION, NOTIFIER_TIMESTAMP, NOTIFIER_SUCCESS]
+
+@contextmanager
+def notifier_run(register):
+    """Time a notifier run and write its metrics textfile when it ends"""
+    for kind in ('standard', 'urgent'):
+        for status in ('sent', 'failed'):
+            NOTIFIER_EMAILS.set(0, register=register, kind=kind, status=status)
+    NOTIFIER_NOTIFICATIONS.set(0, register=register)
+    started = time.time()
+    success = 0
+    try:
+        yield
+        success = 1
+    finally:
+        NOTIFIER_DURATION.set(time.time() - started, register=register)
+        NOTIFIER_TIMESTAMP.set(time.time(), register=register)
+        NOTIFIER_SUCCESS.set(success, register=register)
+        try:
+            write_textfile(f"notifier_{register}", NOTIFIER_METRICS)
+        except OSError as e:
+            logger.warning(f"Cannot write notifier metrics: {str(e)}")
+
+def instrument_engine(engine, register):
+    """Count and time every statement run on an engine"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        SQL_QUERIES.inc(register=register, operation=operation)
+        SQL_DURATION.observe(duration, register=register)
+        if has_request_context() and 'queries' in g:
+            g.queries.append((register, duration, statement))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def before_request():
+    g.request_start = time.perf_counter()
+    g.queries = []
+    HTTP_IN_FLIGHT.inc()
+
+def after_request(response):
+    g.status = response.status_code
+    return response
+
+def teardown_request(exc):
+    if 'request_start' not in g:
+        return
+    HTTP_IN_FLIGHT.dec()
+    duration = time.perf_counter() - g.request_start
+    route = _route()
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=g.get('status', 500))
+    HTTP_DURATION.observe(duration, route=route, method=request.method)
+    SQL_PER_REQUEST.observe(len(g.queries), route=route)
+    publish_worker()
+    if duration >= SLOW_REQUEST_SECONDS:
+        sql_time = sum(query_duration for _, query_duration, _ in g.queries)
+        logger.warning(f"Slow request {request.method} {request.full_path}: {duration:.3f}s, "
+                       f"{len(g.queries)} queries in {sql_time:.3f}s")
+        for register, query_duration, statement in g.queries:
+            logger.warning(f"  [{register}] {query_duration * 1000:.1f} ms  {' '.join(statement.split())[:300]}")
+
+def metrics_view():
+    return Response(render_all(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def init_app(app, engines):
+    """Instrument a Flask app and its engines ({register: engine}) and serve /metrics"""
+    for register, engine in engines.items():
+        # create_app() may run more than once per process; listen only once
+        if engine not in _instrumented:
+            instrument_engine(engine, register)
+            _instrumented.add(engine)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,72 @@
+import sqlite3
+import logging
+import argparse
+from seed_best_to_db import REGISTERS
+from register_versions import record_changes_sqlite
+from date_storage import DATE_STORAGE, JULIAN_OFFSET, is_date_type
+from archive import _get_tables
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per target storage: (stored type being converted, SQL of the converted value)
+CONVERSIONS = {
+    'days': ('text', "CAST(julianday({column}) - {offset} AS INTEGER)"),
+    'iso': ('integer', "date({column} + {offset})")
+}
+
+def migrate_register(register, to, db_path=None):
+    """Convert a register's date columns to the target storage in one transaction.
+
+    Covers the archive and certification history too. Returns
+    {table.column: converted rows}. Text values that are not dates are left
+    as they are and logged. The change log gets a reset, so caches reload.
+    """
+    source_type, expression = CONVERSIONS[to]
+    conn = sqlite3.connect(db_path or REGISTERS[register]['db_path'], isolation_level=None)
+    converted = {}
+    try:
+        conn.execute("BEGIN")
+        existing = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        # The live table, then its archive and certification history
+        for table in _get_tables(register):
+            if table.name not in existing:
+                continue
+            for column in (column.name for column in table.columns if is_date_type(column.type)):
+                value = expression.format(column=column, offset=JULIAN_OFFSET)
+                cursor = conn.execute(
+                    f"UPDATE {table.name} SET {column} = {value} "
+                    f"WHERE typeof({column}) = ? AND {value} IS NOT NULL", (source_type,))
+                converted[f"{table.name}.{column}"] = cursor.rowcount
+                invalid = conn.execute(
+                    f"SELECT count(*) FROM {table.name} WHERE typeof({column}) = ?", (source_type,)).fetchone()[0]
+                if invalid:
+                    logger.warning(f"Register {register}: {invalid} {table.name}.{column} values are not dates "
+                                   f"and were left as they are")
+        if any(converted.values()):
+            record_changes_sqlite(conn, [(None, "reset")])
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the certification dates between ISO text and day numbers")
+    parser.add_argument("--to", choices=["days", "iso"], required=True,
+                        help="days: integer day numbers (DATE_STORAGE=days); iso: 'YYYY-MM-DD' text")
+    parser.add_argument("--register", choices=["1", "2"], nargs="*", default=["1", "2"])
+    parser.add_argument("--db1", help="register 1 database (default: SQLALCHEMY_DATABASE_URL_1)")
+    parser.add_argument("--db2", help="register 2 database (default: SQLALCHEMY_DATABASE_URL_2)")
+    args = parser.parse_args()
+    for register in map(int, args.register):
+        converted = migrate_register(register, args.to, getattr(args, f"db{register}"))
+        print(f"Register {register}: " + ", ".join(f"{column} {count}" for column, count in converted.items()))
+    if DATE_STORAGE != args.to:
+        print(f"\nSet DATE_STORAGE={args.to} in .env before restarting the application and the notifiers")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, Date
+from collections import namedtuple
+from sqlalchemy import Column, Integer, String, Text
+from date_storage import DateType
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -8,13 +10,62 @@ class Collaborateur(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     nom = Column(String(100), nullable=False)
     prenom = Column(String(100), nullable=False)
-    fimo = Column(Date, nullable=True)
-    caces = Column(Date, nullable=True)
-    aipr = Column(Date, nullable=True)
-    hg0b0 = Column(Date, nullable=True)
-    visite_med = Column(Date, nullable=True)
-    brevet_secour = Column(Date, nullable=True)
+    fimo = Column(DateType, nullable=True)
+    caces = Column(DateType, nullable=True)
+    aipr = Column(DateType, nullable=True)
+    hg0b0 = Column(DateType, nullable=True)
+    visite_med = Column(DateType, nullable=True)
+    brevet_secour = Column(DateType, nullable=True)
     commentaire = Column(Text, nullable=True)
 
     def __repr__(self):
         return f"<Collaborateur(id={self.id}, nom={self.nom}, prenom={self.prenom})>"
+
+# Read-only projection of a collaborateurs row, for list pages and notifier scans
+CollaborateurRow = namedtuple("CollaborateurRow", [column.name for column in Collaborateur.__table__.columns])
+
+class CollaborateurArchive(Base):
+    """Departed collaborateurs, moved out of collaborateurs by delete_collaborateur"""
+    __tablename__ = "collaborateurs_archive"
+    __table_args__ = {'sqlite_autoincrement': True}
+    archive_id = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(Integer, nullable=False, index=True)  # id the row had in collaborateurs
+    nom = Column(String(100), nullable=False)
+    prenom = Column(String(100), nullable=False)
+    fimo = Column(DateType, nullable=True)
+    caces = Column(DateType, nullable=True)
+    aipr = Column(DateType, nullable=True)
+    hg0b0 = Column(DateType, nullable=True)
+    visite_med = Column(DateType, nullable=True)
+    brevet_secour = Column(DateType, nullable=True)
+    commentaire = Column(Text, nullable=True)
+    archived_at = Column(Integer, nullable=False)  # Unix time
+
+CollaborateurArchiveRow = namedtuple("CollaborateurArchiveRow",
+                                     [column.name for column in CollaborateurArchive.__table__.columns])
+
+class CertificationHistory(Base):
+    """Certification dates replaced by a newer one"""
+    __tablename__ = "certification_history"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    collaborateur_id = Column(Integer, nullable=False, index=True)
+    archive_id = Column(Integer, nullable=True)  # set when the collaborateur is archived (ids can be reused)
+    field = Column(String(30), nullable=False)
+    value = Column(DateType, nullable=False)
+    replaced_at = Column(Integer, nullable=False)  # Unix time
+
+class RegisterVersion(Base):
+    """Single-row change counter, bumped in the same transaction as every write"""
+    __tablename__ = "register_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Integer, nullable=True)  # Unix time of the last write
+
+class ChangeLog(Base):
+    """Append-only log of row changes; seq only grows (AUTOINCREMENT never reuses ids)"""
+    __tablename__ = "change_log"
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    row_id = Column(Integer, nullable=True)  # None for a "reset" (whole register rewritten)
+    op = Column(String(10), nullable=False)  # insert, update, delete or reset
+    changed_at = Column(Integer, nullable=False)  # Unix time
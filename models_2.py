@@ -1,5 +1,7 @@
 # Import necessary libraries
-from sqlalchemy import Column, Integer, String, DateTime, Text, Date
+from collections import namedtuple
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from date_storage import DateType
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -10,9 +12,55 @@ class CollaborateurPoidsLouud(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     nom = Column(String, nullable=False)
     prenom = Column(String, nullable=False)
-    date_renouvellement = Column(Date, nullable=True)
-    date_validite = Column(Date, nullable=True)
+    date_renouvellement = Column(DateType, nullable=True)
+    date_validite = Column(DateType, nullable=True)
     commentaire = Column(Text, nullable=True)
 
     def __repr__(self):
         return f"<CollaborateurPoidsLouud(id={self.id}, nom={self.nom}, prenom={self.prenom})>"
+
+# Read-only projection of a collaborateurs_poids_louud row, for list pages and notifier scans
+CollaborateurPoidsLouudRow = namedtuple("CollaborateurPoidsLouudRow",
+                                        [column.name for column in CollaborateurPoidsLouud.__table__.columns])
+
+class CollaborateurPoidsLouudArchive(Base):
+    """Departed collaborateurs, moved out of collaborateurs_poids_louud by delete_collaborateur_2"""
+    __tablename__ = "collaborateurs_poids_louud_archive"
+    __table_args__ = {'sqlite_autoincrement': True}
+    archive_id = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(Integer, nullable=False, index=True)  # id the row had in collaborateurs_poids_louud
+    nom = Column(String, nullable=False)
+    prenom = Column(String, nullable=False)
+    date_renouvellement = Column(DateType, nullable=True)
+    date_validite = Column(DateType, nullable=True)
+    commentaire = Column(Text, nullable=True)
+    archived_at = Column(Integer, nullable=False)  # Unix time
+
+CollaborateurPoidsLouudArchiveRow = namedtuple("CollaborateurPoidsLouudArchiveRow",
+                                               [column.name for column in CollaborateurPoidsLouudArchive.__table__.columns])
+
+class CertificationHistory(Base):
+    """Certification dates replaced by a newer one"""
+    __tablename__ = "certification_history"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    collaborateur_id = Column(Integer, nullable=False, index=True)
+    archive_id = Column(Integer, nullable=True)  # set when the collaborateur is archived (ids can be reused)
+    field = Column(String(30), nullable=False)
+    value = Column(DateType, nullable=False)
+    replaced_at = Column(Integer, nullable=False)  # Unix time
+
+class RegisterVersion(Base):
+    """Single-row change counter, bumped in the same transaction as every write"""
+    __tablename__ = "register_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Integer, nullable=True)  # Unix time of the last write
+
+class ChangeLog(Base):
+    """Append-only log of row changes; seq only grows (AUTOINCREMENT never reuses ids)"""
+    __tablename__ = "change_log"
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    row_id = Column(Integer, nullable=True)  # None for a "reset" (whole register rewritten)
+    op = Column(String(10), nullable=False)  # insert, update, delete or reset
+    changed_at = Column(Integer, nullable=False)  # Unix time
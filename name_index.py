@@ -0,0 +1,186 @@
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from duplicates import THRESHOLD, name_tokens, blocking_keys, _scores
+from register_versions import get_version, collect_changes, get_last_seq, _get_engine, _get_table
+
+logger = logging.getLogger(__name__)
+
+# Writes made by this process update the index directly (put, discard); the
+# register version is polled at most this often to catch other processes' writes
+POLL_INTERVAL = 1.0
+
+class NameIndex:
+    """In-memory index of a register's names, kept current from the change log.
+
+    Word prefixes (a sorted word list) answer autocomplete; the blocking keys
+    of the duplicates report find similar names without scanning everyone.
+    The crud write paths keep it current in-process.
+    """
+
+    def __init__(self, register):
+        self.register = register
+        self.table = _get_table(register)
+        self.lock = threading.Lock()
+        self.version = None
+        self.seq = 0
+        self.checked_at = 0.0
+        self._clear()
+
+    def _clear(self):
+        self.people = {}    # id -> (nom, prenom, normalized name, words)
+        self.words = []     # sorted distinct words
+        self.postings = {}  # word -> ids
+        self.blocks = {}    # blocking key -> ids
+
+    def _add(self, row_id, nom, prenom, keep_sorted=True):
+        tokens = name_tokens(nom, prenom)
+        if not tokens:
+            return
+        self.people[row_id] = (nom, prenom, ' '.join(sorted(tokens)), tokens)
+        for word in set(tokens):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                if keep_sorted:
+                    insort(self.words, word)
+            ids.add(row_id)
+        for key in blocking_keys(tokens):
+            self.blocks.setdefault(key, set()).add(row_id)
+
+    def _remove(self, row_id):
+        person = self.people.pop(row_id, None)
+        if person is None:
+            return
+        for word in set(person[3]):
+            ids = self.postings[word]
+            ids.discard(row_id)
+            if not ids:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+        for key in blocking_keys(person[3]):
+            ids = self.blocks[key]
+            ids.discard(row_id)
+            if not ids:
+                del self.blocks[key]
+
+    def _load(self, conn, ids=None):
+        statement = select(self.table.c.id, self.table.c.nom, self.table.c.prenom)
+        if ids is not None:
+            statement = statement.where(self.table.c.id.in_(ids))
+        for row_id, nom, prenom in conn.execute(statement):
+            self._add(row_id, nom, prenom, keep_sorted=ids is not None)
+
+    def _rebuild(self):
+        self._clear()
+        with _get_engine(self.register).connect() as conn:
+            # Read the log position first: changes made while loading are applied again next time
+            self.seq = get_last_seq(conn)
+            self._load(conn)
+        self.words = sorted(self.postings)
+        logger.info(f"Name index of register {self.register} built: {len(self.people)} people, "
+                    f"{len(self.words)} words, {len(self.blocks)} blocks")
+
+    def _apply_changes(self):
+        self.seq, changed = collect_changes(self.register, self.seq)
+        if changed is None:
+            return self._rebuild()
+        for row_id in changed:
+            self._remove(row_id)
+        ids = sorted(changed)
+        with _get_engine(self.register).connect() as conn:
+            for start in range(0, len(ids), 500):
+                self._load(conn, ids[start:start + 500])
+
+    def refresh(self, force=False):
+        """Bring the index up to date with the register's version, checked at most once per POLL_INTERVAL"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.checked_at < POLL_INTERVAL:
+            return
+        self.checked_at = now
+        version = get_version(self.register)[0]
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            try:
+                if self.version is None:
+                    self._rebuild()
+                else:
+                    self._apply_changes()
+            except OperationalError as e:
+                logger.warning(f"Cannot read change log of register {self.register}, rebuilding: {str(e)}")
+                self._rebuild()
+            self.version = version
+
+    def put(self, row_id, nom, prenom):
+        """Index a row this process has just inserted or updated"""
+        with self.lock:
+            # Not built yet: the first refresh loads the row
+            if self.version is not None:
+                self._remove(row_id)
+                self._add(row_id, nom, prenom)
+
+    def discard(self, row_id):
+        """Drop a row this process has just deleted"""
+        with self.lock:
+            if self.version is not None:
+                self._remove(row_id)
+
+    def _prefixed(self, prefix):
+        """Ids of the people with a word starting with prefix"""
+        ids = set()
+        start = bisect_left(self.words, prefix)
+        for word in self.words[start:]:
+            if not word.startswith(prefix):
+                break
+            ids |= self.postings[word]
+        return ids
+
+    def complete(self, query, limit=10):
+        """[(id, nom, prenom)] whose words start with every word of the query, alphabetically"""
+        self.refresh()
+        tokens = name_tokens(query)
+        if not tokens:
+            return []
+        with self.lock:
+            ids = None
+            # Longest prefixes first: they match fewer words
+            for token in sorted(set(tokens), key=len, reverse=True):
+                ids = self._prefixed(token) if ids is None else ids & self._prefixed(token)
+                if not ids:
+                    return []
+            best = heapq.nsmallest(limit, ids, key=lambda row_id: self.people[row_id][2])
+            return [(row_id, *self.people[row_id][:2]) for row_id in best]
+
+    def similar(self, nom, prenom, threshold=THRESHOLD, limit=5, exclude=None):
+        """[(id, nom, prenom, score)] of people whose name is close to nom prenom, best first"""
+        self.refresh()
+        tokens = name_tokens(nom, prenom)
+        if not tokens:
+            return []
+        with self.lock:
+            candidates = set()
+            for key in blocking_keys(tokens):
+                candidates |= self.blocks.get(key, set())
+            candidates.discard(exclude)
+            scored = _scores(' '.join(sorted(tokens)),
+                             [(row_id, self.people[row_id][2]) for row_id in candidates], threshold)
+            best = heapq.nlargest(limit, scored, key=lambda item: item[1])
+            return [(row_id, *self.people[row_id][:2], score) for row_id, score in best]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(register):
+    """The register's name index, built on first use"""
+    index = _indexes.get(register)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(register, NameIndex(register))
+    return index
@@ -0,0 +1,148 @@
+import io
+import os
+import re
+import hmac
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+# Web profiling is disabled unless this token is set; send it as X-Profile or ?profile=
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILES_PER_MINUTE = int(os.getenv("PROFILES_PER_MINUTE", "5"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "40"))
+# "auto" uses pyinstrument (sampling, low overhead) when installed, cProfile otherwise
+PROFILER = os.getenv("PROFILER", "auto")
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Only one profiler can hook the interpreter at a time
+_active = threading.Lock()
+_taken = deque()
+_taken_lock = threading.Lock()
+
+def _allow():
+    """Rate limit: at most PROFILES_PER_MINUTE profiles in any 60 s window"""
+    now = time.monotonic()
+    with _taken_lock:
+        while _taken and now - _taken[0] > 60:
+            _taken.popleft()
+        if len(_taken) >= PROFILES_PER_MINUTE:
+            return False
+        _taken.append(now)
+        return True
+
+class Profile:
+    """One profiling session, with cProfile or pyinstrument"""
+
+    def __init__(self, name):
+        self.name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'run'
+        self.use_pyinstrument = pyinstrument is not None and PROFILER in ('auto', 'pyinstrument')
+        self.profiler = pyinstrument.Profiler() if self.use_pyinstrument else cProfile.Profile()
+        self.started = None
+        self.duration = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.use_pyinstrument:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.use_pyinstrument:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+
+    def save(self):
+        """Write the raw profile and a top-N summary; returns the summary path"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{self.name}_{os.getpid()}")
+        header = f"{self.name}: {self.duration:.3f}s\n\n"
+        if self.use_pyinstrument:
+            with open(f"{base}.html", 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+            summary = self.profiler.output_text(unicode=True, color=False)
+        else:
+            self.profiler.dump_stats(f"{base}.prof")
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+            summary = stream.getvalue()
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(header + summary)
+        logger.info(f"Profile of {self.name} ({self.duration:.3f}s) written to {base}.txt")
+        return f"{base}.txt"
+
+@contextmanager
+def profile_run(name, enabled=True):
+    """Profile a block (a notifier or seeder run) when enabled"""
+    if not enabled or not _active.acquire(blocking=False):
+        yield
+        return
+    profile = Profile(name)
+    try:
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            profile.save()
+    finally:
+        _active.release()
+
+def _requested():
+    token = request.headers.get('X-Profile') or request.args.get('profile')
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+def before_request():
+    if not _requested():
+        return
+    if not _allow() or not _active.acquire(blocking=False):
+        logger.warning(f"Profile of {request.path} skipped: rate limit or another profile running")
+        return
+    g.profile = Profile(f"{request.method}_{request.path}")
+    g.profile.start()
+
+def _finish():
+    profile = g.pop('profile', None)
+    if profile is None:
+        return None
+    try:
+        profile.stop()
+        return profile.save()
+    except Exception as e:
+        logger.error(f"Cannot save profile of {request.path}: {str(e)}")
+        return None
+    finally:
+        _active.release()
+
+def after_request(response):
+    path = _finish()
+    if path:
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
+
+def teardown_request(exc):
+    # Requests that raised never reach after_request
+    _finish()
+
+def init_app(app):
+    """Profile requests carrying the admin token"""
+    if not PROFILE_TOKEN:
+        return
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
@@ -0,0 +1,171 @@
+import time
+import logging
+from collections import namedtuple
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Works on a fresh table too: the single row is created by the first write.
+# Plain SQL so the raw sqlite3 seeder can run it in its own transaction.
+BUMP_SQL = (
+    "INSERT INTO register_version (id, version, updated_at) VALUES (1, 1, :now) "
+    "ON CONFLICT(id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at"
+)
+CREATE_SQL = (
+    "CREATE TABLE IF NOT EXISTS register_version ("
+    "id INTEGER PRIMARY KEY, version INTEGER NOT NULL, updated_at INTEGER)"
+)
+SELECT_SQL = "SELECT version, updated_at FROM register_version WHERE id = 1"
+
+CHANGE_LOG_CREATE_SQL = (
+    "CREATE TABLE IF NOT EXISTS change_log ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, row_id INTEGER, op VARCHAR(10) NOT NULL, changed_at INTEGER NOT NULL)"
+)
+CHANGE_LOG_INSERT_SQL = "INSERT INTO change_log (row_id, op, changed_at) VALUES (:row_id, :op, :now)"
+CHANGE_LOG_SELECT_SQL = (
+    "SELECT seq, row_id, op, changed_at FROM change_log WHERE seq > :since ORDER BY seq LIMIT :limit"
+)
+OPERATIONS = ("insert", "update", "delete", "reset")
+
+Change = namedtuple("Change", "seq row_id op changed_at")
+
+def bump_version(db):
+    """Bump the register's version inside the session's current transaction.
+
+    Call it before db.commit() in every write so readers never see new data
+    with an old version.
+    """
+    db.execute(text(BUMP_SQL), {'now': int(time.time())})
+
+def bump_version_sqlite(conn):
+    """Same as bump_version for a raw sqlite3 connection"""
+    conn.execute(CREATE_SQL)
+    conn.execute(BUMP_SQL, {'now': int(time.time())})
+
+def record_change(db, row_id, op):
+    """Log a row change and bump the version, in the session's current transaction.
+
+    Call it before db.commit() in every write; for inserts, flush first so
+    the row has its id.
+    """
+    db.execute(text(CHANGE_LOG_INSERT_SQL), {'row_id': row_id, 'op': op, 'now': int(time.time())})
+    bump_version(db)
+
+def record_changes_sqlite(conn, changes):
+    """Log (row_id, op) pairs and bump the version on a raw sqlite3 connection"""
+    now = int(time.time())
+    conn.execute(CHANGE_LOG_CREATE_SQL)
+    conn.executemany(CHANGE_LOG_INSERT_SQL, ({'row_id': row_id, 'op': op, 'now': now} for row_id, op in changes))
+    bump_version_sqlite(conn)
+
+def _get_engine(register):
+    if register == 1:
+        from database_1 import engine
+        return engine
+    if register == 2:
+        from database_2 import engine
+        return engine
+    raise ValueError(f"Unknown register {register!r}")
+
+def _get_table(register):
+    if register == 1:
+        from models_1 import Collaborateur
+        return Collaborateur.__table__
+    if register == 2:
+        from models_2 import CollaborateurPoidsLouud
+        return CollaborateurPoidsLouud.__table__
+    raise ValueError(f"Unknown register {register!r}")
+
+def get_version(register):
+    """Return (version, updated_at) of a register; (0, None) before the first write"""
+    try:
+        with _get_engine(register).connect() as conn:
+            row = conn.exec_driver_sql(SELECT_SQL).first()
+    except OperationalError as e:
+        logger.warning(f"Cannot read version of register {register}: {str(e)}")
+        return 0, None
+    return (row[0], row[1]) if row else (0, None)
+
+def iter_changes(register, since=0, batch_size=1000):
+    """Yield the register's Change entries with seq > since, oldest first"""
+    engine = _get_engine(register)
+    while True:
+        with engine.connect() as conn:
+            batch = conn.execute(text(CHANGE_LOG_SELECT_SQL), {'since': since, 'limit': batch_size}).all()
+        for row in batch:
+            yield Change(*row)
+        if len(batch) < batch_size:
+            return
+        since = batch[-1][0]
+
+def collect_changes(register, since=0):
+    """(last seq, ids of the rows changed after since); ids is None when a reset requires a full reload"""
+    changed = set()
+    for change in iter_changes(register, since):
+        since = change.seq
+        if change.op == "reset":
+            changed = None
+        elif changed is not None:
+            changed.add(change.row_id)
+    return since, changed
+
+def get_last_seq(conn):
+    """Current end of the change log on an open connection"""
+    return conn.exec_driver_sql("SELECT COALESCE(MAX(seq), 0) FROM change_log").scalar()
+
+def get_changes_page(register, since=0, limit=1000):
+    """One page of the change feed, compacted to the last change of each row.
+
+    Inserted and updated rows carry their current values. When the page
+    contains a reset (a replace import), only what follows it is returned
+    and the consumer must reload the whole register.
+    """
+    entries = []
+    for change in iter_changes(register, since, batch_size=limit + 1):
+        entries.append(change)
+        if len(entries) > limit:
+            break
+    more = len(entries) > limit
+    entries = entries[:limit]
+    next_seq = entries[-1].seq if entries else since
+    reset = False
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index].op == "reset":
+            reset = True
+            entries = entries[index + 1:]
+            break
+    latest = {}
+    for change in entries:
+        previous = latest.pop(change.row_id, None)
+        # Inserted then updated within the page is still new to the consumer
+        if previous is not None and previous.op == "insert" and change.op == "update":
+            change = change._replace(op="insert")
+        latest[change.row_id] = change
+    table = _get_table(register)
+    ids = [row_id for row_id, change in latest.items() if change.op != "delete"]
+    rows = {}
+    if ids:
+        with _get_engine(register).connect() as conn:
+            for row in conn.execute(select(table).where(table.c.id.in_(ids))):
+                rows[row.id] = {key: value.isoformat() if hasattr(value, 'isoformat') else value
+                                for key, value in row._mapping.items()}
+    changes = []
+    for change in latest.values():
+        # A row deleted after this page was read no longer has data: report it deleted
+        data = rows.get(change.row_id)
+        changes.append({
+            'seq': change.seq,
+            'id': change.row_id,
+            'op': change.op if change.op == "delete" or data is not None else "delete",
+            'changed_at': change.changed_at,
+            'data': data
+        })
+    return {
+        'register': register,
+        'since': since,
+        'next': next_seq,
+        'more': more,
+        'reset': reset,
+        'changes': changes
+    }
@@ -1,86 +1,41 @@
 import sqlite3
 import csv
 import os
-from datetime import datetime
+import time
+import argparse
+import hashlib
+from itertools import islice
+from dotenv import load_dotenv
+from validation import validate_chunks
+from register_versions import record_changes_sqlite
+from date_storage import to_storage
+from archive import archive_rows_sqlite
+import profiling
 
-DB_PATH = "database_management_1.db"
-CSV_PATH = os.path.join(os.path.dirname(__file__), "consommable", "best.csv")
-TABLE = "collaborateurs"
+load_dotenv()
 
-EXPECTED_FIELDS = ['id','nom','prenom','fimo','caces','aipr','hg0b0','visite_med','brevet_secour','commentaire']
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def parse_date(value):
-    """Parse an ISO date string (YYYY-MM-DD) and return ISO date (YYYY-MM-DD) or None.
- 
-    Accept only "%Y-%m-%d". Coerce non-str inputs to str and handle None safely.
-    """
-    if value is None:
-        return None
-    if not isinstance(value, str):
-        value = str(value)
-    value = value.strip()
-    if not value:
-        return None
-    try:
-        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
-    except Exception:
-        return None
-
-def normalize_row(raw_row):
-    """Return a dict with expected keys and stripped values (strings)."""
-    row = {}
-    # Build a lookup of original keys by their normalized form (strip+lower)
-    key_map = {}
-    for k in raw_row.keys():
-        if k is None:
-            continue
-        try:
-            nk = k.strip().lower()
-        except Exception:
-            nk = str(k).strip().lower()
-        key_map[nk] = k
-    for key in EXPECTED_FIELDS:
-        k_lower = key.strip().lower()
-        orig_key = key_map.get(k_lower)
-        # prefer the original-cased header if present, fall back to the raw key name
-        if orig_key is not None and orig_key in raw_row:
-            val = raw_row.get(orig_key)
-        else:
-            val = raw_row.get(key)
-        if val is None:
-            val = ""
-        if not isinstance(val, str):
-            val = str(val)
-        row[key] = val.strip()
-    return row
-
-def process_row(row, line_no):
-    row = normalize_row(row)
-    # id
-    id_val = None
-    if row['id']:
-        try:
-            id_val = int(row['id'])
-        except Exception:
-            print(f"Warning: invalid id on line {line_no}: {row['id']!r} -> storing NULL")
-            id_val = None
-    nom = row['nom'] or None
-    prenom = row['prenom'] or None
-    dates = []
-    for field in ('fimo','caces','aipr','hg0b0','visite_med','brevet_secour'):
-        raw = row.get(field,"") or ""
-        parsed = parse_date(raw)
-        if raw and parsed is None:
-            print(f"Warning: unrecognized date format for '{field}' on line {line_no}: {raw!r} -> stored as NULL")
-        dates.append(parsed)
-    commentaire = row['commentaire'] or None
-    return (id_val, nom, prenom, *dates, commentaire)
-
-def seed_database():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # ensure table exists with the expected schema
-    cursor.execute("""CREATE TABLE IF NOT EXISTS collaborateurs (
+# Rows are sent to SQLite in chunks of this size, all inside one transaction
+CHUNK_SIZE = 5000
+
+# Only the first errors are listed in the report; the totals are always complete
+MAX_REPORTED_ERRORS = 50
+
+def sqlite_path_from_url(url, default):
+    """Return the file path of a sqlite:/// URL, or default for other URLs"""
+    if url and url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):]
+    return default
+
+REGISTERS = {
+    1: {
+        'db_path': sqlite_path_from_url(os.getenv("SQLALCHEMY_DATABASE_URL_1"), "database_management_1.db"),
+        'csv_path': os.path.join(BASE_DIR, "consommable", "best.csv"),
+        'table': "collaborateurs",
+        'fields': ['id', 'nom', 'prenom', 'fimo', 'caces', 'aipr', 'hg0b0', 'visite_med', 'brevet_secour', 'commentaire'],
+        'date_fields': ('fimo', 'caces', 'aipr', 'hg0b0', 'visite_med', 'brevet_secour'),
+        'create_sql': """CREATE TABLE IF NOT EXISTS collaborateurs (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nom VARCHAR(100) NOT NULL,
         prenom VARCHAR(100) NOT NULL,
@@ -91,36 +46,321 @@ def seed_database():
         visite_med DATE,
         brevet_secour DATE,
         commentaire TEXT
-    )""")
-    inserted = 0
-    with open(CSV_PATH, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        # validate header presence
-        if reader.fieldnames is None:
-            raise ValueError("CSV has no header")
-        header = [h.strip().lower() for h in reader.fieldnames]
-        expected_lower = [h.lower() for h in EXPECTED_FIELDS]
-        missing = set(expected_lower) - set(header)
-        if missing:
-            raise ValueError(f"CSV is missing expected fields: {sorted(missing)}. Found header: {reader.fieldnames}")
-        if header != expected_lower:
-            # order differs but all expected fields are present — mapping by name will be used
-            print(f"Warning: CSV header order differs from expected. Expected order: {EXPECTED_FIELDS}\n Found: {reader.fieldnames}\n Proceeding using mapping by field name.")
-        for i, raw in enumerate(reader, start=2):
-            try:
-                values = process_row(raw, i)
-                cursor.execute(
-                    f"""INSERT OR REPLACE INTO {TABLE}
- (id, nom, prenom, fimo, caces, aipr, hg0b0, visite_med, brevet_secour, commentaire)
- VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    values
-                )
-                inserted += 1
-            except Exception as e:
-                print(f"Error inserting line {i}: {e}")
-    conn.commit()
-    conn.close()
-    print(f"Database seeded from best.csv. {inserted} rows inserted/updated.")
+    )"""
+    },
+    2: {
+        'db_path': sqlite_path_from_url(os.getenv("SQLALCHEMY_DATABASE_URL_2"), "database_management_2.db"),
+        'csv_path': os.path.join(BASE_DIR, "consommable", "collaborateurs_poids_louud.csv"),
+        'table': "collaborateurs_poids_louud",
+        'fields': ['id', 'nom', 'prenom', 'date_renouvellement', 'date_validite', 'commentaire'],
+        'date_fields': ('date_renouvellement', 'date_validite'),
+        'create_sql': """CREATE TABLE IF NOT EXISTS collaborateurs_poids_louud (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nom VARCHAR(100) NOT NULL,
+        prenom VARCHAR(100) NOT NULL,
+        date_renouvellement DATE,
+        date_validite DATE,
+        commentaire TEXT
+    )"""
+    }
+}
+
+# Register 1 defaults, kept for existing callers
+DB_PATH = REGISTERS[1]['db_path']
+CSV_PATH = REGISTERS[1]['csv_path']
+TABLE = REGISTERS[1]['table']
+EXPECTED_FIELDS = REGISTERS[1]['fields']
+
+def resolve_header(fieldnames, fields, errors=None):
+    """Map each expected field to its column index in the CSV header.
+
+    Header names are matched case-insensitively, so the mapping is resolved
+    once per file instead of once per row. A header in another order is
+    reported as a warning in errors.
+    """
+    if not fieldnames:
+        raise ValueError("CSV has no header")
+    header = [(h or "").strip().lower() for h in fieldnames]
+    positions = {name: i for i, name in enumerate(header)}
+    missing = [f for f in fields if f.lower() not in positions]
+    if missing:
+        raise ValueError(f"CSV is missing expected fields: {sorted(missing)}. Found header: {fieldnames}")
+    if header[:len(fields)] != [f.lower() for f in fields] and errors is not None:
+        # order differs but all expected fields are present — mapping by name will be used
+        errors.append(make_error(1, '', ', '.join(fieldnames),
+                                 f"header order differs from {', '.join(fields)} -> columns matched by name",
+                                 "warning"))
+    return [positions[f.lower()] for f in fields]
+
+def make_error(line_no, field, value, message, level="error"):
+    """Build one entry of the import error report"""
+    return {'line': line_no, 'field': field, 'value': value, 'message': message, 'level': level}
+
+def read_chunks(csv_path, config, chunk_size=CHUNK_SIZE, errors=None):
+    """Yield chunks of (line_no, {field: value}) pairs, resolving the header once"""
+    fields = config['fields']
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        indexes = resolve_header(next(reader, None), fields, errors)
+        width = max(indexes) + 1
+        chunk = []
+        for raw in reader:
+            if not raw:
+                continue
+            if len(raw) < width:
+                raw = raw + [""] * (width - len(raw))
+            chunk.append((reader.line_num, {field: raw[i].strip() for field, i in zip(fields, indexes)}))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def read_rows(register, csv_path, errors, chunk_size=CHUNK_SIZE, processes=0):
+    """Yield the insert tuples of a CSV file.
+
+    Rows are checked by the register's validator (see validation.py), in a
+    process pool when processes > 1. Invalid optional values are stored as
+    NULL with a warning; rows with errors are skipped. Problems are
+    appended to errors.
+    """
+    config = REGISTERS[register]
+    columns = [(field, field in config['date_fields']) for field in config['fields']]
+    for results in validate_chunks(register, read_chunks(csv_path, config, chunk_size, errors), processes):
+        for line_no, values, problems in results:
+            for field, value, message, level in problems:
+                suffix = "stored as NULL" if level == "warning" else "row skipped"
+                errors.append(make_error(line_no, field, value, f"{message} -> {suffix}", level))
+            if values is None:
+                continue
+            yield tuple(
+                to_storage(values[field]) if is_date else values[field]
+                for field, is_date in columns
+            )
+
+def chunked(iterable, size):
+    """Yield lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def row_hash(values):
+    """Hash the data columns of an insert tuple (everything but the id).
+
+    Empty text hashes like NULL: the form stores an empty commentaire as ''
+    while an empty CSV cell arrives as None, and both mean "no value".
+    """
+    data = tuple(None if value == '' else value for value in values[1:])
+    return hashlib.blake2b(repr(data).encode('utf-8'), digest_size=16).digest()
+
+def load_row_hashes(conn, config):
+    """Return ({id: hash}, {(nom, prenom): id}) for the rows stored in a register.
+
+    Names that appear more than once map to None and cannot be matched.
+    """
+    hashes = {}
+    names = {}
+    for row in conn.execute(f"SELECT {', '.join(config['fields'])} FROM {config['table']}"):
+        hashes[row[0]] = row_hash(row)
+        key = (row[1], row[2])
+        names[key] = None if key in names else row[0]
+    return hashes, names
+
+def apply_diff(conn, config, rows, report, delete_missing=False, chunk_size=CHUNK_SIZE, progress=None):
+    """Write only the rows that differ from the stored ones.
+
+    Rows are matched by id, or by (nom, prenom) when the CSV has no id.
+    Unchanged rows are not touched; rows missing from the file are moved
+    to the archive only when delete_missing is set.
+    """
+    columns = config['fields']
+    table = config['table']
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    update_sql = f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns[1:])} WHERE id = ?"
+    stored, names = load_row_hashes(conn, config)
+    seen = set()
+    for chunk in chunked(rows, chunk_size):
+        inserts = []
+        updates = []
+        for row in chunk:
+            row_id = row[0]
+            if row_id is None:
+                row_id = names.get((row[1], row[2]))
+            digest = row_hash(row)
+            if row_id is not None and row_id in stored:
+                seen.add(row_id)
+                if stored[row_id] == digest:
+                    report['unchanged'] += 1
+                    continue
+                stored[row_id] = digest
+                updates.append((*row[1:], row_id))
+                report['changed_ids']['updated'].append(row_id)
+            else:
+                inserts.append(row)
+        if inserts:
+            with_id = [row for row in inserts if row[0] is not None]
+            conn.executemany(insert_sql, with_id)
+            for row in with_id:
+                stored[row[0]] = row_hash(row)
+                seen.add(row[0])
+                report['changed_ids']['inserted'].append(row[0])
+            # New people without an id get theirs from SQLite, one statement each
+            for row in inserts:
+                if row[0] is None:
+                    report['changed_ids']['inserted'].append(conn.execute(insert_sql, row).lastrowid)
+        if updates:
+            conn.executemany(update_sql, updates)
+        report['inserted'] += len(inserts)
+        report['updated'] += len(updates)
+        report['rows_written'] += len(inserts) + len(updates)
+        if progress:
+            progress(report)
+    if delete_missing:
+        missing = [row_id for row_id in stored if row_id not in seen]
+        for chunk in chunked(missing, chunk_size):
+            archive_rows_sqlite(conn, report['register'], chunk)
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in chunk])
+        report['deleted'] = len(missing)
+        report['rows_written'] += len(missing)
+        report['changed_ids']['deleted'] = missing
+
+def change_log_entries(report):
+    """(row_id, op) pairs for the change log; a replace import is logged as one reset"""
+    if report['mode'] != "diff":
+        return [(None, "reset")]
+    return [(row_id, op)
+            for op, key in (("insert", 'inserted'), ("update", 'updated'), ("delete", 'deleted'))
+            for row_id in report['changed_ids'][key]]
+
+def import_csv(register=1, csv_path=None, db_path=None, chunk_size=CHUNK_SIZE, progress=None,
+               mode="replace", delete_missing=False, processes=0):
+    """Import a CSV file into a register in a single transaction.
+
+    mode="replace" streams every row through INSERT OR REPLACE; mode="diff"
+    only writes rows whose content changed (see apply_diff). progress, if
+    given, is called after each chunk with the running report. processes > 1
+    validates the chunks in a process pool. Returns the report dict.
+    """
+    if mode not in ("replace", "diff"):
+        raise ValueError(f"Unknown import mode {mode!r}")
+    if delete_missing and mode != "diff":
+        raise ValueError("delete_missing requires mode='diff'")
+    config = REGISTERS[register]
+    csv_path = csv_path or config['csv_path']
+    db_path = db_path or config['db_path']
+    columns = config['fields']
+    insert_sql = (f"INSERT OR REPLACE INTO {config['table']} ({', '.join(columns)}) "
+                  f"VALUES ({', '.join('?' for _ in columns)})")
+    report = {
+        'register': register,
+        'table': config['table'],
+        'csv_path': csv_path,
+        'mode': mode,
+        'rows_read': 0,
+        'rows_written': 0,
+        'inserted': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'deleted': 0,
+        'changed_ids': {'inserted': [], 'updated': [], 'deleted': []},
+        'errors': [],
+        'elapsed': 0.0
+    }
+    start = time.perf_counter()
+
+    def counted(rows):
+        for row in rows:
+            report['rows_read'] += 1
+            yield row
+
+    def on_chunk(report):
+        report['elapsed'] = time.perf_counter() - start
+        if progress:
+            progress(report)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute(config['create_sql'])
+        conn.execute("BEGIN")
+        rows = counted(read_rows(register, csv_path, report['errors'], chunk_size, processes))
+        if mode == "diff":
+            apply_diff(conn, config, rows, report, delete_missing, chunk_size, on_chunk)
+        else:
+            for chunk in chunked(rows, chunk_size):
+                conn.executemany(insert_sql, chunk)
+                report['rows_written'] += len(chunk)
+                on_chunk(report)
+        if report['rows_written']:
+            record_changes_sqlite(conn, change_log_entries(report))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    report['elapsed'] = time.perf_counter() - start
+    return report
+
+def print_report(report):
+    """Print the import summary and the error report with line numbers"""
+    errors = report['errors']
+    rejected = sum(1 for e in errors if e['level'] == "error")
+    rate = report['rows_read'] / report['elapsed'] if report['elapsed'] else 0
+    print(f"Import of {os.path.basename(report['csv_path'])} into {report['table']} (register {report['register']})")
+    print(f"  rows written : {report['rows_written']}")
+    if report['mode'] == "diff":
+        print(f"    inserted   : {report['inserted']}")
+        print(f"    updated    : {report['updated']}")
+        print(f"    deleted    : {report['deleted']}")
+        print(f"    unchanged  : {report['unchanged']}")
+        for kind, ids in report['changed_ids'].items():
+            if ids:
+                shown = ', '.join(str(i) for i in ids[:MAX_REPORTED_ERRORS])
+                more = f" ... (+{len(ids) - MAX_REPORTED_ERRORS})" if len(ids) > MAX_REPORTED_ERRORS else ""
+                print(f"    {kind} ids: {shown}{more}")
+    print(f"  rows skipped : {rejected}")
+    print(f"  warnings     : {len(errors) - rejected}")
+    print(f"  elapsed      : {report['elapsed']:.2f}s ({rate:.0f} rows/s)")
+    if errors:
+        print(f"  {'line':>6}  {'level':<8} {'field':<20} {'value':<20} message")
+        for e in errors[:MAX_REPORTED_ERRORS]:
+            print(f"  {e['line']:>6}  {e['level']:<8} {e['field']:<20} {e['value']!r:<20} {e['message']}")
+        if len(errors) > MAX_REPORTED_ERRORS:
+            print(f"  ... {len(errors) - MAX_REPORTED_ERRORS} more")
+
+def seed_database(register=1, csv_path=None, db_path=None, chunk_size=CHUNK_SIZE,
+                  mode="replace", delete_missing=False, processes=0):
+    """Seed a register from its CSV file and print the report"""
+    report = import_csv(register, csv_path, db_path, chunk_size, mode=mode,
+                        delete_missing=delete_missing, processes=processes)
+    print_report(report)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Import collaborateurs from CSV into the SQLite registers")
+    parser.add_argument("--register", choices=["1", "2", "all"], default="1", help="register to import (default: 1)")
+    parser.add_argument("--csv", help="CSV file (default: the register's file in consommable/)")
+    parser.add_argument("--db", help="SQLite database file (default: the register's database)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per executemany batch")
+    parser.add_argument("--diff", action="store_true", help="only write rows that changed since the last import")
+    parser.add_argument("--delete-missing", action="store_true", help="with --diff, delete people missing from the file")
+    parser.add_argument("--processes", type=int, default=0, help="validate chunks in this many worker processes")
+    parser.add_argument("--profile", action="store_true", help="profile the import into PROFILE_DIR")
+    args = parser.parse_args()
+    if args.delete_missing and not args.diff:
+        parser.error("--delete-missing requires --diff")
+    registers = [1, 2] if args.register == "all" else [int(args.register)]
+    if len(registers) > 1 and (args.csv or args.db):
+        parser.error("--csv and --db require a single --register")
+    with profiling.profile_run(f"seed_{args.register}", enabled=args.profile):
+        for register in registers:
+            seed_database(register, args.csv, args.db, args.chunk_size,
+                          mode="diff" if args.diff else "replace", delete_missing=args.delete_missing,
+                          processes=args.processes)
 
 if __name__ == "__main__":
-    seed_database()
+    main()
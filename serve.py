@@ -0,0 +1,56 @@
+import os
+import logging
+import argparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def default_workers():
+    """WEB_CONCURRENCY, else one worker per core (SQLite writers serialise anyway)"""
+    return int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+def post_fork(server, worker):
+    """Forked workers must not reuse the master's SQLite connections"""
+    from database_1 import engine as engine_1
+    from database_2 import engine as engine_2
+    for engine in (engine_1, engine_2):
+        engine.dispose(close=False)
+
+def run_gunicorn(bind, workers, threads):
+    """Preload the app in the master, then fork threaded workers"""
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('preload_app', True)
+            self.cfg.set('post_fork', post_fork)
+
+        def load(self):
+            from main import create_app
+            return create_app()
+
+    Application().run()
+
+def run_uvicorn(bind, workers, threads):
+    """ASGI workers; each one imports main and bounds WSGI calls to `threads`"""
+    import uvicorn
+    host, _, port = bind.rpartition(':')
+    os.environ['WEB_THREADS'] = str(threads)
+    uvicorn.run('main:asgi_app', host=host or '127.0.0.1', port=int(port), workers=workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the web application with production workers")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default=os.getenv('WEB_SERVER', 'gunicorn'))
+    parser.add_argument("--bind", default=os.getenv('WEB_BIND', '0.0.0.0:8000'), help="host:port")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--threads", type=int, default=int(os.getenv('WEB_THREADS', 4)), help="threads per worker")
+    args = parser.parse_args()
+    logger.info(f"Starting {args.server} on {args.bind} with {args.workers} workers x {args.threads} threads")
+    if args.server == "gunicorn":
+        run_gunicorn(args.bind, args.workers, args.threads)
+    else:
+        run_uvicorn(args.bind, args.workers, args.threads)
@@ -0,0 +1,60 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Every module reads its settings at import: point them at throwaway files first
+TMP_DIR = tempfile.mkdtemp(prefix="registers_tests_")
+DB_PATHS = {register: os.path.join(TMP_DIR, f"register_{register}.db") for register in (1, 2)}
+os.environ.update({
+    'SQLALCHEMY_DATABASE_URL_1': f"sqlite:///{DB_PATHS[1]}",
+    'SQLALCHEMY_DATABASE_URL_2': f"sqlite:///{DB_PATHS[2]}",
+    'IMPORT_JOBS_DB': os.path.join(TMP_DIR, "import_jobs.db"),
+    'METRICS_DIR': os.path.join(TMP_DIR, "metrics"),
+    'BACKUP_DIR': os.path.join(TMP_DIR, "backups"),
+    'SECRET_KEY': "tests",
+    'EMAIL_CONTENT_PROVIDER': "template",
+    'DATE_STORAGE': "iso",
+    'SMTP_SERVER': "smtp.invalid",
+    'SMTP_PORT': "587",
+    'SENDER_EMAIL': "sender@example.com",
+    'SENDER_PASSWORD': "secret",
+    'RECIPIENT_EMAIL': "recipient@example.com",
+    'RECIPIENT_EMAIL_2': "recipient2@example.com"
+})
+
+@pytest.fixture
+def registers():
+    """Empty register databases with all their tables; returns {register: db path}"""
+    import name_index
+    from database_1 import init_db as init_db_1
+    from database_2 import init_db as init_db_2
+    # Emptied in place: other engines (the notifiers') may hold pooled connections to the files
+    for path in DB_PATHS.values():
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            tables = [name for name, in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                conn.execute(f"DROP TABLE {table}")
+        finally:
+            conn.close()
+    init_db_1()
+    init_db_2()
+    name_index._indexes.clear()
+    return dict(DB_PATHS)
+
+@pytest.fixture
+def app(registers):
+    from main import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+from database_1 import SessionLocal
+from crud_1 import create_collaborateur
+from backup import backup_register, integrity_check, list_snapshots, restore_register, rotate
+
+def add(nom):
+    db = SessionLocal()
+    try:
+        create_collaborateur(db, nom, 'Jean')
+    finally:
+        db.close()
+
+def query(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def test_backup_writes_a_verified_snapshot(registers, tmp_path):
+    add('DUPONT')
+    report = backup_register(1, registers[1], str(tmp_path))
+    assert os.path.exists(report['path'])
+    assert not os.path.exists(report['path'] + '.part')
+    assert integrity_check(report['path']) == 'ok'
+    assert query(report['path'], "SELECT nom FROM collaborateurs") == [('DUPONT',)]
+    assert list_snapshots(1, str(tmp_path)) == [report['path']]
+
+def test_rotation_keeps_the_newest(registers, tmp_path):
+    paths = [backup_register(1, registers[1], str(tmp_path), keep=10)['path'] for _ in range(3)]
+    assert rotate(1, str(tmp_path), keep=2) == paths[:1]
+    assert list_snapshots(1, str(tmp_path)) == paths[1:]
+
+def test_integrity_check_of_a_damaged_file(tmp_path):
+    path = tmp_path / 'broken.db'
+    path.write_bytes(b'not a database' * 100)
+    assert integrity_check(str(path)) != 'ok'
+
+def test_restore_moves_the_version_past_both_histories(registers, tmp_path):
+    add('DUPONT')
+    snapshot = backup_register(1, registers[1], str(tmp_path))['path']
+    add('MARTIN')
+    add('DURAND')
+    version_before = query(registers[1], "SELECT version FROM register_version")[0][0]
+    seq_before = query(registers[1], "SELECT MAX(seq) FROM change_log")[0][0]
+
+    restore_register(1, snapshot, registers[1], str(tmp_path))
+
+    assert query(registers[1], "SELECT nom FROM collaborateurs") == [('DUPONT',)]
+    assert query(registers[1], "SELECT version FROM register_version")[0][0] > version_before
+    assert query(registers[1], "SELECT seq, op FROM change_log ORDER BY seq DESC LIMIT 1") == [(seq_before + 1, 'reset')]
+    # The replaced database was backed up first
+    saved = [path for path in list_snapshots(1, str(tmp_path)) if path != snapshot]
+    assert len(saved) == 1
+    assert len(query(saved[0], "SELECT nom FROM collaborateurs")) == 3
@@ -0,0 +1,52 @@
+import threading
+import pytest
+import content_providers
+from content_providers import ContentProvider, ModelProvider, get_provider
+
+def test_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        ContentProvider()
+    with pytest.raises(TypeError):
+        ModelProvider()
+
+def test_unknown_provider():
+    with pytest.raises(ValueError):
+        get_provider('nope')
+
+def test_one_instance_per_provider_across_threads(monkeypatch):
+    monkeypatch.setattr(content_providers, '_instances', {})
+    created = []
+    original = content_providers.StubProvider.__init__
+
+    def slow_init(self):
+        created.append(self)
+        threading.Event().wait(0.01)
+        original(self)
+
+    monkeypatch.setattr(content_providers.StubProvider, '__init__', slow_init)
+    providers = []
+    threads = [threading.Thread(target=lambda: providers.append(get_provider('stub'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(provider is providers[0] for provider in providers)
+
+def test_model_provider_falls_back_to_templates():
+    class Failing(ModelProvider):
+        name = 'failing'
+
+        def complete(self, prompt):
+            raise RuntimeError("unavailable")
+
+    class Row:
+        id, nom, prenom, commentaire = 1, 'DUPONT', 'Jean', None
+
+    notifications = [{'type': 'FIMO', 'due_date': '2030-01-01', 'days_until': 10, 'urgent': False,
+                      'message': 'FIMO à renouveler dans 10 jours', 'recipients': ('RECIPIENT_EMAIL',),
+                      'vehicle_data': {'id': 1, 'nom': 'DUPONT', 'prenom': 'Jean', 'commentaire': None}}]
+    provider = Failing()
+    content = provider.generate(Row(), notifications)
+    assert content.provider == 'template'
+    assert provider.stats['errors'] == 1
@@ -0,0 +1,71 @@
+from datetime import date
+from database_1 import SessionLocal
+from crud_1 import create_collaborateur, get_collaborateur, update_collaborateur, get_certification_history
+
+FORM = {'nom': 'DUPONT', 'prenom': 'Jean', 'fimo': '2030-01-01', 'caces': '2031-02-03', 'aipr': '',
+        'hg0b0': '', 'visite_med': '', 'brevet_secour': '', 'commentaire': ''}
+
+def _create():
+    db = SessionLocal()
+    try:
+        return create_collaborateur(db, 'DUPONT', 'Jean', fimo='2030-01-01', caces='2031-02-03').id
+    finally:
+        db.close()
+
+def _load(collaborateur_id):
+    db = SessionLocal()
+    try:
+        return get_collaborateur(db, collaborateur_id), get_certification_history(db, collaborateur_id)
+    finally:
+        db.close()
+
+def test_edit_form_clears_an_emptied_date(client):
+    collaborateur_id = _create()
+    response = client.post(f'/edit_collaborateur_1/{collaborateur_id}', data=dict(FORM, fimo=''))
+    assert response.status_code == 302
+    collaborateur, history = _load(collaborateur_id)
+    assert collaborateur.fimo is None
+    assert collaborateur.caces == date(2031, 2, 3)
+    # The cleared date is kept in the certification history
+    assert [(entry.field, entry.value) for entry in history] == [('fimo', date(2030, 1, 1))]
+
+def test_update_keeps_dates_that_are_not_given(registers):
+    collaborateur_id = _create()
+    db = SessionLocal()
+    try:
+        update_collaborateur(db, collaborateur_id, nom='DURAND')
+    finally:
+        db.close()
+    collaborateur, history = _load(collaborateur_id)
+    assert collaborateur.nom == 'DURAND'
+    assert collaborateur.fimo == date(2030, 1, 1)
+    assert history == []
+
+def test_update_clears_a_date_given_as_none(registers):
+    collaborateur_id = _create()
+    db = SessionLocal()
+    try:
+        update_collaborateur(db, collaborateur_id, caces=None)
+    finally:
+        db.close()
+    collaborateur, _ = _load(collaborateur_id)
+    assert collaborateur.caces is None
+    assert collaborateur.fimo == date(2030, 1, 1)
+
+def test_edit_form_clears_an_emptied_date_in_register_2(client):
+    from database_2 import SessionLocal as SessionLocal_2
+    from crud_2 import create_collaborateur_2, get_collaborateur_2
+    db = SessionLocal_2()
+    try:
+        collaborateur_id = create_collaborateur_2(db, 'MARTIN', 'Paul', date_validite=date(2030, 5, 6)).id
+    finally:
+        db.close()
+    response = client.post(f'/edit_collaborateur_2/{collaborateur_id}',
+                           data={'nom': 'MARTIN', 'prenom': 'Paul', 'date_renouvellement': '',
+                                 'date_validite': '', 'commentaire': ''})
+    assert response.status_code == 302
+    db = SessionLocal_2()
+    try:
+        assert get_collaborateur_2(db, collaborateur_id).date_validite is None
+    finally:
+        db.close()
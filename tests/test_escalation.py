@@ -0,0 +1,59 @@
+import pytest
+from escalation import Ladder, group_by_recipient, resolve_recipients
+
+CONFIG = {
+    'default': [
+        {'days': 14, 'recipients': ['A']},
+        {'days': 4, 'recipients': ['A', 'B'], 'urgent': True}
+    ],
+    'fimo': [
+        {'days': 90, 'recipient': 'A', 'daily': False},
+        {'days': 30, 'recipients': ['A'], 'daily': False},
+        {'days': 14, 'recipients': ['A']},
+        {'days': 0, 'recipients': ['A', 'B'], 'urgent': True}
+    ]
+}
+
+def steps(ladder, field, days):
+    return {day: (step.days if step else None) for day in days for step in [ladder.step_for(field, day)]}
+
+def test_default_ladder():
+    ladder = Ladder(CONFIG)
+    assert steps(ladder, 'caces', [-1, 0, 4, 5, 14, 15]) == {-1: None, 0: 4, 4: 4, 5: 14, 14: 14, 15: None}
+    assert ladder.step_for('caces', 3).urgent
+
+def test_steps_that_are_not_daily_fire_on_their_day_only():
+    ladder = Ladder(CONFIG)
+    assert steps(ladder, 'fimo', [91, 90, 89, 31, 30, 29, 15, 14, 1, 0]) == {
+        91: None, 90: 90, 89: None, 31: None, 30: 30, 29: None, 15: None, 14: 14, 1: 14, 0: 0}
+
+def test_window_and_thresholds():
+    ladder = Ladder(CONFIG)
+    assert ladder.window('caces') == 14
+    assert ladder.window('fimo') == 90
+    assert ladder.window() == 90
+    assert ladder.thresholds('fimo') == [90, 30, 14, 0]
+
+def test_urgent_only_recipients():
+    assert Ladder(CONFIG).urgent_only == {'B'}
+
+@pytest.mark.parametrize('config', [
+    {'fimo': [{'days': 3, 'recipients': ['A']}]},
+    {'default': []},
+    {'default': [{'days': 3, 'recipients': ['A']}, {'days': 3, 'recipients': ['B']}]},
+    {'default': [{'days': -1, 'recipients': ['A']}]},
+    {'default': [{'recipients': ['A']}]}
+])
+def test_invalid_configs(config):
+    with pytest.raises(ValueError):
+        Ladder(config)
+
+def test_resolve_recipients(monkeypatch):
+    monkeypatch.setenv('ESCALATION_TEST_RECIPIENT', 'env@example.com')
+    assert resolve_recipients(['A', 'ESCALATION_TEST_RECIPIENT', 'x@example.com', 'UNKNOWN_RECIPIENT', 'A'],
+                              {'A': 'a@example.com'}) == ['a@example.com', 'env@example.com', 'x@example.com']
+
+def test_group_by_recipient():
+    first = {'type': 'FIMO', 'recipients': ('A',)}
+    second = {'type': 'CACES', 'recipients': ('A', 'B')}
+    assert group_by_recipient([first, second]) == {'A': [first, second], 'B': [second]}
@@ -0,0 +1,71 @@
+from database_1 import SessionLocal
+from crud_1 import create_collaborateur
+
+def add(nom):
+    db = SessionLocal()
+    try:
+        create_collaborateur(db, nom, 'Jean')
+    finally:
+        db.close()
+
+def test_unchanged_page_is_not_modified(client):
+    add('DUPONT')
+    first = client.get('/index_1')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    again = client.get('/index_1', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+def test_write_changes_the_etag(client):
+    add('DUPONT')
+    etag = client.get('/index_1').headers['ETag']
+    add('MARTIN')
+    response = client.get('/index_1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'MARTIN' in response.data
+
+def test_other_register_does_not_change_the_etag(client):
+    add('DUPONT')
+    etag = client.get('/index_2').headers['ETag']
+    add('MARTIN')
+    assert client.get('/index_2', headers={'If-None-Match': etag}).status_code == 304
+
+def test_query_string_is_part_of_the_etag(client):
+    add('DUPONT')
+    etag = client.get('/index_1').headers['ETag']
+    assert client.get('/index_1?search=DUP', headers={'If-None-Match': etag}).status_code == 200
+
+def test_extra_value_is_part_of_the_etag(client, monkeypatch):
+    import dashboard
+    from datetime import date
+    add('DUPONT')
+    monkeypatch.setattr(dashboard, 'get_current_date', lambda: date(2030, 1, 1))
+    etag = client.get('/dashboard').headers['ETag']
+    assert client.get('/dashboard', headers={'If-None-Match': etag}).status_code == 304
+    monkeypatch.setattr(dashboard, 'get_current_date', lambda: date(2030, 1, 2))
+    assert client.get('/dashboard', headers={'If-None-Match': etag}).status_code == 200
+
+def test_if_modified_since(client):
+    add('DUPONT')
+    first = client.get('/index_1')
+    last_modified = first.headers['Last-Modified']
+    assert client.get('/index_1', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert client.get('/index_1', headers={'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'}).status_code == 200
+
+def test_deploy_is_a_modification(client, monkeypatch):
+    import http_cache
+    add('DUPONT')
+    last_modified = client.get('/index_1').headers['Last-Modified']
+    monkeypatch.setattr(http_cache, 'DEPLOYED_AT', http_cache.DEPLOYED_AT + 10 ** 9)
+    assert client.get('/index_1', headers={'If-Modified-Since': last_modified}).status_code == 200
+
+def test_views_with_extra_ignore_if_modified_since(client):
+    add('DUPONT')
+    response = client.get('/dashboard')
+    assert 'Last-Modified' not in response.headers
+    later = 'Fri, 01 Jan 2100 00:00:00 GMT'
+    assert client.get('/dashboard', headers={'If-Modified-Since': later}).status_code == 200
+    assert client.get('/calendar_1.ics', headers={'If-Modified-Since': later}).status_code == 200
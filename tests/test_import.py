@@ -0,0 +1,96 @@
+import csv
+import sqlite3
+from seed_best_to_db import REGISTERS, import_csv
+
+FIELDS = REGISTERS[1]['fields']
+
+def write_csv(path, rows, fields=FIELDS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows([row.get(field, '') for field in fields] for row in rows)
+    return str(path)
+
+def people(count):
+    return [{'id': str(i), 'nom': f'NOM{i}', 'prenom': f'Prenom{i}', 'fimo': '2030-01-01'} for i in range(1, count + 1)]
+
+def stored(db_path, sql="SELECT id, nom, fimo, commentaire FROM collaborateurs ORDER BY id"):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def test_replace_import(registers, tmp_path):
+    report = import_csv(1, write_csv(tmp_path / 'a.csv', people(3)), registers[1])
+    assert report['rows_written'] == 3
+    assert stored(registers[1]) == [(1, 'NOM1', '2030-01-01', None), (2, 'NOM2', '2030-01-01', None),
+                                    (3, 'NOM3', '2030-01-01', None)]
+
+def test_diff_import_writes_only_changes(registers, tmp_path):
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(4)), registers[1])
+    rows = people(4)
+    rows[0]['nom'] = 'CHANGED'
+    del rows[1]
+    rows.append({'nom': 'NEW', 'prenom': 'Person'})
+    report = import_csv(1, write_csv(tmp_path / 'b.csv', rows), registers[1], mode='diff', delete_missing=True)
+    assert (report['inserted'], report['updated'], report['unchanged'], report['deleted']) == (1, 1, 2, 1)
+    assert report['changed_ids']['updated'] == [1]
+    assert report['changed_ids']['deleted'] == [2]
+    assert [row[:2] for row in stored(registers[1])] == [(1, 'CHANGED'), (3, 'NOM3'), (4, 'NOM4'), (5, 'NEW')]
+    assert stored(registers[1], "SELECT id FROM collaborateurs_archive") == [(2,)]
+
+def test_diff_import_keeps_missing_rows_by_default(registers, tmp_path):
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(2)), registers[1])
+    report = import_csv(1, write_csv(tmp_path / 'b.csv', people(1)), registers[1], mode='diff')
+    assert report['deleted'] == 0
+    assert len(stored(registers[1])) == 2
+
+def test_diff_import_matches_by_name_without_id(registers, tmp_path):
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(2)), registers[1])
+    rows = [dict(row, id='') for row in people(2)]
+    rows[1]['fimo'] = '2031-01-01'
+    report = import_csv(1, write_csv(tmp_path / 'b.csv', rows), registers[1], mode='diff')
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 1, 1)
+
+def test_empty_text_is_unchanged(registers, tmp_path):
+    # The form stores an empty commentaire as '', an empty CSV cell arrives as NULL
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(2)), registers[1])
+    conn = sqlite3.connect(registers[1])
+    with conn:
+        conn.execute("UPDATE collaborateurs SET commentaire = ''")
+    conn.close()
+    report = import_csv(1, write_csv(tmp_path / 'b.csv', people(2)), registers[1], mode='diff')
+    assert (report['updated'], report['unchanged']) == (0, 2)
+
+def test_invalid_id_is_skipped(registers, tmp_path):
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(2)), registers[1])
+    rows = people(2)
+    rows[1]['id'] = '2b'
+    report = import_csv(1, write_csv(tmp_path / 'b.csv', rows), registers[1])
+    assert report['rows_written'] == 1
+    assert [(e['line'], e['field'], e['level']) for e in report['errors']] == [(3, 'id', 'error')]
+    assert len(stored(registers[1])) == 2
+
+def test_invalid_date_is_stored_as_null_with_a_warning(registers, tmp_path):
+    rows = people(1)
+    rows[0]['fimo'] = 'soon'
+    report = import_csv(1, write_csv(tmp_path / 'a.csv', rows), registers[1])
+    assert report['rows_written'] == 1
+    assert [(e['field'], e['level']) for e in report['errors']] == [('fimo', 'warning')]
+    assert stored(registers[1])[0][2] is None
+
+def test_import_logs_changes(registers, tmp_path):
+    import_csv(1, write_csv(tmp_path / 'a.csv', people(2)), registers[1])
+    rows = people(2)
+    rows[0]['nom'] = 'CHANGED'
+    import_csv(1, write_csv(tmp_path / 'b.csv', rows), registers[1], mode='diff')
+    assert stored(registers[1], "SELECT row_id, op FROM change_log ORDER BY seq") == [(None, 'reset'), (1, 'update')]
+
+def test_header_in_another_order_is_matched_by_name(registers, tmp_path):
+    fields = list(reversed(FIELDS))
+    report = import_csv(1, write_csv(tmp_path / 'a.csv', people(2), fields), registers[1])
+    assert report['rows_written'] == 2
+    assert [row[:2] for row in stored(registers[1])] == [(1, 'NOM1'), (2, 'NOM2')]
+    assert [(e['line'], e['level']) for e in report['errors']] == [(1, 'warning')]
+    assert 'header order' in report['errors'][0]['message']
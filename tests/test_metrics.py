@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import metrics
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def write_worker_file(pid, value):
+    os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+    path = os.path.join(metrics.METRICS_DIR, f"web_{pid}.prom")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# HELP http_requests_total HTTP requests by route, method and status.\n'
+                '# TYPE http_requests_total counter\n'
+                f'http_requests_total{{route="/",method="GET",status="200",worker="{pid}"}} {value}\n')
+    return path
+
+def test_render_adds_labels():
+    counter = metrics.Counter("test_render_total", "Test counter.", ("kind",))
+    counter.inc(3, kind="a")
+    assert 'test_render_total{kind="a",worker="12"} 3' in metrics.render([counter], (('worker', '12'),))
+
+def test_workers_are_merged_and_exited_ones_dropped(client):
+    other = write_worker_file(os.getppid(), 7)
+    dead = exited_pid()
+    gone = write_worker_file(dead, 9)
+    body = client.get('/metrics').get_data(as_text=True)
+    assert f'http_requests_total{{route="/",method="GET",status="200",worker="{os.getppid()}"}} 7' in body
+    assert f'worker="{dead}"' not in body
+    assert not os.path.exists(gone)
+    assert os.path.exists(other)
+    # This worker's own series are labelled with its pid, and published for the others
+    client.get('/metrics')
+    assert f'route="/metrics",method="GET",status="200",worker="{os.getpid()}"' in client.get('/metrics').get_data(as_text=True)
+    metrics.publish_worker(force=True)
+    with open(os.path.join(metrics.METRICS_DIR, f"web_{os.getpid()}.prom"), encoding='utf-8') as f:
+        assert f'route="/metrics",method="GET",status="200",worker="{os.getpid()}"' in f.read()
+    os.remove(other)
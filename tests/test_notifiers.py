@@ -0,0 +1,137 @@
+import os
+import smtplib
+from datetime import timedelta
+import pytest
+import metrics
+import inspection_notifications_1 as notifier_1
+import inspection_notifications_2 as notifier_2
+from database_1 import SessionLocal
+from crud_1 import create_collaborateur
+
+class FakeSMTP:
+    """Records sent messages; fail_login / fail_send make those steps raise"""
+    sent = []
+    fail_login = False
+    fail_send = ()
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def ehlo(self):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        if self.fail_login:
+            raise smtplib.SMTPAuthenticationError(535, b'bad credentials')
+
+    def send_message(self, msg):
+        if any(name in msg['Subject'] for name in self.fail_send):
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'refused')})
+        FakeSMTP.sent.append(msg)
+
+class RefusingSMTP(FakeSMTP):
+    def __init__(self, host, port, timeout=None):
+        raise ConnectionRefusedError(111, 'Connection refused')
+
+@pytest.fixture
+def smtp(monkeypatch):
+    monkeypatch.setattr(FakeSMTP, 'sent', [])
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+def last_run(register):
+    """{metric line without value: value} of the notifier's textfile"""
+    with open(os.path.join(metrics.METRICS_DIR, f"notifier_{register}.prom"), encoding='utf-8') as f:
+        return dict(line.rsplit(' ', 1) for line in f.read().splitlines() if not line.startswith('#'))
+
+def add_due(nom, days=14):
+    db = SessionLocal()
+    try:
+        create_collaborateur(db, nom, 'Jean', fimo=(notifier_1.get_current_date() + timedelta(days=days)).isoformat())
+    finally:
+        db.close()
+
+def test_successful_run(registers, smtp):
+    add_due('DUPONT')
+    add_due('MARTIN')
+    notifier_1.main()
+    assert len(smtp.sent) == 2
+    run = last_run(1)
+    assert run['notifier_last_run_success{register="1"}'] == '1'
+    assert run['notifier_last_run_notifications{register="1"}'] == '2'
+    assert run['notifier_last_run_emails{register="1",kind="standard",status="sent"}'] == '2'
+
+def test_connection_failure_fails_the_run(registers, monkeypatch):
+    add_due('DUPONT')
+    monkeypatch.setattr(smtplib, 'SMTP', RefusingSMTP)
+    with pytest.raises(ConnectionRefusedError):
+        notifier_1.main()
+    run = last_run(1)
+    assert run['notifier_last_run_success{register="1"}'] == '0'
+    # What was due is reported even though nothing could be sent
+    assert run['notifier_last_run_notifications{register="1"}'] == '1'
+
+def test_login_failure_fails_the_run(registers, smtp, monkeypatch):
+    add_due('DUPONT')
+    monkeypatch.setattr(FakeSMTP, 'fail_login', True)
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        notifier_1.main()
+    assert last_run(1)['notifier_last_run_success{register="1"}'] == '0'
+    assert smtp.sent == []
+
+def test_send_failure_fails_the_run_after_the_others(registers, smtp, monkeypatch):
+    add_due('DUPONT')
+    add_due('MARTIN')
+    monkeypatch.setattr(FakeSMTP, 'fail_send', ('DUPONT',))
+    with pytest.raises(RuntimeError, match="1 of 2"):
+        notifier_1.main()
+    assert [msg['Subject'] for msg in smtp.sent if 'MARTIN' in msg['Subject']]
+    run = last_run(1)
+    assert run['notifier_last_run_success{register="1"}'] == '0'
+    assert run['notifier_last_run_emails{register="1",kind="standard",status="failed"}'] == '1'
+
+def due_in_register_2(days=14):
+    row = notifier_2.CollaborateurRow(id=1, nom='DUPONT', prenom='Jean', date_renouvellement=None,
+                                      date_validite=notifier_2.get_current_date() + timedelta(days=days),
+                                      commentaire=None)
+    return [(row, notifier_2.get_collaborateur_notifications(row, notifier_2.get_current_date()))]
+
+class FakeSession:
+    def close(self):
+        pass
+
+@pytest.fixture
+def register_2(monkeypatch):
+    # The notifier's database URL is fixed: keep the tests away from it
+    monkeypatch.setattr(notifier_2, 'get_db', FakeSession)
+    monkeypatch.setattr(notifier_2, 'find_due_notifications', lambda db, today: due_in_register_2())
+
+def test_register_2_connection_failure_fails_the_run(register_2, monkeypatch):
+    monkeypatch.setattr(smtplib, 'SMTP', RefusingSMTP)
+    with pytest.raises(ConnectionRefusedError):
+        notifier_2.main()
+    run = last_run(2)
+    assert run['notifier_last_run_success{register="2"}'] == '0'
+    assert run['notifier_last_run_notifications{register="2"}'] == '1'
+
+def test_register_2_successful_run(register_2, smtp):
+    notifier_2.main()
+    assert len(smtp.sent) == 1
+    assert last_run(2)['notifier_last_run_success{register="2"}'] == '1'
+
+def test_register_2_send_failure_fails_the_run(register_2, smtp, monkeypatch):
+    monkeypatch.setattr(FakeSMTP, 'fail_send', ('DUPONT',))
+    with pytest.raises(RuntimeError, match="1 of 1"):
+        notifier_2.main()
+    run = last_run(2)
+    assert run['notifier_last_run_success{register="2"}'] == '0'
+    assert run['notifier_last_run_emails{register="2",kind="standard",status="failed"}'] == '1'
@@ -0,0 +1,66 @@
+import sqlite3
+from database_1 import SessionLocal
+from crud_1 import create_collaborateur, update_collaborateur, delete_collaborateur
+from register_versions import get_changes_page, get_version, record_changes_sqlite
+
+def write(action, *args, **kwargs):
+    db = SessionLocal()
+    try:
+        result = action(db, *args, **kwargs)
+        return result.id if hasattr(result, 'id') else result
+    finally:
+        db.close()
+
+def ops(page):
+    return [(change['id'], change['op']) for change in page['changes']]
+
+def test_writes_bump_the_version(registers):
+    assert get_version(1) == (0, None)
+    write(create_collaborateur, 'DUPONT', 'Jean')
+    first = get_version(1)[0]
+    write(update_collaborateur, 1, nom='DURAND')
+    assert get_version(1)[0] == first + 1
+
+def test_page_is_compacted_to_the_last_change_of_each_row(registers):
+    kept = write(create_collaborateur, 'KEPT', 'Anne')
+    since = get_changes_page(1)['next']
+    write(update_collaborateur, kept, nom='KEPT2')
+    added = write(create_collaborateur, 'ADDED', 'Paul')
+    write(update_collaborateur, added, nom='ADDED2')
+    removed = write(create_collaborateur, 'REMOVED', 'Marc')
+    write(delete_collaborateur, removed)
+    page = get_changes_page(1, since)
+    assert ops(page) == [(kept, 'update'), (added, 'insert'), (removed, 'delete')]
+    data = {change['id']: change['data'] for change in page['changes']}
+    assert data[kept]['nom'] == 'KEPT2'
+    assert data[added]['nom'] == 'ADDED2'
+    assert data[removed] is None
+    assert not page['reset'] and not page['more']
+
+def test_pages_follow_each_other(registers):
+    for name in ('A', 'B', 'C'):
+        write(create_collaborateur, name, 'X')
+    page = get_changes_page(1, 0, limit=2)
+    assert page['more'] and ops(page) == [(1, 'insert'), (2, 'insert')]
+    page = get_changes_page(1, page['next'], limit=2)
+    assert not page['more'] and ops(page) == [(3, 'insert')]
+    assert get_changes_page(1, page['next'])['changes'] == []
+
+def test_reset_drops_what_came_before(registers):
+    write(create_collaborateur, 'BEFORE', 'X')
+    conn = sqlite3.connect(registers[1], isolation_level=None)
+    conn.execute("BEGIN")
+    record_changes_sqlite(conn, [(None, 'reset')])
+    conn.execute("COMMIT")
+    conn.close()
+    after = write(create_collaborateur, 'AFTER', 'Y')
+    page = get_changes_page(1)
+    assert page['reset']
+    assert ops(page) == [(after, 'insert')]
+
+def test_changes_route(client):
+    write(create_collaborateur, 'DUPONT', 'Jean')
+    response = client.get('/changes?register=1&since=0')
+    assert response.status_code == 200
+    assert [change['op'] for change in response.json['changes']] == ['insert']
+    assert client.get('/changes?register=3').status_code == 400
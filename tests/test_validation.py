@@ -0,0 +1,58 @@
+from datetime import date
+import pytest
+from validation import ValidationError, get_validator, parse_date
+
+ROW = {'id': '7', 'nom': 'DUPONT', 'prenom': 'Jean', 'fimo': '2030-01-02', 'caces': '03/04/2031', 'aipr': '',
+       'hg0b0': '', 'visite_med': '', 'brevet_secour': '', 'commentaire': ' note '}
+
+def test_parse_date_formats():
+    assert parse_date('2030-01-02') == date(2030, 1, 2)
+    assert parse_date('02/01/2030') == date(2030, 1, 2)
+    assert parse_date(' ') is None
+    assert parse_date(None) is None
+    with pytest.raises(ValueError):
+        parse_date('2030-13-01')
+
+def test_valid_row():
+    values, problems = get_validator(1).check(ROW)
+    assert problems == []
+    assert values['id'] == 7
+    assert values['fimo'] == date(2030, 1, 2)
+    assert values['caces'] == date(2031, 4, 3)
+    assert values['aipr'] is None
+    assert values['commentaire'] == 'note'
+
+def test_empty_id_is_allowed():
+    values, problems = get_validator(1).check(dict(ROW, id=''))
+    assert problems == []
+    assert values['id'] is None
+
+def test_missing_required_field_rejects_the_row():
+    values, problems = get_validator(1).check(dict(ROW, nom=' '), lenient=True)
+    assert values is None
+    assert problems == [('nom', ' ', "required field is empty", "error")]
+
+def test_lenient_stores_an_invalid_date_as_null():
+    values, problems = get_validator(1).check(dict(ROW, fimo='someday'), lenient=True)
+    assert values['fimo'] is None
+    assert [(field, level) for field, _, _, level in problems] == [('fimo', 'warning')]
+
+def test_strict_rejects_an_invalid_date():
+    values, problems = get_validator(1).check(dict(ROW, fimo='someday'))
+    assert values is None
+    assert problems[0][3] == 'error'
+
+def test_invalid_id_rejects_the_row_even_when_lenient():
+    values, problems = get_validator(1).check(dict(ROW, id='7a'), lenient=True)
+    assert values is None
+    assert [(field, level) for field, _, _, level in problems] == [('id', 'error')]
+
+def test_too_long_name():
+    values, problems = get_validator(1).check(dict(ROW, nom='X' * 101), lenient=True)
+    assert values is None
+    assert problems[0][0] == 'nom'
+
+def test_validate_raises_with_every_field():
+    with pytest.raises(ValidationError) as info:
+        get_validator(1).validate(dict(ROW, nom='', fimo='someday'))
+    assert info.value.fields == ['nom', 'fimo']
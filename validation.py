@@ -0,0 +1,169 @@
+from datetime import date, datetime
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import Iterable, List, Mapping, Optional, Tuple
+from sqlalchemy import Integer, String
+from date_storage import is_date_type
+
+# Accepted besides ISO (YYYY-MM-DD), which is parsed on a fast path
+DATE_FORMATS = ("%d/%m/%Y",)
+
+# Default of the optional fields of the crud update functions: "not given",
+# as opposed to None, which clears the value
+UNSET = object()
+
+class ValidationError(ValueError):
+    """Raised when a row does not validate; errors is a list of (field, value, message)"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{field}: {message}" for field, _, message in errors))
+
+    @property
+    def fields(self):
+        return [field for field, _, _ in self.errors]
+
+def parse_date(value) -> Optional[date]:
+    """Parse a date, datetime or string into a date.
+
+    ISO strings go through date.fromisoformat; DATE_FORMATS are only tried
+    when that fails. Empty values return None, invalid ones raise ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    if len(text) == 10 and text[4] == '-' and text[7] == '-':
+        try:
+            return date.fromisoformat(text)
+        except ValueError:
+            pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date {value!r}")
+
+def _parse_int(value):
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    return int(text) if text else None
+
+def _make_string_parser(length):
+    def parse(value):
+        text = str(value).strip()
+        if length and len(text) > length:
+            raise ValueError(f"longer than {length} characters")
+        return text or None
+    return parse
+
+def _parse_text(value):
+    text = str(value).strip()
+    return text or None
+
+class RowValidator:
+    """Validator compiled once from a SQLAlchemy model.
+
+    Each column becomes a (name, parser, required, strict) entry, so
+    validating a row is a single loop with no per-field type dispatch.
+    """
+
+    def __init__(self, model):
+        fields = []
+        for col in model.__table__.columns:
+            if is_date_type(col.type):
+                parser = parse_date
+            elif isinstance(col.type, Integer):
+                parser = _parse_int
+            elif isinstance(col.type, String) and col.type.length:
+                parser = _make_string_parser(col.type.length)
+            else:
+                parser = _parse_text
+            required = not col.nullable and not col.primary_key
+            # An unreadable id would turn the row into a new person, so it is never stored as NULL
+            strict = required or col.primary_key
+            fields.append((col.name, parser, required, strict))
+        self.fields = tuple(fields)
+        self.names = tuple(name for name, _, _, _ in fields)
+
+    def check(self, data: Mapping, lenient: bool = False) -> Tuple[Optional[dict], list]:
+        """Validate a mapping and return (values, problems).
+
+        problems is a list of (field, value, message, level). A missing
+        required field is an error and values is None. Other invalid values
+        are errors too, unless lenient is set: they are then stored as None
+        and reported as warnings. An invalid primary key is always an error.
+        """
+        values = {}
+        problems = []
+        rejected = False
+        for name, parser, required, strict in self.fields:
+            raw = data.get(name)
+            if raw is None or raw == '':
+                if required:
+                    problems.append((name, '', "required field is empty", "error"))
+                    rejected = True
+                values[name] = None
+                continue
+            try:
+                values[name] = parser(raw)
+            except (TypeError, ValueError) as e:
+                values[name] = None
+                problems.append((name, raw, str(e), "warning" if lenient and not strict else "error"))
+                rejected = rejected or not lenient or strict
+                continue
+            if values[name] is None and required:
+                problems.append((name, raw, "required field is empty", "error"))
+                rejected = True
+        return (None if rejected else values), problems
+
+    def validate(self, data: Mapping) -> dict:
+        """Validate a mapping strictly; raise ValidationError on any problem"""
+        values, problems = self.check(data)
+        if problems:
+            raise ValidationError([(field, value, message) for field, value, message, _ in problems])
+        return values
+
+    def validate_many(self, rows: Iterable[Tuple[int, Mapping]], lenient: bool = True) -> List[Tuple[int, Optional[dict], list]]:
+        """Validate a chunk of (line_no, mapping) pairs; returns (line_no, values, problems) triples"""
+        check = self.check
+        return [(line_no, *check(data, lenient)) for line_no, data in rows]
+
+def _register_model(register):
+    if register == 1:
+        from models_1 import Collaborateur
+        return Collaborateur
+    if register == 2:
+        from models_2 import CollaborateurPoidsLouud
+        return CollaborateurPoidsLouud
+    raise ValueError(f"Unknown register {register!r}")
+
+@lru_cache(maxsize=None)
+def get_validator(register: int) -> RowValidator:
+    """Return the (cached) validator of a register"""
+    return RowValidator(_register_model(register))
+
+def _validate_chunk(args):
+    register, chunk, lenient = args
+    return get_validator(register).validate_many(chunk, lenient)
+
+def validate_chunks(register: int, chunks: Iterable[list], processes: int = 0, lenient: bool = True):
+    """Validate chunks of (line_no, mapping) pairs, in order.
+
+    With processes > 1 the chunks are spread over a multiprocessing pool;
+    results are still yielded in input order.
+    """
+    if processes and processes > 1:
+        with Pool(processes) as pool:
+            yield from pool.imap(_validate_chunk, ((register, chunk, lenient) for chunk in chunks))
+    else:
+        validator = get_validator(register)
+        for chunk in chunks:
+            yield validator.validate_many(chunk, lenient)